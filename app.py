@@ -1,36 +1,62 @@
+import asyncio
+import contextlib
+import hmac
 import logging
+import time
 from datetime import datetime
 from http import HTTPStatus
+from typing import Optional
 
 from aiohttp import web
 from aiohttp.web import Request, Response, json_response
 from botbuilder.core import (
     ConversationState,
-    MemoryStorage,
     TurnContext,
     UserState,
 )
 from botbuilder.core.integration import aiohttp_error_middleware
-from botbuilder.integration.aiohttp import (
-    CloudAdapter,
-    ConfigurationBotFrameworkAuthentication,
-)
 from botbuilder.schema import Activity, ActivityTypes
 
-from src.bots import AuthBot
+from src.bots import AuthBot, BusyBot
 from config import DefaultConfig
 from src.dialogs import MainDialog
 from src.conversation.services.conversation_service import ConversationService
-from src.conversation.history.conversation_history import ConversationHistory
+from src.conversation.history.history_manager import ConversationHistoryManager
 from src.conversation.services.key_manager import KeyManager
+from src.conversation.services.context_builder import ContextBuilder
+from src.conversation.services.fair_scheduler import FairScheduler, parse_weights
+from src.conversation.services.model_router import ModelRouter, parse_tenant_models
+from src.conversation.services.response_cache import ResponseCache
+from src.conversation.services.resilience import ResilientCaller
+from src.helpers.conversation_helper import get_tenant_id
+from src.services.http_client import close_http_client
+from src.storage import create_deduplicator, create_job_queue, create_storage
+from src.telemetry import (
+    REGISTRY,
+    InstrumentedBotFrameworkAuthentication,
+    InstrumentedCloudAdapter,
+    LoopStallMonitor,
+    TelemetryMiddleware,
+    configure as configure_telemetry,
+    profile,
+    task_report,
+    track_stages,
+)
+from src.runtime import (
+    AdmissionController,
+    AdmissionRejected,
+    ConversationMailbox,
+    ProactiveReplier,
+    ReplyWorkerPool,
+    Supervisor,
+    available_cpus,
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 CONFIG = DefaultConfig()
 
-ADAPTER = CloudAdapter(ConfigurationBotFrameworkAuthentication(CONFIG))
-
 
 # Catch-all for errors.
 async def on_error(context: TurnContext, error: Exception):
@@ -57,24 +83,286 @@ async def on_error(context: TurnContext, error: Exception):
         await context.send_activity(trace_activity)
 
 
-ADAPTER.on_turn_error = on_error
+class BotApplication:
+    """
+    The adapter, bots and services of one server process.
 
-MEMORY = MemoryStorage()
-USER_STATE = UserState(MEMORY)
-CONVERSATION_STATE = ConversationState(MEMORY)
+    Everything is built from the config, so every worker process builds its own. State
+    shared between processes lives in the storage selected by STORAGE_BACKEND.
+    """
 
-KEY_MANAGER = KeyManager(CONFIG)
-CONVERSATION_HISTORY = ConversationHistory()
-CONVERSATION_SERVICE = ConversationService(KEY_MANAGER)
+    def __init__(self, config: DefaultConfig):
+        self.config = config
+        configure_telemetry(config.METRICS_ENABLED, config.TRACING_ENABLED)
 
-DIALOG = MainDialog(CONFIG, CONVERSATION_HISTORY, CONVERSATION_SERVICE)
+        self.adapter = InstrumentedCloudAdapter(
+            InstrumentedBotFrameworkAuthentication(config)
+        )
+        self.adapter.use(TelemetryMiddleware())
+        self.adapter.on_turn_error = on_error
 
-BOT = AuthBot(CONVERSATION_STATE, USER_STATE, DIALOG)
+        self.storage, self.history_store = create_storage(config)
+        self.user_state = UserState(self.storage)
+        self.conversation_state = ConversationState(self.storage)
+
+        self.key_manager = KeyManager(config)
+        resilience = ResilientCaller(
+            attempt_timeout=config.OPENAI_TIMEOUT_SECONDS,
+            max_retries=config.OPENAI_MAX_RETRIES,
+            base_delay=config.OPENAI_RETRY_BASE_DELAY_SECONDS,
+            max_delay=config.OPENAI_RETRY_MAX_DELAY_SECONDS,
+            hedging=config.OPENAI_HEDGING_ENABLED,
+            min_hedge_delay=config.OPENAI_HEDGE_MIN_DELAY_SECONDS,
+            failure_threshold=config.CIRCUIT_FAILURE_THRESHOLD,
+            recovery_timeout=config.CIRCUIT_RECOVERY_SECONDS,
+            fallback_model=config.FALLBACK_MODEL or None,
+        )
+        self.conversation_history = ConversationHistoryManager(
+            max_messages=config.HISTORY_MAX_MESSAGES,
+            max_conversations=config.HISTORY_MAX_CONVERSATIONS,
+            idle_ttl=config.HISTORY_IDLE_TTL_SECONDS,
+            memory_budget_bytes=config.HISTORY_MEMORY_BUDGET_BYTES,
+            collect_evicted=bool(config.SUMMARY_MODEL),
+            store=self.history_store,
+            revalidate=config.HISTORY_REVALIDATE,
+        )
+        self.conversation_service = ConversationService(
+            self.key_manager,
+            ContextBuilder(max_context_tokens=config.CONTEXT_MAX_TOKENS),
+            summary_model=config.SUMMARY_MODEL,
+            response_cache=(
+                ResponseCache(
+                    ttl=config.RESPONSE_CACHE_TTL_SECONDS,
+                    max_entries=config.RESPONSE_CACHE_MAX_ENTRIES,
+                    max_bytes=config.RESPONSE_CACHE_MEMORY_BYTES,
+                    semantic_threshold=config.SEMANTIC_CACHE_THRESHOLD or None,
+                )
+                if config.RESPONSE_CACHE_ENABLED
+                else None
+            ),
+            embedding_model=config.EMBEDDING_MODEL,
+            resilience=resilience,
+            base_url=config.OPENAI_BASE_URL,
+            scheduler=(
+                FairScheduler(
+                    config.OPENAI_MAX_CONCURRENT,
+                    class_weights=parse_weights(config.OPENAI_CLASS_WEIGHTS),
+                    tenant_weights=parse_weights(config.OPENAI_TENANT_WEIGHTS),
+                )
+                if config.OPENAI_MAX_CONCURRENT > 0
+                else None
+            ),
+        )
+        if config.ROUTER_ENABLED:
+            service = self.conversation_service
+            service.router = ModelRouter(
+                resilience,
+                service.model,
+                service.temperature,
+                service.max_tokens,
+                fast_model=config.ROUTER_FAST_MODEL or None,
+                strong_model=config.ROUTER_STRONG_MODEL or None,
+                long_message_tokens=config.ROUTER_LONG_MESSAGE_TOKENS,
+                deep_conversation_messages=config.ROUTER_DEEP_CONVERSATION_MESSAGES,
+                slow_factor=config.ROUTER_SLOW_FACTOR,
+                probe_rate=config.ROUTER_PROBE_RATE,
+                tenant_models=parse_tenant_models(config.ROUTER_TENANT_MODELS),
+                supports=lambda model: any(
+                    key.supports(model) for key in self.key_manager.keys
+                ),
+            )
+
+        self.reply_queue = (
+            create_job_queue(config) if config.ASYNC_REPLIES_ENABLED else None
+        )
+        self.reply_workers = (
+            ReplyWorkerPool(
+                self.reply_queue,
+                ProactiveReplier(
+                    self.adapter,
+                    config.APP_ID,
+                    self.conversation_history,
+                    self.conversation_service,
+                ),
+                workers=config.REPLY_WORKERS,
+                max_attempts=config.REPLY_MAX_ATTEMPTS,
+            )
+            if self.reply_queue is not None
+            else None
+        )
+
+        self.dialog = MainDialog(
+            config,
+            self.conversation_history,
+            self.conversation_service,
+            self.reply_queue,
+            self.user_state,
+        )
+        self.deduplicator = create_deduplicator(config)
+        self.admission = AdmissionController(
+            max_concurrent=config.ADMISSION_MAX_CONCURRENT,
+            max_per_tenant=config.ADMISSION_MAX_PER_TENANT,
+            max_per_user=config.ADMISSION_MAX_PER_USER,
+            max_queue=config.ADMISSION_MAX_QUEUE,
+            queue_timeout=config.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+        )
+        self.mailbox = (
+            ConversationMailbox(
+                debounce=config.MAILBOX_DEBOUNCE_SECONDS,
+                max_merged=config.MAILBOX_MAX_MERGED,
+                typing_interval=config.MAILBOX_TYPING_INTERVAL_SECONDS,
+                admission=self.admission,
+                on_rejected=self.reject_turn,
+            )
+            if config.MAILBOX_ENABLED
+            else None
+        )
+        self.bot = AuthBot(
+            self.conversation_state, self.user_state, self.dialog, self.mailbox
+        )
+        self.busy_bot = BusyBot()
+
+        for name in (
+            "admission_in_flight",
+            "admission_queue_depth",
+            "openai_scheduler_queue_depth",
+        ):
+            REGISTRY.unregister(name)
+        REGISTRY.gauge(
+            "admission_in_flight",
+            "Requests admitted and being processed.",
+            function=lambda: self.admission.in_flight,
+        )
+        REGISTRY.gauge(
+            "admission_queue_depth",
+            "Requests waiting to be admitted.",
+            function=lambda: self.admission.queue_depth,
+        )
+        scheduler = self.conversation_service.scheduler
+        if scheduler is not None:
+            REGISTRY.gauge(
+                "openai_scheduler_queue_depth",
+                "OpenAI requests waiting for the scheduler.",
+                function=lambda: scheduler.queue_depth,
+            )
+
+        track_stages(config.PROFILING_ENABLED)
+        self.stall_monitor = (
+            LoopStallMonitor(threshold=config.LOOP_STALL_THRESHOLD_SECONDS)
+            if config.PROFILING_ENABLED
+            else None
+        )
+        self.profiling = asyncio.Lock()
+        self.ready = False
+        self._warm_up_task: Optional[asyncio.Task] = None
+
+    async def reject_turn(self, turn_context: TurnContext, error: AdmissionRejected):
+        """
+        Answer a turn the mailbox could not admit with the busy reply, and forget its
+        activity so a redelivery is processed.
+        """
+        activity = turn_context.activity
+        logger.warning(
+            f"{error} (tenant: {get_tenant_id(activity)}, "
+            f"user: {activity.from_property and activity.from_property.id})"
+        )
+        await self.deduplicator.forget(
+            self.deduplicator.key(activity.conversation.id, activity.id)
+        )
+        await self.busy_bot.on_turn(turn_context)
+
+    async def start(self, app: web.Application):
+        if self.reply_workers is not None:
+            self.reply_workers.start()
+        if self.stall_monitor is not None:
+            self.stall_monitor.start()
+        # The server starts listening without waiting for the warm-up; /ready reports
+        # when it is done.
+        self._warm_up_task = asyncio.create_task(self.warm_up())
+
+    async def warm_up(self):
+        """
+        Prepare what the first requests would otherwise wait for: storage indexes and
+        connections, the OpenAI SDK and clients, and the identity provider's signing keys.
+        """
+        started_at = time.perf_counter()
+        try:
+            for store in (
+                self.storage,
+                self.history_store,
+                self.reply_queue,
+                self.deduplicator,
+            ):
+                if hasattr(store, "ensure_indexes"):
+                    await store.ensure_indexes()
+            await self.conversation_service.warm_up()
+            if self.config.AUTH_ISSUER:
+                await self.dialog.auth.warm_up()
+        except Exception as e:
+            # Whatever failed is retried when a request needs it.
+            logger.warning(f"Warm-up failed: {e}", exc_info=True)
+        self.ready = True
+        logger.info(f"Warm-up done in {time.perf_counter() - started_at:.2f}s")
+
+    async def stop(self, app: web.Application):
+        # Report not ready while draining, so load balancers stop sending requests.
+        self.ready = False
+        if self._warm_up_task is not None and not self._warm_up_task.done():
+            self._warm_up_task.cancel()
+            await asyncio.gather(self._warm_up_task, return_exceptions=True)
+        if self.reply_workers is not None:
+            await self.reply_workers.stop()
+        if self.stall_monitor is not None:
+            await self.stall_monitor.stop()
+
+    async def close(self, app: web.Application):
+        for store in (self.storage, self.history_store):
+            if hasattr(store, "close"):
+                await store.close()
+        await close_http_client()
+
+
+BOT_APP = web.AppKey("bot_app", BotApplication)
 
 
 async def messages(req: Request) -> Response:
     logger.info(f"API called: {req.method} {req.path}")
-    response = await ADAPTER.process(req, BOT)
+    bot_app = req.app[BOT_APP]
+    body = await req.json()
+    if body.get("type") != ActivityTypes.message:
+        return to_response(await bot_app.adapter.process(req, bot_app.bot))
+
+    conversation = body.get("conversation") or {}
+    deduplicator = bot_app.deduplicator
+    dedup_key = deduplicator.key(conversation.get("id"), body.get("id"))
+    if await deduplicator.check_and_add(dedup_key):
+        logger.info(f"Dropping redelivered activity {body.get('id')}")
+        return Response(status=HTTPStatus.OK)
+
+    tenant_id = conversation.get("tenantId") or (
+        (body.get("channelData") or {}).get("tenant") or {}
+    ).get("id")
+    user_id = (body.get("from") or {}).get("id")
+    if bot_app.mailbox is not None:
+        # The mailbox admits each turn when it runs it, so messages waiting in it or
+        # merged into another turn take no slot.
+        admission = contextlib.nullcontext()
+    else:
+        admission = bot_app.admission.admit(tenant_id, user_id)
+    try:
+        async with admission:
+            response = await bot_app.adapter.process(req, bot_app.bot)
+    except AdmissionRejected as e:
+        logger.warning(f"{e} (tenant: {tenant_id}, user: {user_id})")
+        await deduplicator.forget(dedup_key)
+        response = await bot_app.adapter.process(req, bot_app.busy_bot)
+    except BaseException:
+        await deduplicator.forget(dedup_key)
+        raise
+    return to_response(response)
+
+
+def to_response(response) -> Response:
     if response:
         if response.body is None:
             args = {"status": response.status}
@@ -85,20 +373,140 @@ async def messages(req: Request) -> Response:
     return Response(status=201)
 
 
+async def admission_stats(req: Request) -> Response:
+    return json_response(req.app[BOT_APP].admission.stats(), status=HTTPStatus.OK)
+
+
+async def metrics(req: Request) -> Response:
+    if not req.app[BOT_APP].config.METRICS_ENABLED:
+        return Response(status=HTTPStatus.NOT_FOUND)
+    return Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8")
+
+
+def check_admin(req: Request) -> Optional[Response]:
+    """
+    Return the error response for a request to a profiling endpoint that is not allowed,
+    or None. The endpoints exist only with PROFILING_ENABLED and an ADMIN_TOKEN, which
+    requests must send as a bearer token.
+    """
+    config = req.app[BOT_APP].config
+    if not config.PROFILING_ENABLED or not config.ADMIN_TOKEN:
+        return Response(status=HTTPStatus.NOT_FOUND)
+    expected = f"Bearer {config.ADMIN_TOKEN}".encode()
+    if not hmac.compare_digest(req.headers.get("Authorization", "").encode(), expected):
+        return Response(status=HTTPStatus.UNAUTHORIZED)
+    return None
+
+
+async def profile_handler(req: Request) -> Response:
+    denied = check_admin(req)
+    if denied is not None:
+        return denied
+    bot_app = req.app[BOT_APP]
+    try:
+        seconds = float(req.query.get("seconds", 10))
+        interval = float(req.query.get("interval", 0.005))
+    except ValueError:
+        return Response(
+            status=HTTPStatus.BAD_REQUEST, text="Invalid seconds or interval"
+        )
+    if not 0 < seconds <= bot_app.config.PROFILE_MAX_SECONDS or interval < 0.001:
+        return Response(
+            status=HTTPStatus.BAD_REQUEST, text="Invalid seconds or interval"
+        )
+    if bot_app.profiling.locked():
+        return Response(status=HTTPStatus.CONFLICT, text="A profile is already running")
+    async with bot_app.profiling:
+        collapsed = await profile(seconds, interval)
+    return Response(text=collapsed, content_type="text/plain", charset="utf-8")
+
+
+async def tasks_handler(req: Request) -> Response:
+    denied = check_admin(req)
+    if denied is not None:
+        return denied
+    return json_response(task_report(), status=HTTPStatus.OK)
+
+
+async def stalls_handler(req: Request) -> Response:
+    denied = check_admin(req)
+    if denied is not None:
+        return denied
+    monitor = req.app[BOT_APP].stall_monitor
+    return json_response(
+        {"threshold": monitor.threshold, "stalls": list(monitor.stalls)},
+        status=HTTPStatus.OK,
+    )
+
+
 async def ping(req: Request) -> Response:
     return json_response(
         {"status": "ok", "message": "Service is running"}, status=HTTPStatus.OK
     )
 
 
-APP = web.Application(middlewares=[aiohttp_error_middleware])
-APP.router.add_post("/internal/api/messages", messages)
-APP.router.add_get("/health", ping)
+async def ready(req: Request) -> Response:
+    if not req.app[BOT_APP].ready:
+        return json_response(
+            {"status": "warming_up"}, status=HTTPStatus.SERVICE_UNAVAILABLE
+        )
+    return json_response({"status": "ready"}, status=HTTPStatus.OK)
+
+
+def create_app(config: Optional[DefaultConfig] = None) -> web.Application:
+    """
+    Build the web application and everything it serves.
+
+    Each worker process calls this once, after it started, so no clients or event
+    loop state are shared between processes.
+    """
+    bot_app = BotApplication(config or CONFIG)
+    app = web.Application(middlewares=[aiohttp_error_middleware])
+    app[BOT_APP] = bot_app
+    app.router.add_post("/internal/api/messages", messages)
+    app.router.add_get("/health", ping)
+    app.router.add_get("/ready", ready)
+    app.router.add_get("/metrics", metrics)
+    app.router.add_get("/internal/api/admission", admission_stats)
+    app.router.add_get("/internal/api/profile", profile_handler)
+    app.router.add_get("/internal/api/tasks", tasks_handler)
+    app.router.add_get("/internal/api/stalls", stalls_handler)
+    app.on_startup.append(bot_app.start)
+    app.on_shutdown.append(bot_app.stop)
+    app.on_cleanup.append(bot_app.close)
+    return app
+
+
+def main():
+    workers = CONFIG.WORKERS or available_cpus()
+    if workers == 1:
+        logger.info("Starting the web server...")
+        web.run_app(
+            create_app(),
+            host=CONFIG.HOST,
+            port=CONFIG.PORT,
+            shutdown_timeout=CONFIG.SHUTDOWN_TIMEOUT_SECONDS,
+        )
+        return
+
+    if CONFIG.STORAGE_BACKEND == "memory":
+        logger.warning(
+            "STORAGE_BACKEND is memory: every worker keeps its own bot state, so a "
+            "conversation can lose its state when its requests reach another worker"
+        )
+    logger.info(f"Starting {workers} workers...")
+    Supervisor(
+        "app:create_app",
+        host=CONFIG.HOST,
+        port=CONFIG.PORT,
+        workers=workers,
+        shutdown_timeout=CONFIG.SHUTDOWN_TIMEOUT_SECONDS,
+    ).run()
+
 
 if __name__ == "__main__":
     try:
-        logger.info("Starting the web server...")
-        web.run_app(APP, host="0.0.0.0", port=CONFIG.PORT)
+        main()
     except Exception as error:
         logger.exception("Failed to start the server: %s", error)
         raise
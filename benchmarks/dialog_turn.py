@@ -0,0 +1,102 @@
+"""
+Measure the CPU time and memory a turn spends in the dialog machinery.
+
+Runs message turns through AuthBot and MainDialog on a TestAdapter, with the OAuth prompt
+waiting for a sign in, so every turn loads the dialog state, continues the dialog stack
+and saves the state. The turns are run twice: building a DialogSet and state accessor
+per turn, as the bots did before they cached them, and with the bot's cached ones.
+
+    python -m benchmarks.dialog_turn --turns 5000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+import tracemalloc
+
+from botbuilder.core import ConversationState, MemoryStorage, TurnContext, UserState
+from botbuilder.core.adapters import TestAdapter
+from botbuilder.schema import Activity, ActivityTypes, ChannelAccount
+from botbuilder.schema import ConversationAccount
+
+from config import DefaultConfig
+from src.bots import AuthBot
+from src.dialogs import MainDialog
+from src.helpers.dialog_helper import DialogHelper
+
+
+class UncachedAuthBot(AuthBot):
+    """
+    Builds the DialogSet and state accessor on every turn.
+    """
+
+    async def on_message_activity(self, turn_context: TurnContext):
+        await DialogHelper.run_dialog(
+            self.dialog,
+            turn_context,
+            self.conversation_state.create_property("DialogState"),
+        )
+
+
+def message(text: str) -> Activity:
+    return Activity(
+        type=ActivityTypes.message,
+        id=str(time.perf_counter_ns()),
+        text=text,
+        channel_id="msteams",
+        service_url="https://test.com",
+        from_property=ChannelAccount(id="user"),
+        recipient=ChannelAccount(id="bot"),
+        conversation=ConversationAccount(id="conversation"),
+    )
+
+
+async def run_turns(bot: AuthBot, adapter: TestAdapter, turns: int) -> dict:
+    text = "What is the weather like in Amsterdam today?"
+    # The first turn begins the dialog; the measured ones continue it.
+    await bot.on_turn(TurnContext(adapter, message(text)))
+
+    started_at = time.process_time()
+    for _ in range(turns):
+        await bot.on_turn(TurnContext(adapter, message(text)))
+    cpu = (time.process_time() - started_at) / turns
+
+    tracemalloc.start()
+    peaks = []
+    for _ in range(min(turns, 500)):
+        context = TurnContext(adapter, message(text))
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        await bot.on_turn(context)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    return {
+        "cpu_us_per_turn": round(cpu * 1e6, 1),
+        "peak_bytes_per_turn": sorted(peaks)[len(peaks) // 2],
+    }
+
+
+def create_bot(bot_class) -> AuthBot:
+    storage = MemoryStorage()
+    dialog = MainDialog(DefaultConfig(), None, None)
+    return bot_class(ConversationState(storage), UserState(storage), dialog)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=5000)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    adapter = TestAdapter()
+    results = {
+        "uncached": await run_turns(create_bot(UncachedAuthBot), adapter, args.turns),
+        "cached": await run_turns(create_bot(AuthBot), adapter, args.turns),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,296 @@
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+from collections import Counter, defaultdict, deque
+from typing import Deque, Dict, List, Optional
+
+import jwt
+from aiohttp import web
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+
+async def start_site(app: web.Application, host: str = "127.0.0.1") -> tuple:
+    """
+    Serve an application on a free port.
+
+    Returns:
+        tuple: The AppRunner, to clean up with, and the base URL of the site.
+    """
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{port}"
+
+
+class FakeOpenAI:
+    """
+    A stand-in for the OpenAI chat completions and embeddings API.
+
+    A completion takes latency seconds, plus up to jitter seconds, to its first token and
+    then produces reply_tokens tokens at tokens_per_second. A share of the requests fails
+    with a 500 (error_rate) or a 429 (rate_limit_rate) instead.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        jitter: float = 0.2,
+        tokens_per_second: float = 200.0,
+        reply_tokens: int = 60,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+        self.stats = Counter()
+        self.app = web.Application()
+        self.app.router.add_post("/v1/chat/completions", self.chat_completions)
+        self.app.router.add_post("/v1/embeddings", self.embeddings)
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        self.stats["requests"] += 1
+
+        roll = self.random.random()
+        if roll < self.error_rate:
+            self.stats["errors"] += 1
+            return web.json_response(
+                {"error": {"message": "Injected error", "type": "server_error"}},
+                status=500,
+            )
+        if roll < self.error_rate + self.rate_limit_rate:
+            self.stats["rate_limited"] += 1
+            return web.json_response(
+                {"error": {"message": "Injected rate limit", "type": "requests"}},
+                status=429,
+                headers={"retry-after-ms": "200"},
+            )
+
+        await asyncio.sleep(self.latency + self.random.random() * self.jitter)
+        tokens = min(body.get("max_tokens") or self.reply_tokens, self.reply_tokens)
+        question = body["messages"][-1].get("content") or ""
+        prompt_tokens = sum(
+            len(message.get("content") or "") // 4 + 4 for message in body["messages"]
+        )
+        words = [f"answer{index}" for index in range(tokens)]
+        headers = {
+            "x-ratelimit-limit-requests": "10000",
+            "x-ratelimit-remaining-requests": "9999",
+            "x-ratelimit-limit-tokens": "10000000",
+            "x-ratelimit-remaining-tokens": "9999999",
+        }
+
+        if body.get("stream"):
+            response = web.StreamResponse(
+                headers={"content-type": "text/event-stream", **headers}
+            )
+            await response.prepare(request)
+            for word in words:
+                await asyncio.sleep(1 / self.tokens_per_second)
+                chunk = {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body["model"],
+                    "choices": [
+                        {
+                            "index": 0,
+                            "delta": {"content": word + " "},
+                            "finish_reason": None,
+                        }
+                    ],
+                }
+                await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await response.write(b"data: [DONE]\n\n")
+            self.stats["completed"] += 1
+            return response
+
+        await asyncio.sleep(tokens / self.tokens_per_second)
+        self.stats["completed"] += 1
+        return web.json_response(
+            {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {
+                            "role": "assistant",
+                            "content": f"About {question[:40]}: " + " ".join(words),
+                        },
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": tokens,
+                    "total_tokens": prompt_tokens + tokens,
+                },
+            },
+            headers=headers,
+        )
+
+    async def embeddings(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.stats["embeddings"] += 1
+        digest = hashlib.sha256(str(body["input"]).lower().encode("utf-8")).digest()
+        vector = [byte / 255 - 0.5 for byte in digest]
+        return web.json_response(
+            {
+                "object": "list",
+                "data": [{"object": "embedding", "index": 0, "embedding": vector}],
+                "model": body["model"],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            }
+        )
+
+
+class FakeBotServices:
+    """
+    A stand-in for the Bot Framework connector and token service and the identity provider.
+
+    The token service hands out RS256 tokens signed with a key published at
+    /.well-known/jwks.json, so the bot verifies them like real ones. The connector records
+    when the first reply to each activity arrives. Proactive replies do not carry the ID of
+    the activity they answer, so they are matched to the oldest unanswered activity of
+    their conversation.
+    """
+
+    def __init__(self, audience: str = "https://benchmark-api"):
+        self.audience = audience
+        self.base_url: Optional[str] = None
+        self.private_key = rsa.generate_private_key(
+            public_exponent=65537, key_size=2048
+        )
+        self.kid = uuid.uuid4().hex
+        self.stats = Counter()
+        self._reply_waiters: Dict[str, List[asyncio.Future]] = defaultdict(list)
+        self._unanswered: Dict[str, Deque[str]] = defaultdict(deque)
+        self._tokens: Dict[str, str] = {}
+
+        self.app = web.Application()
+        self.app.router.add_get("/api/usertoken/GetToken", self.get_token)
+        self.app.router.add_post(
+            "/v3/conversations/{conversation_id}/activities", self.send_activity
+        )
+        self.app.router.add_post(
+            "/v3/conversations/{conversation_id}/activities/{activity_id}",
+            self.send_activity,
+        )
+        self.app.router.add_put(
+            "/v3/conversations/{conversation_id}/activities/{activity_id}",
+            self.update_activity,
+        )
+        self.app.router.add_get("/.well-known/jwks.json", self.jwks)
+        self.app.router.add_get("/userinfo", self.userinfo)
+
+    @property
+    def issuer(self) -> str:
+        return f"{self.base_url}/"
+
+    def wait_for_reply(self, activity_id: str, conversation_id: str) -> asyncio.Future:
+        """
+        Return a future that resolves with the arrival time of the first reply to an activity.
+        """
+        future = asyncio.get_running_loop().create_future()
+        if activity_id not in self._reply_waiters:
+            self._unanswered[conversation_id].append(activity_id)
+        self._reply_waiters[activity_id].append(future)
+        return future
+
+    def _resolve_reply(self, conversation_id: str, reply_to: Optional[str], at: float):
+        unanswered = self._unanswered.get(conversation_id)
+        if reply_to not in self._reply_waiters:
+            reply_to = None
+            while unanswered and reply_to is None:
+                candidate = unanswered.popleft()
+                if candidate in self._reply_waiters:
+                    reply_to = candidate
+            if reply_to is None:
+                return
+        elif unanswered and reply_to in unanswered:
+            unanswered.remove(reply_to)
+        if not unanswered:
+            self._unanswered.pop(conversation_id, None)
+        for future in self._reply_waiters.pop(reply_to):
+            if not future.done():
+                future.set_result(at)
+
+    def issue_token(self, user_id: str) -> str:
+        token = self._tokens.get(user_id)
+        if token is None:
+            now = int(time.time())
+            token = self._tokens[user_id] = jwt.encode(
+                {
+                    "sub": user_id,
+                    "iss": self.issuer,
+                    "aud": [self.audience, f"{self.base_url}/userinfo"],
+                    "iat": now,
+                    "exp": now + 3600,
+                },
+                self.private_key,
+                algorithm="RS256",
+                headers={"kid": self.kid},
+            )
+        return token
+
+    async def get_token(self, request: web.Request) -> web.Response:
+        self.stats["token_requests"] += 1
+        user_id = request.query.get("userId", "")
+        return web.json_response(
+            {
+                "channelId": request.query.get("channelId"),
+                "connectionName": request.query.get("connectionName"),
+                "token": self.issue_token(user_id),
+                "expiration": None,
+            }
+        )
+
+    async def send_activity(self, request: web.Request) -> web.Response:
+        arrived_at = time.perf_counter()
+        activity = await request.json()
+        self.stats[f"activities.{activity.get('type')}"] += 1
+        if activity.get("type") == "message":
+            self._resolve_reply(
+                request.match_info["conversation_id"],
+                request.match_info.get("activity_id") or activity.get("replyToId"),
+                arrived_at,
+            )
+        return web.json_response({"id": uuid.uuid4().hex})
+
+    async def update_activity(self, request: web.Request) -> web.Response:
+        self.stats["activities.update"] += 1
+        return web.json_response({"id": request.match_info["activity_id"]})
+
+    async def jwks(self, request: web.Request) -> web.Response:
+        self.stats["jwks_requests"] += 1
+        key = json.loads(RSAAlgorithm.to_jwk(self.private_key.public_key()))
+        key.update({"kid": self.kid, "use": "sig", "alg": "RS256"})
+        return web.json_response({"keys": [key]})
+
+    async def userinfo(self, request: web.Request) -> web.Response:
+        self.stats["userinfo_requests"] += 1
+        token = request.headers.get("Authorization", "")[len("Bearer ") :]
+        claims = jwt.decode(token, options={"verify_signature": False})
+        return web.json_response(
+            {
+                "id": claims["sub"],
+                "email": f"{claims['sub']}@example.com",
+                "name": claims["sub"],
+                "given_name": claims["sub"],
+            }
+        )
@@ -0,0 +1,392 @@
+"""
+Load test the bot against local fake OpenAI and Bot Framework services.
+
+Starts the app from app.create_app() wired to FakeOpenAI and FakeBotServices, replays Teams message
+activities from many users at a target rate and reports turn latency, throughput,
+event loop lag and memory growth. Results are written as JSON and can be compared
+with an earlier run:
+
+    python -m benchmarks.run --rps 50 --duration 60 --output results/main.json
+    python -m benchmarks.run --rps 50 --duration 60 --compare results/main.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from benchmarks.fakes import FakeBotServices, FakeOpenAI, start_site
+from benchmarks.workload import Workload
+
+# Metrics compared against a baseline, and whether lower values are better.
+COMPARED_METRICS = {
+    "turn_latency.p50": True,
+    "turn_latency.p95": True,
+    "turn_latency.p99": True,
+    "reply_latency.p95": True,
+    "throughput_rps": False,
+    "event_loop_lag.p99": True,
+    "memory.growth_bytes": True,
+}
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None}
+    ordered = sorted(values)
+
+    def at(percentile: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile))]
+
+    return {
+        "count": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "p50": at(0.50),
+        "p95": at(0.95),
+        "p99": at(0.99),
+        "max": ordered[-1],
+    }
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # ru_maxrss is the peak, in kilobytes on Linux and bytes on macOS.
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop wakes up a task that sleeps for interval seconds.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            started_at = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(
+                max(0.0, time.perf_counter() - started_at - self.interval)
+            )
+
+
+def bot_environment(openai_url: str, services: FakeBotServices) -> Dict[str, str]:
+    """
+    Return the settings that point the bot at the fake services.
+    """
+    return {
+        # No app ID disables Bot Framework authentication, like the Emulator.
+        "MICROSOFT_APP_ID": "",
+        "MICROSOFT_APP_PASSWORD": "",
+        "CONNECTION_NAME": "benchmark",
+        "AUTH0_ISSUER": services.issuer,
+        "AUTH0_AUDIENCE": services.audience,
+        "AUTH0_ALGORITHM": "RS256",
+        "OPENAI_API_KEY": "sk-benchmark",
+        "OPENAI_BASE_URL": f"{openai_url}/v1",
+        "STORAGE_BACKEND": "memory",
+    }
+
+
+def configure_environment(args, openai_url: str, services: FakeBotServices):
+    """
+    Point the bot at the fake services. Must run before app.py is imported.
+    """
+    os.environ.update(bot_environment(openai_url, services))
+    for setting in args.env:
+        name, _, value = setting.partition("=")
+        os.environ[name] = value
+
+
+async def run(args) -> dict:
+    fake_openai = FakeOpenAI(
+        latency=args.openai_latency,
+        jitter=args.openai_jitter,
+        tokens_per_second=args.tokens_per_second,
+        reply_tokens=args.reply_tokens,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+    )
+    services = FakeBotServices()
+    openai_runner, openai_url = await start_site(fake_openai.app)
+    services_runner, services.base_url = await start_site(services.app)
+    configure_environment(args, openai_url, services)
+
+    import app as bot_app
+
+    logging.getLogger().setLevel(args.log_level)
+    app = bot_app.create_app()
+    # The public cloud authentication has no setting for the token service URL, and
+    # setting OAUTH_URL switches to a mode that rejects unauthenticated requests.
+    adapter = app[bot_app.BOT_APP].adapter
+    adapter.bot_framework_authentication._inner._oauth_endpoint = services.base_url
+    bot_runner, bot_url = await start_site(app)
+    messages_url = f"{bot_url}/internal/api/messages"
+    workload = Workload(
+        services.base_url,
+        users=args.users,
+        tenants=args.tenants,
+        redelivery_rate=args.redelivery_rate,
+        seed=args.seed,
+    )
+    rng = random.Random(args.seed)
+
+    turn_latencies: List[float] = []
+    reply_latencies: List[float] = []
+    statuses = Counter()
+    redeliveries = Counter()
+    replies_at: List[float] = []
+    lag = LoopLagMonitor()
+    in_flight = set()
+
+    async def send(
+        session: aiohttp.ClientSession,
+        activity: dict,
+        redelivery: bool,
+        measured: bool,
+    ):
+        reply = None
+        if not redelivery:
+            reply = services.wait_for_reply(
+                activity["id"], activity["conversation"]["id"]
+            )
+        started_at = time.perf_counter()
+        try:
+            async with session.post(messages_url, json=activity) as response:
+                await response.read()
+                status = response.status
+        except aiohttp.ClientError as e:
+            status = type(e).__name__
+        finished_at = time.perf_counter()
+        if not measured:
+            return
+        if redelivery:
+            redeliveries[status] += 1
+            return
+        statuses[status] += 1
+        turn_latencies.append(finished_at - started_at)
+        try:
+            replied_at = await asyncio.wait_for(reply, args.reply_timeout)
+        except asyncio.TimeoutError:
+            statuses["no_reply"] += 1
+        else:
+            reply_latencies.append(replied_at - started_at)
+            replies_at.append(replied_at)
+
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=args.request_timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        lag.start()
+        started_at = time.perf_counter()
+        measure_from = started_at + args.warmup
+        end_at = measure_from + args.duration
+        rss_start = None
+        sent = 0
+        next_at = started_at
+        # Open loop: activities arrive at the target rate whether or not the bot keeps up.
+        while next_at < end_at:
+            now = time.perf_counter()
+            if next_at > now:
+                await asyncio.sleep(next_at - now)
+            measured = next_at >= measure_from
+            if measured and rss_start is None:
+                rss_start = rss_bytes()
+                lag.samples.clear()
+            activity, redelivery = workload.next_activity()
+            task = asyncio.create_task(send(session, activity, redelivery, measured))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            sent += measured
+            next_at += rng.expovariate(args.rps)
+
+        send_finished_at = time.perf_counter()
+        await asyncio.gather(*in_flight, return_exceptions=True)
+        await lag.stop()
+
+    rss_end = rss_bytes()
+    completed = statuses.get(200, 0) + statuses.get(201, 0)
+    replied_at_end = max(replies_at, default=measure_from)
+    await bot_runner.cleanup()
+    await services_runner.cleanup()
+    await openai_runner.cleanup()
+
+    return {
+        "run": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "rps": args.rps,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "users": args.users,
+            "tenants": args.tenants,
+            "openai_latency": args.openai_latency,
+            "openai_jitter": args.openai_jitter,
+            "tokens_per_second": args.tokens_per_second,
+            "reply_tokens": args.reply_tokens,
+            "error_rate": args.error_rate,
+            "rate_limit_rate": args.rate_limit_rate,
+            "redelivery_rate": args.redelivery_rate,
+            "seed": args.seed,
+            "env": args.env,
+        },
+        "requests": {
+            "sent": sent,
+            "completed": completed,
+            "replied": len(replies_at),
+            "statuses": {str(status): count for status, count in statuses.items()},
+            "redeliveries": {
+                str(status): count for status, count in redeliveries.items()
+            },
+        },
+        "turn_latency": percentiles(turn_latencies),
+        "reply_latency": percentiles(reply_latencies),
+        # Turns answered per second; with asynchronous replies the answer comes after the
+        # request completed.
+        "throughput_rps": len(replies_at) / max(replied_at_end - measure_from, 1e-9),
+        "offered_rps": sent / max(send_finished_at - measure_from, 1e-9),
+        "event_loop_lag": percentiles(lag.samples),
+        "memory": {
+            "rss_start_bytes": rss_start,
+            "rss_end_bytes": rss_end,
+            "growth_bytes": rss_end - (rss_start or rss_end),
+        },
+        "openai": dict(fake_openai.stats),
+        "bot_services": dict(services.stats),
+    }
+
+
+def metric(results: dict, path: str) -> Optional[float]:
+    value = results
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> List[str]:
+    """
+    Print how the results differ from a baseline and return the metrics that regressed.
+    """
+    regressions = []
+    print(f"{'metric':<24}{'baseline':>14}{'current':>14}{'change':>10}")
+    for path, lower_is_better in COMPARED_METRICS.items():
+        old, new = metric(baseline, path), metric(results, path)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else 0.0
+        print(f"{path:<24}{old:>14.4f}{new:>14.4f}{change:>+10.1%}")
+        worse = change > max_regression if lower_is_better else change < -max_regression
+        # Memory growth and loop lag are noisy near zero; ignore tiny absolute changes.
+        if (
+            worse
+            and abs(new - old) > 0.001
+            and not (path == "memory.growth_bytes" and abs(new - old) < 8 * 1024 * 1024)
+        ):
+            regressions.append(path)
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--rps", type=float, default=20, help="Target activities per second."
+    )
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds.")
+    parser.add_argument(
+        "--warmup", type=float, default=5, help="Unmeasured seconds first."
+    )
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--tenants", type=int, default=5)
+    parser.add_argument("--openai-latency", type=float, default=0.5)
+    parser.add_argument("--openai-jitter", type=float, default=0.2)
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--redelivery-rate", type=float, default=0.0)
+    parser.add_argument("--request-timeout", type=float, default=30)
+    parser.add_argument("--reply-timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--env",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="Bot setting to override, e.g. --env RESPONSE_CACHE_ENABLED=true.",
+    )
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", help="Compare with the results in this JSON file.")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.1,
+        help="Relative change of a compared metric that counts as a regression.",
+    )
+    parser.add_argument("--log-level", default="WARNING")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print(f"Regressed: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""
+Measure how long the bot takes to start and to answer its first requests.
+
+Every run starts a fresh Python process that imports app.py, builds the application,
+starts serving and then times its first /health request, the wait until /ready reports
+the warm-up done, and the first message turn against local fake OpenAI and Bot Framework
+services. The medians over all runs are reported as JSON:
+
+    python -m benchmarks.startup --runs 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+# Taken before anything else is imported, so the child's import time is measured cold.
+_STARTED_AT = time.perf_counter()
+
+
+async def measure_child() -> Dict[str, float]:
+    """
+    Start the bot in this process and time its startup. Runs in the child process.
+    """
+    timings = {}
+    started_at = time.perf_counter()
+    import app as bot_app
+
+    timings["import_app"] = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    app = bot_app.create_app()
+    timings["create_app"] = time.perf_counter() - started_at
+    adapter = app[bot_app.BOT_APP].adapter
+    services_url = os.environ["BENCHMARK_SERVICES_URL"]
+    # See benchmarks.run: the token service URL has no setting.
+    adapter.bot_framework_authentication._inner._oauth_endpoint = services_url
+
+    import aiohttp
+
+    from benchmarks.fakes import start_site
+    from benchmarks.workload import Workload
+
+    started_at = time.perf_counter()
+    runner, url = await start_site(app)
+    timings["start_serving"] = time.perf_counter() - started_at
+    listening_at = time.perf_counter()
+
+    async with aiohttp.ClientSession() as session:
+        started_at = time.perf_counter()
+        async with session.get(f"{url}/health") as response:
+            await response.read()
+        timings["first_health"] = time.perf_counter() - started_at
+
+        while True:
+            async with session.get(f"{url}/ready") as response:
+                if response.status == 200:
+                    break
+            await asyncio.sleep(0.005)
+        timings["ready_after_listening"] = time.perf_counter() - listening_at
+
+        activity, _ = Workload(services_url, users=1, seed=1).next_activity()
+        started_at = time.perf_counter()
+        async with session.post(
+            f"{url}/internal/api/messages", json=activity
+        ) as response:
+            await response.read()
+            if response.status >= 400:
+                raise RuntimeError(f"The first turn failed with {response.status}")
+        timings["first_turn"] = time.perf_counter() - started_at
+
+    timings["total"] = time.perf_counter() - _STARTED_AT
+    await runner.cleanup()
+    return timings
+
+
+async def measure(runs: int) -> Dict[str, Dict[str, float]]:
+    from benchmarks.fakes import FakeBotServices, FakeOpenAI, start_site
+    from benchmarks.run import bot_environment
+
+    fake_openai = FakeOpenAI(latency=0.0, jitter=0.0, tokens_per_second=1e6)
+    services = FakeBotServices()
+    openai_runner, openai_url = await start_site(fake_openai.app)
+    services_runner, services.base_url = await start_site(services.app)
+    env = {
+        **os.environ,
+        **bot_environment(openai_url, services),
+        "BENCHMARK_SERVICES_URL": services.base_url,
+    }
+
+    samples: Dict[str, List[float]] = {}
+    try:
+        for _ in range(runs):
+            child = await asyncio.create_subprocess_exec(
+                sys.executable,
+                "-m",
+                "benchmarks.startup",
+                "--child",
+                env=env,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            stdout, _ = await child.communicate()
+            if child.returncode != 0:
+                raise RuntimeError(f"The bot process exited with {child.returncode}")
+            for name, value in json.loads(stdout.decode().splitlines()[-1]).items():
+                samples.setdefault(name, []).append(value)
+    finally:
+        await openai_runner.cleanup()
+        await services_runner.cleanup()
+
+    return {
+        name: {
+            "median": statistics.median(values),
+            "min": min(values),
+            "max": max(values),
+        }
+        for name, values in samples.items()
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(asyncio.run(measure_child())))
+        return 0
+    print(json.dumps(asyncio.run(measure(args.runs)), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import random
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+# Questions Teams users tend to open with; repeats let the response cache and
+# single-flight show up in the numbers.
+COMMON_QUESTIONS = [
+    "How do I reset my password?",
+    "What are the office opening hours?",
+    "How do I request vacation days?",
+    "Where can I find the expense policy?",
+    "How do I connect to the VPN?",
+    "Who do I contact for IT support?",
+    "Can you summarize the onboarding checklist?",
+    "How do I book a meeting room?",
+]
+
+FOLLOW_UPS = [
+    "Can you give me more detail on that?",
+    "What about for contractors?",
+    "Is there a deadline for this?",
+    "Thanks, and how long does it usually take?",
+    "Can you put that in a short list?",
+    "What if that does not work?",
+]
+
+
+class SimulatedUser:
+    """
+    A Teams user with one personal conversation with the bot.
+    """
+
+    def __init__(self, index: int, tenant_id: str, rng: random.Random):
+        self.user_id = f"29:benchmark-user-{index}"
+        self.name = f"Benchmark User {index}"
+        self.tenant_id = tenant_id
+        self.conversation_id = f"a:benchmark-conversation-{index}"
+        self.turns = 0
+        self.rng = rng
+
+    def next_text(self) -> str:
+        self.turns += 1
+        if self.turns == 1 or self.rng.random() < 0.2:
+            return self.rng.choice(COMMON_QUESTIONS)
+        return self.rng.choice(FOLLOW_UPS) + f" (#{self.turns})"
+
+
+class Workload:
+    """
+    Generates Teams message activities from a population of users spread over tenants.
+    """
+
+    def __init__(
+        self,
+        service_url: str,
+        users: int = 200,
+        tenants: int = 5,
+        redelivery_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        """
+        Initialize the Workload.
+
+        Args:
+            service_url (str): The connector URL the bot sends its replies to.
+            users (int): Number of simulated users.
+            tenants (int): Number of tenants the users are spread over.
+            redelivery_rate (float): Share of activities that are delivered a second time,
+                like the Bot Framework does when the bot answers too slowly.
+            seed (int, optional): Seed for a reproducible activity stream.
+        """
+        self.service_url = service_url
+        self.redelivery_rate = redelivery_rate
+        self.rng = random.Random(seed)
+        self.tenants = [f"benchmark-tenant-{index}" for index in range(tenants)]
+        self.users: List[SimulatedUser] = [
+            SimulatedUser(index, self.tenants[index % tenants], self.rng)
+            for index in range(users)
+        ]
+        self._recent: List[Dict] = []
+
+    def next_activity(self) -> Tuple[Dict, bool]:
+        """
+        Return the next activity to post to the bot, and whether it is a redelivery of a
+        recent one.
+        """
+        if self._recent and self.rng.random() < self.redelivery_rate:
+            return self.rng.choice(self._recent), True
+
+        user = self.rng.choice(self.users)
+        activity = self.message(user, user.next_text())
+        self._recent.append(activity)
+        del self._recent[:-50]
+        return activity, False
+
+    def message(self, user: SimulatedUser, text: str) -> Dict:
+        return {
+            "type": "message",
+            "id": uuid.uuid4().hex,
+            "channelId": "msteams",
+            "serviceUrl": self.service_url,
+            "text": text,
+            "textFormat": "plain",
+            "locale": "en-US",
+            "from": {"id": user.user_id, "name": user.name},
+            "recipient": {"id": "28:benchmark-bot", "name": "Bot"},
+            "conversation": {
+                "id": user.conversation_id,
+                "conversationType": "personal",
+                "tenantId": user.tenant_id,
+            },
+            "channelData": {"tenant": {"id": user.tenant_id}},
+        }
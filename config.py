@@ -6,6 +6,8 @@ from dotenv import load_dotenv
 
 """ Bot Configuration """
 
+# The settings below are read when the class is defined, so .env has to be in the
+# environment by then; loading it takes a few milliseconds.
 dotenv_path = os.path.join(".env")
 load_dotenv(dotenv_path)
 
@@ -15,7 +17,10 @@ from decouple import config
 class DefaultConfig:
     """Bot Configuration"""
 
-    PORT = 3978
+    HOST = config("HOST", "0.0.0.0")
+    PORT = config("PORT", 3978, cast=int)
+    WORKERS = config("WORKERS", 1, cast=int)
+    SHUTDOWN_TIMEOUT_SECONDS = config("SHUTDOWN_TIMEOUT_SECONDS", 30.0, cast=float)
     APP_ID = config("MICROSOFT_APP_ID", "app_id")
     APP_PASSWORD = config("MICROSOFT_APP_PASSWORD", "pwd")
     APP_TYPE = config("MICROSOFT_APP_TYPE", "MultiTenant")
@@ -24,3 +29,111 @@ class DefaultConfig:
     AUTH_ISSUER = config("AUTH0_ISSUER", "")
     AUTH_ALGORITHM = config("AUTH0_ALGORITHM", "")
     OPENAI_API_KEY = config("OPENAI_API_KEY", "")
+    OPENAI_API_KEYS = config("OPENAI_API_KEYS", "")
+    OPENAI_KEY_RPM = config("OPENAI_KEY_RPM", 3500, cast=int)
+    OPENAI_KEY_TPM = config("OPENAI_KEY_TPM", 90000, cast=int)
+    OPENAI_KEY_MAX_WAIT_SECONDS = config(
+        "OPENAI_KEY_MAX_WAIT_SECONDS", 10.0, cast=float
+    )
+    OPENAI_BASE_URL = config("OPENAI_BASE_URL", "")
+    OPENAI_MAX_CONCURRENT = config("OPENAI_MAX_CONCURRENT", 64, cast=int)
+    OPENAI_CLASS_WEIGHTS = config(
+        "OPENAI_CLASS_WEIGHTS", "interactive:4,group:1,background:0.5"
+    )
+    OPENAI_TENANT_WEIGHTS = config("OPENAI_TENANT_WEIGHTS", "")
+    ROUTER_ENABLED = config("ROUTER_ENABLED", False, cast=bool)
+    ROUTER_FAST_MODEL = config("ROUTER_FAST_MODEL", "")
+    ROUTER_STRONG_MODEL = config("ROUTER_STRONG_MODEL", "")
+    ROUTER_LONG_MESSAGE_TOKENS = config("ROUTER_LONG_MESSAGE_TOKENS", 300, cast=int)
+    ROUTER_DEEP_CONVERSATION_MESSAGES = config(
+        "ROUTER_DEEP_CONVERSATION_MESSAGES", 20, cast=int
+    )
+    ROUTER_SLOW_FACTOR = config("ROUTER_SLOW_FACTOR", 1.5, cast=float)
+    ROUTER_PROBE_RATE = config("ROUTER_PROBE_RATE", 0.05, cast=float)
+    ROUTER_TENANT_MODELS = config("ROUTER_TENANT_MODELS", "")
+    OPENAI_TIMEOUT_SECONDS = config("OPENAI_TIMEOUT_SECONDS", 30.0, cast=float)
+    OPENAI_MAX_RETRIES = config("OPENAI_MAX_RETRIES", 2, cast=int)
+    OPENAI_RETRY_BASE_DELAY_SECONDS = config(
+        "OPENAI_RETRY_BASE_DELAY_SECONDS", 0.25, cast=float
+    )
+    OPENAI_RETRY_MAX_DELAY_SECONDS = config(
+        "OPENAI_RETRY_MAX_DELAY_SECONDS", 4.0, cast=float
+    )
+    OPENAI_HEDGING_ENABLED = config("OPENAI_HEDGING_ENABLED", False, cast=bool)
+    OPENAI_HEDGE_MIN_DELAY_SECONDS = config(
+        "OPENAI_HEDGE_MIN_DELAY_SECONDS", 1.0, cast=float
+    )
+    CIRCUIT_FAILURE_THRESHOLD = config("CIRCUIT_FAILURE_THRESHOLD", 5, cast=int)
+    CIRCUIT_RECOVERY_SECONDS = config("CIRCUIT_RECOVERY_SECONDS", 30.0, cast=float)
+    FALLBACK_MODEL = config("FALLBACK_MODEL", "gpt-4o-mini")
+    USER_INFO_TTL_SECONDS = config("USER_INFO_TTL_SECONDS", 300, cast=float)
+    SESSION_CACHE_ENABLED = config("SESSION_CACHE_ENABLED", True, cast=bool)
+    SESSION_REFRESH_MARGIN_SECONDS = config(
+        "SESSION_REFRESH_MARGIN_SECONDS", 300, cast=float
+    )
+    HISTORY_MAX_MESSAGES = config("HISTORY_MAX_MESSAGES", 50, cast=int)
+    HISTORY_MAX_CONVERSATIONS = config("HISTORY_MAX_CONVERSATIONS", 10000, cast=int)
+    HISTORY_IDLE_TTL_SECONDS = config("HISTORY_IDLE_TTL_SECONDS", 3600, cast=float)
+    HISTORY_MEMORY_BUDGET_BYTES = config(
+        "HISTORY_MEMORY_BUDGET_BYTES", 64 * 1024 * 1024, cast=int
+    )
+    HISTORY_REVALIDATE = config("HISTORY_REVALIDATE", True, cast=bool)
+    CONTEXT_MAX_TOKENS = config("CONTEXT_MAX_TOKENS", 4096, cast=int)
+    SUMMARY_MODEL = config("SUMMARY_MODEL", "")
+    RESPONSE_CACHE_ENABLED = config("RESPONSE_CACHE_ENABLED", False, cast=bool)
+    RESPONSE_CACHE_TTL_SECONDS = config("RESPONSE_CACHE_TTL_SECONDS", 3600, cast=float)
+    RESPONSE_CACHE_MAX_ENTRIES = config("RESPONSE_CACHE_MAX_ENTRIES", 10000, cast=int)
+    RESPONSE_CACHE_MEMORY_BYTES = config(
+        "RESPONSE_CACHE_MEMORY_BYTES", 32 * 1024 * 1024, cast=int
+    )
+    SEMANTIC_CACHE_THRESHOLD = config("SEMANTIC_CACHE_THRESHOLD", 0.0, cast=float)
+    EMBEDDING_MODEL = config("EMBEDDING_MODEL", "text-embedding-3-small")
+    STORAGE_BACKEND = config("STORAGE_BACKEND", "memory")
+    MONGODB_URI = config("MONGODB_URI", "mongodb://localhost:27017")
+    MONGO_DATABASE = config("MONGO_DATABASE", "ms_teams_chat_bot")
+    MONGO_CONVERSATION_COLLECTION = config(
+        "MONGO_CONVERSATION_COLLECTION", "conversations"
+    )
+    MONGO_STATE_COLLECTION = config("MONGO_STATE_COLLECTION", "bot_state")
+    STORAGE_TTL_SECONDS = config("STORAGE_TTL_SECONDS", 30 * 24 * 3600, cast=float)
+    STORAGE_CACHE_TTL_SECONDS = config("STORAGE_CACHE_TTL_SECONDS", 5.0, cast=float)
+    STORAGE_WRITE_BEHIND = config("STORAGE_WRITE_BEHIND", True, cast=bool)
+    STORAGE_FLUSH_INTERVAL_SECONDS = config(
+        "STORAGE_FLUSH_INTERVAL_SECONDS", 0.2, cast=float
+    )
+    STORAGE_MAX_PENDING_WRITES = config("STORAGE_MAX_PENDING_WRITES", 2000, cast=int)
+    ADMISSION_MAX_CONCURRENT = config("ADMISSION_MAX_CONCURRENT", 64, cast=int)
+    ADMISSION_MAX_PER_TENANT = config("ADMISSION_MAX_PER_TENANT", 32, cast=int)
+    ADMISSION_MAX_PER_USER = config("ADMISSION_MAX_PER_USER", 2, cast=int)
+    ADMISSION_MAX_QUEUE = config("ADMISSION_MAX_QUEUE", 256, cast=int)
+    ADMISSION_QUEUE_TIMEOUT_SECONDS = config(
+        "ADMISSION_QUEUE_TIMEOUT_SECONDS", 10.0, cast=float
+    )
+    PROFILING_ENABLED = config("PROFILING_ENABLED", False, cast=bool)
+    ADMIN_TOKEN = config("ADMIN_TOKEN", "")
+    LOOP_STALL_THRESHOLD_SECONDS = config(
+        "LOOP_STALL_THRESHOLD_SECONDS", 0.1, cast=float
+    )
+    PROFILE_MAX_SECONDS = config("PROFILE_MAX_SECONDS", 60.0, cast=float)
+    ACTIVITY_DEDUP_TTL_SECONDS = config("ACTIVITY_DEDUP_TTL_SECONDS", 600, cast=float)
+    ACTIVITY_DEDUP_MAX_SIZE = config("ACTIVITY_DEDUP_MAX_SIZE", 100000, cast=int)
+    MONGO_ACTIVITY_COLLECTION = config("MONGO_ACTIVITY_COLLECTION", "activities")
+    MAILBOX_ENABLED = config("MAILBOX_ENABLED", True, cast=bool)
+    MAILBOX_DEBOUNCE_SECONDS = config("MAILBOX_DEBOUNCE_SECONDS", 0.0, cast=float)
+    MAILBOX_MAX_MERGED = config("MAILBOX_MAX_MERGED", 5, cast=int)
+    MAILBOX_TYPING_INTERVAL_SECONDS = config(
+        "MAILBOX_TYPING_INTERVAL_SECONDS", 3.0, cast=float
+    )
+    ASYNC_REPLIES_ENABLED = config("ASYNC_REPLIES_ENABLED", False, cast=bool)
+    REPLY_QUEUE_BACKEND = config("REPLY_QUEUE_BACKEND", "memory")
+    MONGO_JOB_COLLECTION = config("MONGO_JOB_COLLECTION", "reply_jobs")
+    REPLY_QUEUE_SIZE = config("REPLY_QUEUE_SIZE", 1000, cast=int)
+    REPLY_WORKERS = config("REPLY_WORKERS", 8, cast=int)
+    REPLY_MAX_ATTEMPTS = config("REPLY_MAX_ATTEMPTS", 3, cast=int)
+    REPLY_JOB_LEASE_SECONDS = config("REPLY_JOB_LEASE_SECONDS", 120.0, cast=float)
+    METRICS_ENABLED = config("METRICS_ENABLED", True, cast=bool)
+    TRACING_ENABLED = config("TRACING_ENABLED", False, cast=bool)
+    STREAMING_ENABLED = config("STREAMING_ENABLED", False, cast=bool)
+    STREAMING_UPDATE_INTERVAL_SECONDS = config(
+        "STREAMING_UPDATE_INTERVAL_SECONDS", 1.0, cast=float
+    )
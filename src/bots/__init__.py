@@ -3,5 +3,6 @@
 
 from .dialog_bot import DialogBot
 from .auth_bot import AuthBot
+from .busy_bot import BusyBot
 
-__all__ = ["DialogBot", "AuthBot"]
+__all__ = ["DialogBot", "AuthBot", "BusyBot"]
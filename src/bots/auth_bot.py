@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from botbuilder.core import (
     ConversationState,
     UserState,
@@ -6,8 +6,8 @@ from botbuilder.core import (
 )
 from botbuilder.dialogs import Dialog
 from botbuilder.schema import ChannelAccount
-from src.helpers.dialog_helper import DialogHelper
 from src.bots.dialog_bot import DialogBot
+from src.runtime.mailbox import ConversationMailbox
 
 
 class AuthBot(DialogBot):
@@ -16,8 +16,9 @@ class AuthBot(DialogBot):
         conversation_state: ConversationState,
         user_state: UserState,
         dialog: Dialog,
+        mailbox: Optional[ConversationMailbox] = None,
     ):
-        super(AuthBot, self).__init__(conversation_state, user_state, dialog)
+        super(AuthBot, self).__init__(conversation_state, user_state, dialog, mailbox)
 
     async def on_members_added_activity(
         self, members_added: List[ChannelAccount], turn_context: TurnContext
@@ -27,9 +28,13 @@ class AuthBot(DialogBot):
                 await turn_context.send_activity("Hello, welcome to Bot 😊")
                 print("new member has been added!")
 
+    async def answer_without_dialog(self, turn_context: TurnContext) -> bool:
+        # Signed-in users are answered with their cached token, unless a dialog, like a
+        # sign-in prompt, is waiting for this message.
+        dialog_state = await self.dialog_state.get(turn_context)
+        if dialog_state is not None and dialog_state.dialog_stack:
+            return False
+        return await self.dialog.continue_session(turn_context)
+
     async def on_sign_in_invoke(self, turn_context: TurnContext):
-        return await DialogHelper.run_dialog(
-            self.dialog,
-            turn_context,
-            self.conversation_state.create_property("DialogState"),
-        )
+        return await self.run_dialog(turn_context)
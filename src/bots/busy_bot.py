@@ -0,0 +1,13 @@
+from botbuilder.core import ActivityHandler, TurnContext
+
+
+class BusyBot(ActivityHandler):
+    """
+    Answers messages that could not be admitted with a short "busy" reply.
+    """
+
+    def __init__(self, text: str = "I'm busy right now, please try again shortly."):
+        self.text = text
+
+    async def on_message_activity(self, turn_context: TurnContext):
+        await turn_context.send_activity(self.text)
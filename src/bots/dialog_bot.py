@@ -1,6 +1,11 @@
+import asyncio
+from typing import Optional
 from botbuilder.core import ActivityHandler, ConversationState, UserState, TurnContext
 from botbuilder.dialogs import Dialog
+from botbuilder.schema import ActivityTypes
 from src.helpers.dialog_helper import DialogHelper
+from src.runtime.mailbox import ConversationMailbox
+from src.telemetry import span
 
 
 class DialogBot(ActivityHandler):
@@ -9,6 +14,7 @@ class DialogBot(ActivityHandler):
         conversation_state: ConversationState,
         user_state: UserState,
         dialog: Dialog,
+        mailbox: Optional[ConversationMailbox] = None,
     ):
         if conversation_state is None:
             raise Exception(
@@ -22,16 +28,65 @@ class DialogBot(ActivityHandler):
         self.conversation_state = conversation_state
         self.user_state = user_state
         self.dialog = dialog
+        # Built once: the dialog state is loaded per turn, the rest does not change.
+        self.dialog_state = conversation_state.create_property("DialogState")
+        self.dialog_set = DialogHelper.create_dialog_set(dialog, self.dialog_state)
+        self.commands = getattr(dialog, "commands", None)
+        self.mailbox = mailbox
 
     async def on_turn(self, turn_context: TurnContext):
+        # With a mailbox the turns of a conversation run one at a time, so they do not
+        # overwrite each other's state or history, and bursts of messages are merged.
+        if self.mailbox is None:
+            await self.run_turn(turn_context)
+        else:
+            await self.mailbox.submit(
+                turn_context, self.run_turn, self.is_mergeable(turn_context)
+            )
+
+    def is_mergeable(self, turn_context: TurnContext) -> bool:
+        """
+        Returns whether the activity is a plain message, which can be merged with the
+        messages sent right before or after it.
+        """
+        activity = turn_context.activity
+        return (
+            activity.type == ActivityTypes.message
+            and bool(activity.text)
+            and (self.commands is None or self.commands.match(activity.text) is None)
+        )
+
+    async def run_turn(self, turn_context: TurnContext):
         await super().on_turn(turn_context)
 
-        await self.conversation_state.save_changes(turn_context, False)
-        await self.user_state.save_changes(turn_context, False)
+        # The reply has been sent by now. With a write-behind storage these saves only
+        # queue the changes, which are written in batches off the turn's critical path.
+        with span("state_save"):
+            await asyncio.gather(
+                self.conversation_state.save_changes(turn_context, False),
+                self.user_state.save_changes(turn_context, False),
+            )
 
     async def on_message_activity(self, turn_context: TurnContext):
+        # Commands like logout are handled without loading the dialog stack, which is
+        # cleared when the command ends the conversation.
+        if self.commands is not None and await self.commands.route(turn_context):
+            await self.dialog_state.delete(turn_context)
+            return
+        if await self.answer_without_dialog(turn_context):
+            return
+        await self.run_dialog(turn_context)
+
+    async def answer_without_dialog(self, turn_context: TurnContext) -> bool:
+        """
+        Answers a message without running the dialog, when the bot has a fast path for it.
+
+        Returns:
+            bool: Whether the message was answered.
+        """
+        return False
+
+    async def run_dialog(self, turn_context: TurnContext):
         await DialogHelper.run_dialog(
-            self.dialog,
-            turn_context,
-            self.conversation_state.create_property("DialogState"),
+            self.dialog, turn_context, self.dialog_state, self.dialog_set
         )
@@ -1,4 +1,7 @@
-from src.conversation.roles.role_classes import BaseRole
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from src.conversation.roles.role_classes import BaseRole, SystemRole
 
 
 class ConversationHistory:
@@ -6,24 +9,85 @@ class ConversationHistory:
     A class to manage the history of a conversation between the user and assistant using role classes.
     """
 
-    def __init__(self):
-        self.history = []
+    def __init__(
+        self,
+        conversation_id: Optional[str] = None,
+        tenant_id: Optional[str] = None,
+        max_messages: Optional[int] = None,
+        on_change: Optional[Callable[["ConversationHistory", int], None]] = None,
+        collect_evicted: bool = False,
+    ):
+        """
+        Initialize an empty conversation history.
+
+        Args:
+            conversation_id (str, optional): The Bot Framework conversation ID this history belongs to.
+            tenant_id (str, optional): The tenant the conversation belongs to.
+            max_messages (int, optional): Maximum number of non-system messages to keep. Unlimited if None.
+            on_change (callable, optional): Called with the history and the size delta in bytes whenever
+                the history changes.
+            collect_evicted (bool): Keep evicted messages in pending_summary so they can be summarized
+                instead of dropping them.
+        """
+        self.conversation_id = conversation_id
+        self.tenant_id = tenant_id
+        self.max_messages = max_messages
+        self.on_change = on_change
+        self.collect_evicted = collect_evicted
+        self.history: List[BaseRole] = []
+        self.total_tokens = 0
+        self.summary = None
+        self.summary_message = None
+        self.summary_tokens = 0
+        self.pending_summary: List[BaseRole] = []
+        self.size_bytes = 0
+        self.last_activity = time.monotonic()
+        # The version of the persisted document this history is based on, and the
+        # messages added since, which are added again if another process wrote it.
+        self.version = 0
+        self.unsaved: List[BaseRole] = []
 
     def add_message(self, message: BaseRole):
         """
         Add a role-based message to the conversation history.
 
+        The message itself is kept, with the token count it computed when it was created.
+
         Args:
             message (BaseRole): A message object from a specific role (UserRole, AssistantRole, SystemRole).
         """
-        self.history.append(message.to_dict())
+        self.history.append(message)
+        self.unsaved.append(message)
+        self.total_tokens += message.tokens
+        delta = self._entry_size(message)
+        delta -= self._trim()
+        self._resize(delta)
+        self.touch()
+
+    def remove_message(self, message: BaseRole):
+        """
+        Remove a message from the conversation history, if it is still there.
+
+        Args:
+            message (BaseRole): The message object that was added.
+        """
+        for index in range(len(self.history) - 1, -1, -1):
+            if self.history[index] is message:
+                del self.history[index]
+                break
+        else:
+            return
+        self.unsaved = [unsaved for unsaved in self.unsaved if unsaved is not message]
+        self.total_tokens -= message.tokens
+        self._resize(-self._entry_size(message))
+        self.touch()
 
     def get_history(self):
         """
-        Get the entire conversation history in dictionary format.
+        Get the entire conversation history.
 
         Returns:
-            list: The list of conversation messages.
+            list: The list of conversation messages, as role objects.
         """
         return self.history
 
@@ -32,3 +96,167 @@ class ConversationHistory:
         Clear the conversation history.
         """
         self.history = []
+        self.total_tokens = 0
+        self.summary = None
+        self.summary_message = None
+        self.summary_tokens = 0
+        self.pending_summary = []
+        self.unsaved = []
+        self._resize(-self.size_bytes)
+
+    def touch(self):
+        """
+        Mark the conversation as active now.
+        """
+        self.last_activity = time.monotonic()
+
+    def evict_oldest(self, count: int):
+        """
+        Remove the oldest non-system messages from the history.
+
+        Evicted messages are kept in pending_summary when collect_evicted is set, and dropped otherwise.
+
+        Args:
+            count (int): The number of messages to evict.
+        """
+        self._resize(-self._evict(count))
+
+    def apply_summary(self, summary: str, summarized: List[BaseRole]) -> bool:
+        """
+        Replace the rolling summary and release the pending messages it covers.
+
+        The summary is discarded if the summarized messages are no longer the front of
+        pending_summary, because the history was reloaded or rebased while it was computed.
+
+        Args:
+            summary (str): The new summary of all evicted messages so far.
+            summarized (list): The messages from the front of pending_summary folded into it.
+
+        Returns:
+            bool: Whether the summary was applied.
+        """
+        count = len(summarized)
+        front = self.pending_summary[:count]
+        if len(front) != count or any(a is not b for a, b in zip(front, summarized)):
+            return False
+        released = sum(self._entry_size(entry) for entry in front)
+        del self.pending_summary[:count]
+        released += len(self.summary or "")
+        self._set_summary(summary)
+        self._resize(len(summary) - released)
+        return True
+
+    def _trim(self) -> int:
+        """
+        Evict the oldest non-system messages until the history fits in max_messages.
+
+        Returns:
+            int: The number of bytes released.
+        """
+        if self.max_messages is None:
+            return 0
+        excess = (
+            sum(1 for entry in self.history if entry.role != "system")
+            - self.max_messages
+        )
+        return self._evict(excess)
+
+    def _evict(self, count: int) -> int:
+        if count <= 0:
+            return 0
+
+        released = 0
+        kept = []
+        for entry in self.history:
+            if count > 0 and entry.role != "system":
+                count -= 1
+                self.total_tokens -= entry.tokens
+                if self.collect_evicted:
+                    self.pending_summary.append(entry)
+                else:
+                    released += self._entry_size(entry)
+                continue
+            kept.append(entry)
+        self.history = kept
+        return released
+
+    def to_document(self) -> Dict[str, Any]:
+        """
+        Convert the history into a dictionary that can be persisted.
+
+        Messages are stored as their JSON encoding, which each message computes once, so
+        saving a conversation again does not encode its older messages again.
+
+        Returns:
+            dict: The conversation's messages, summary and pending messages, and the version
+                of the persisted document it is based on.
+        """
+        return {
+            "conversation_id": self.conversation_id,
+            "tenant_id": self.tenant_id,
+            "version": self.version,
+            "messages": [message.to_json() for message in self.history],
+            "summary": self.summary,
+            "pending_summary": [message.to_json() for message in self.pending_summary],
+        }
+
+    def load_document(self, document: Dict[str, Any]):
+        """
+        Replace the contents of the history with a persisted document created by to_document.
+
+        Args:
+            document (dict): The persisted conversation.
+        """
+        self.history = [self._load_message(m) for m in document.get("messages", [])]
+        self.unsaved = []
+        self.version = document.get("version", 0)
+        self.total_tokens = sum(message.tokens for message in self.history)
+        self.pending_summary = [
+            self._load_message(m) for m in document.get("pending_summary", [])
+        ]
+        self.summary = None
+        self.summary_message = None
+        self.summary_tokens = 0
+        if document.get("summary"):
+            self._set_summary(document["summary"])
+
+        size = sum(self._entry_size(entry) for entry in self.history)
+        size += sum(self._entry_size(entry) for entry in self.pending_summary)
+        size += len(self.summary or "")
+        self._resize(size - self.size_bytes)
+
+    def rebase(self, document: Optional[Dict[str, Any]]):
+        """
+        Replace the contents of the history with a newer persisted document, written by
+        another process, and add the messages added here since on top of it.
+
+        Args:
+            document (dict, optional): The persisted conversation, or None if it was deleted.
+        """
+        unsaved = self.unsaved
+        self.load_document(document or {})
+        for message in unsaved:
+            self.add_message(message)
+
+    def _set_summary(self, summary: str):
+        self.summary = summary
+        self.summary_message = SystemRole(
+            f"Summary of the earlier conversation: {summary}"
+        )
+        self.summary_tokens = self.summary_message.tokens
+
+    def _resize(self, delta: int):
+        self.size_bytes += delta
+        if self.on_change:
+            self.on_change(self, delta)
+
+    @staticmethod
+    def _load_message(stored) -> BaseRole:
+        # Documents written before messages were stored as JSON hold dictionaries.
+        if isinstance(stored, dict):
+            return BaseRole.from_dict(stored)
+        return BaseRole.from_json(stored)
+
+    @staticmethod
+    def _entry_size(entry: BaseRole) -> int:
+        return len(entry.role) + len(entry.content or "")
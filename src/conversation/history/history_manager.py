@@ -0,0 +1,205 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from src.conversation.history.conversation_history import ConversationHistory
+from src.helpers.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationHistoryManager:
+    """
+    Keeps one ConversationHistory per (tenant, conversation) with bounded memory.
+
+    Conversations are kept in least-recently-used order. Idle conversations are evicted
+    after idle_ttl seconds, and the least recently used ones are evicted whenever the
+    number of conversations or the total size of their messages goes over budget.
+
+    When a HistoryStore is given, the manager acts as a read-through cache in front of it:
+    conversations that are not in memory are loaded from the store, and every change is
+    handed to the store to be written in the background. With revalidate set, a
+    conversation held in memory is reloaded when another process, like another worker,
+    wrote a newer version of it to the store.
+    """
+
+    def __init__(
+        self,
+        max_messages: int = 50,
+        max_conversations: int = 10000,
+        idle_ttl: float = 3600,
+        memory_budget_bytes: int = 64 * 1024 * 1024,
+        collect_evicted: bool = False,
+        store=None,
+        revalidate: bool = True,
+    ):
+        """
+        Initialize the manager.
+
+        Args:
+            max_messages (int): Maximum number of non-system messages kept per conversation.
+            max_conversations (int): Maximum number of conversations held in memory.
+            idle_ttl (float): Seconds after which an idle conversation is evicted.
+            memory_budget_bytes (int): Approximate upper bound for the size of all messages held.
+            collect_evicted (bool): Keep evicted messages for summarization instead of dropping them.
+            store (HistoryStore, optional): Persists histories so they survive restarts and are shared
+                between replicas.
+            revalidate (bool): Check the store for newer versions of conversations held in memory,
+                which is only needed when other processes write to it.
+        """
+        self.max_messages = max_messages
+        self.max_conversations = max_conversations
+        self.idle_ttl = idle_ttl
+        self.memory_budget_bytes = memory_budget_bytes
+        self.collect_evicted = collect_evicted
+        self.store = store
+        self.revalidate = revalidate
+        self.memory_usage = 0
+        self._loads = SingleFlight()
+        self._conversations: "OrderedDict[Tuple[str, str], ConversationHistory]" = (
+            OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self._conversations)
+
+    def get_history(
+        self, conversation_id: str, tenant_id: Optional[str] = None
+    ) -> ConversationHistory:
+        """
+        Return the history for a conversation, creating it if needed.
+
+        Args:
+            conversation_id (str): The Bot Framework conversation ID.
+            tenant_id (str, optional): The tenant the conversation belongs to.
+
+        Returns:
+            ConversationHistory: The history for this conversation.
+        """
+        self.evict_idle()
+        key = (tenant_id or "", conversation_id)
+        history = self._conversations.get(key)
+        if history is None:
+            history = self._register(key, self._create(conversation_id, tenant_id))
+        else:
+            self._conversations.move_to_end(key)
+        history.touch()
+        return history
+
+    async def load_history(
+        self, conversation_id: str, tenant_id: Optional[str] = None
+    ) -> ConversationHistory:
+        """
+        Return the history for a conversation, loading it from the store if it is not in
+        memory, or if revalidate is set and the store has a newer version.
+
+        Concurrent loads of the same conversation share one read.
+
+        Args:
+            conversation_id (str): The Bot Framework conversation ID.
+            tenant_id (str, optional): The tenant the conversation belongs to.
+
+        Returns:
+            ConversationHistory: The history for this conversation.
+        """
+        key = (tenant_id or "", conversation_id)
+        if self.store is None or (key in self._conversations and not self.revalidate):
+            return self.get_history(conversation_id, tenant_id)
+        return await self._loads.do(
+            key, lambda: self._load(key, conversation_id, tenant_id)
+        )
+
+    async def _load(
+        self, key: Tuple[str, str], conversation_id: str, tenant_id: Optional[str]
+    ) -> ConversationHistory:
+        history = self._conversations.get(key)
+        if history is not None:
+            await self.store.refresh(history)
+            return self.get_history(conversation_id, tenant_id)
+
+        document = await self.store.load(conversation_id, tenant_id)
+        # Another turn may have created the history while the store was read.
+        if key in self._conversations:
+            return self.get_history(conversation_id, tenant_id)
+
+        history = self._create(conversation_id, tenant_id)
+        if document:
+            history.load_document(document)
+        self.evict_idle()
+        return self._register(key, history)
+
+    def _create(
+        self, conversation_id: str, tenant_id: Optional[str]
+    ) -> ConversationHistory:
+        return ConversationHistory(
+            conversation_id=conversation_id,
+            tenant_id=tenant_id,
+            max_messages=self.max_messages,
+            collect_evicted=self.collect_evicted,
+        )
+
+    def _register(
+        self, key: Tuple[str, str], history: ConversationHistory
+    ) -> ConversationHistory:
+        history.on_change = self._on_change
+        self._conversations[key] = history
+        self.memory_usage += history.size_bytes
+        self._enforce_budget()
+        history.touch()
+        return history
+
+    def remove(self, conversation_id: str, tenant_id: Optional[str] = None):
+        """
+        Drop the history for a conversation, if present.
+
+        Args:
+            conversation_id (str): The Bot Framework conversation ID.
+            tenant_id (str, optional): The tenant the conversation belongs to.
+        """
+        history = self._conversations.pop((tenant_id or "", conversation_id), None)
+        if history is not None:
+            self._release(history)
+
+    def evict_idle(self, now: Optional[float] = None):
+        """
+        Evict conversations that have been idle for longer than idle_ttl.
+
+        The least recently used conversations are at the front, so this stops at the
+        first conversation that is still active.
+        """
+        now = time.monotonic() if now is None else now
+        while self._conversations:
+            key, history = next(iter(self._conversations.items()))
+            if now - history.last_activity < self.idle_ttl:
+                break
+            self._evict(key)
+
+    def _on_change(self, history: ConversationHistory, delta: int):
+        self.memory_usage += delta
+        if self.store is not None:
+            self.store.save(history)
+        if delta > 0:
+            self._enforce_budget()
+
+    def _enforce_budget(self):
+        # The most recently used conversation is never evicted, so a single oversized
+        # conversation is bounded by max_messages instead.
+        while len(self._conversations) > 1 and (
+            len(self._conversations) > self.max_conversations
+            or self.memory_usage > self.memory_budget_bytes
+        ):
+            self._evict(next(iter(self._conversations)))
+
+    def _evict(self, key: Tuple[str, str]):
+        history = self._conversations.pop(key)
+        self._release(history)
+        logger.debug(f"Evicted conversation history for {key}")
+
+    def _release(self, history: ConversationHistory):
+        # A turn may still be using the history; its changes are still persisted.
+        history.on_change = self._persist if self.store is not None else None
+        self.memory_usage -= history.size_bytes
+
+    def _persist(self, history: ConversationHistory, delta: int):
+        self.store.save(history)
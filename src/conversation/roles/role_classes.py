@@ -1,12 +1,57 @@
+import hashlib
+import json
+import re
+from typing import Optional, Union
+
+from src.conversation.services.context_builder import (
+    MESSAGE_OVERHEAD_TOKENS,
+    estimate_tokens,
+)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
 class BaseRole:
     """
     Base class representing a participant in the conversation.
     Each role (system, user, assistant) will inherit from this class.
+
+    Messages are immutable once created. Their token count is computed once, and their JSON
+    encoding and fingerprint are computed on first use and kept, so a message that is saved
+    and looked up many times is only encoded and hashed once. Messages are slotted, which
+    keeps the many held by long conversations small.
     """
 
+    __slots__ = ("role", "content", "tokens", "_json", "_fingerprint")
+
     def __init__(self, role: str, content: str):
         self.role = role
         self.content = content
+        self.tokens = MESSAGE_OVERHEAD_TOKENS + estimate_tokens(content)
+        self._json: Optional[str] = None
+        self._fingerprint: Optional[bytes] = None
+
+    @staticmethod
+    def from_dict(message: dict) -> "BaseRole":
+        """
+        Create a message from its dictionary form.
+
+        Returns:
+            BaseRole: The message.
+        """
+        return BaseRole(message["role"], message.get("content"))
+
+    @staticmethod
+    def from_json(encoded: Union[str, bytes]) -> "BaseRole":
+        """
+        Create a message from its JSON encoding, which is kept so it is not encoded again.
+
+        Returns:
+            BaseRole: The message.
+        """
+        message = BaseRole.from_dict(json.loads(encoded))
+        message._json = encoded if isinstance(encoded, str) else encoded.decode()
+        return message
 
     def to_dict(self):
         """
@@ -17,12 +62,40 @@ class BaseRole:
         """
         return {"role": self.role, "content": self.content}
 
+    def to_json(self) -> str:
+        """
+        Return the message's dictionary form encoded as JSON.
+
+        Returns:
+            str: The JSON encoding of the message.
+        """
+        if self._json is None:
+            self._json = json.dumps(
+                {"role": self.role, "content": self.content}, ensure_ascii=False
+            )
+        return self._json
+
+    @property
+    def fingerprint(self) -> bytes:
+        """
+        A hash of the role and the content with whitespace and case normalized, which
+        identifies the message in the response cache.
+        """
+        if self._fingerprint is None:
+            content = _WHITESPACE.sub(" ", self.content or "").strip().lower()
+            self._fingerprint = hashlib.sha256(
+                f"{self.role}\0{content}".encode("utf-8")
+            ).digest()
+        return self._fingerprint
+
 
 class SystemRole(BaseRole):
     """
     Represents the 'system' role in the conversation, used to set the behavior and context.
     """
 
+    __slots__ = ()
+
     def __init__(self, content: str):
         super().__init__(role="system", content=content)
 
@@ -32,6 +105,8 @@ class UserRole(BaseRole):
     Represents the 'user' role in the conversation, typically used for the user's input.
     """
 
+    __slots__ = ()
+
     def __init__(self, content: str):
         super().__init__(role="user", content=content)
 
@@ -41,5 +116,7 @@ class AssistantRole(BaseRole):
     Represents the 'assistant' role in the conversation, typically used for the AI model's responses.
     """
 
+    __slots__ = ()
+
     def __init__(self, content: str):
         super().__init__(role="assistant", content=content)
@@ -0,0 +1,125 @@
+from typing import Dict, List, Optional
+
+# Tokens the chat format adds around every message, and to prime the assistant's reply.
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+# Context window sizes of the models we call, in tokens.
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+}
+DEFAULT_CONTEXT_WINDOW = 4096
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    Estimate the number of tokens in a piece of text.
+
+    Uses roughly 4 characters per token, which is close to the OpenAI tokenizers for
+    English text and cheap enough to run on every message.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The estimated token count.
+    """
+    if not text:
+        return 0
+    return (len(text) + 3) // 4
+
+
+def count_message_tokens(message: dict) -> int:
+    """
+    Estimate the number of tokens a chat message uses in a request, including formatting overhead.
+
+    Args:
+        message (dict): A message in the OpenAI format, with role and content.
+
+    Returns:
+        int: The estimated token count.
+    """
+    return MESSAGE_OVERHEAD_TOKENS + estimate_tokens(message["content"])
+
+
+class ContextBuilder:
+    """
+    Selects the messages to send to OpenAI so that a request fits a token budget.
+
+    System messages and the rolling summary of evicted messages are pinned and always sent.
+    The remaining budget is filled with the newest messages, keeping room for the model's reply.
+    """
+
+    def __init__(
+        self,
+        max_context_tokens: Optional[int] = None,
+        model_context_windows: Optional[Dict[str, int]] = None,
+    ):
+        """
+        Initialize the ContextBuilder.
+
+        Args:
+            max_context_tokens (int, optional): Upper bound for the prompt plus reply, regardless of model.
+            model_context_windows (dict, optional): Context window size per model, overriding the defaults.
+        """
+        self.max_context_tokens = max_context_tokens
+        self.model_context_windows = dict(MODEL_CONTEXT_WINDOWS)
+        if model_context_windows:
+            self.model_context_windows.update(model_context_windows)
+
+    def budget_for(self, model: str, max_tokens: int) -> int:
+        """
+        Return the number of prompt tokens available for a model, after reserving room for the reply.
+
+        Args:
+            model (str): The model the request is sent to.
+            max_tokens (int): The maximum number of tokens in the response.
+
+        Returns:
+            int: The prompt token budget.
+        """
+        window = self.model_context_windows.get(model, DEFAULT_CONTEXT_WINDOW)
+        if self.max_context_tokens:
+            window = min(window, self.max_context_tokens)
+        return window - max_tokens - REPLY_PRIMING_TOKENS
+
+    def build(self, conversation, model: str, max_tokens: int) -> List[dict]:
+        """
+        Build the list of messages to send for a conversation.
+
+        Args:
+            conversation (ConversationHistory): The conversation to build the context from.
+            model (str): The model the request is sent to.
+            max_tokens (int): The maximum number of tokens in the response.
+
+        Returns:
+            list: Pinned system messages and summary followed by the newest messages that fit the budget.
+        """
+        history = conversation.get_history()
+        budget = self.budget_for(model, max_tokens)
+
+        pinned = []
+        for message in history:
+            if message.role == "system":
+                pinned.append(message)
+                budget -= message.tokens
+        if conversation.summary_message:
+            pinned.append(conversation.summary_message)
+            budget -= conversation.summary_tokens
+
+        selected = []
+        for message in reversed(history):
+            if message.role == "system":
+                continue
+            # Always send the newest message, even if it alone is over budget.
+            if selected and message.tokens > budget:
+                break
+            selected.append(message)
+            budget -= message.tokens
+
+        selected.reverse()
+        return pinned + selected
@@ -1,7 +1,38 @@
+import asyncio
+import importlib
 import logging
-from openai import AsyncOpenAI
+import time
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional, Tuple
 from src.conversation.history.conversation_history import ConversationHistory
-from src.conversation.roles.role_classes import UserRole, AssistantRole
+from src.conversation.roles.role_classes import AssistantRole, BaseRole, UserRole
+from src.conversation.services.context_builder import (
+    ContextBuilder,
+    count_message_tokens,
+    estimate_tokens,
+)
+from src.conversation.services.fair_scheduler import FairScheduler
+from src.conversation.services.key_manager import ApiKey, KeyManager
+from src.conversation.services.model_router import ModelRouter, Route
+from src.conversation.services.resilience import ResilientCaller
+from src.conversation.services.response_cache import (
+    ResponseCache,
+    cache_key,
+    scope_key,
+)
+from src.conversation.services.summarizer import ConversationSummarizer
+from src.helpers.single_flight import SingleFlight
+from src.telemetry import (
+    CURRENT_REQUEST_CLASS,
+    CURRENT_TENANT,
+    OPENAI_REQUESTS_IN_FLIGHT,
+    record_stage,
+    record_tokens,
+    span,
+)
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
 
 class ConversationService:
@@ -9,18 +40,151 @@ class ConversationService:
     A service class to manage conversation with OpenAI and keep track of the history.
     """
 
-    def __init__(self, key_manager):
+    def __init__(
+        self,
+        key_manager: KeyManager,
+        context_builder: Optional[ContextBuilder] = None,
+        model: str = "gpt-3.5-turbo",
+        temperature: float = 0.7,
+        max_tokens: int = 150,
+        summary_model: Optional[str] = None,
+        response_cache: Optional[ResponseCache] = None,
+        embedding_model: str = "text-embedding-3-small",
+        resilience: Optional[ResilientCaller] = None,
+        base_url: Optional[str] = None,
+        scheduler: Optional[FairScheduler] = None,
+        router: Optional[ModelRouter] = None,
+    ):
         """
-        Initialize the ConversationService with the OpenAI API key.
+        Initialize the ConversationService with the pool of OpenAI API keys.
 
         Args:
-            key_manager (KeyManager): Instance of the KeyManager class to retrieve the API key.
+            key_manager (KeyManager): Instance of the KeyManager class that picks the API key for each request.
+            context_builder (ContextBuilder, optional): Selects the messages that fit the model's token budget.
+            model (str): The default model to use for chat completions.
+            temperature (float): The default temperature setting for the OpenAI model.
+            max_tokens (int): The default maximum number of tokens in a response.
+            summary_model (str, optional): Model used to summarize messages that no longer fit the
+                context. Messages are dropped instead when this is not set.
+            response_cache (ResponseCache, optional): Cache of replies to repeated questions.
+            embedding_model (str): The model used to embed questions for the semantic cache.
+            resilience (ResilientCaller, optional): Applies timeouts, retries, hedging and the
+                fallback model to completion requests.
+            base_url (str, optional): The OpenAI API URL, e.g. of a local fake server in tests.
+            scheduler (FairScheduler, optional): Shares the OpenAI capacity fairly between tenants
+                and request classes. Requests are sent as soon as they are made without it.
+            router (ModelRouter, optional): Picks the model and parameters of each reply. Every
+                reply uses model, temperature and max_tokens without it.
+        """
+        self.key_manager = key_manager
+        self._clients: Dict[str, "AsyncOpenAI"] = {}
+        self.context_builder = context_builder or ContextBuilder()
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.summarizer = (
+            ConversationSummarizer(self, summary_model) if summary_model else None
+        )
+        self.response_cache = response_cache
+        self.embedding_model = embedding_model
+        self._in_flight = SingleFlight()
+        self.resilience = resilience or ResilientCaller()
+        self.base_url = base_url or None
+        self.scheduler = scheduler
+        self.router = router
+
+    async def warm_up(self):
+        """
+        Import the OpenAI SDK off the event loop and create the clients of all API keys,
+        so the first requests do not wait for them.
+        """
+        modules = ["openai"]
+        if self.response_cache is not None and self.response_cache.semantic:
+            modules.append("numpy")
+        for module in modules:
+            await asyncio.to_thread(importlib.import_module, module)
+        for api_key in self.key_manager.keys:
+            self._get_client(api_key)
+
+    def _get_client(self, api_key: ApiKey) -> "AsyncOpenAI":
+        """
+        Return the client for an API key, creating it on first use.
+
+        The OpenAI SDK is imported here rather than with this module, because it is slow
+        to import and the application should start serving without waiting for it.
         """
-        self.api_key = key_manager.get_api_key()
-        self.client = AsyncOpenAI(api_key=self.api_key)
+        client = self._clients.get(api_key.key)
+        if client is None:
+            from openai import AsyncOpenAI
+
+            # Rate limited requests are moved to another key and other failures are
+            # retried by the resilience layer, instead of by the SDK.
+            client = self._clients[api_key.key] = AsyncOpenAI(
+                api_key=api_key.key, base_url=self.base_url, max_retries=0
+            )
+        return client
+
+    async def _create_completion(
+        self, history, model, temperature, max_tokens, stream=False
+    ):
+        """
+        Create a chat completion with the API key that has the most headroom.
+
+        A rate limited key is parked until its limit resets and the request is sent again
+        with another key, once per key in the pool.
+        """
+        from openai import RateLimitError
+
+        estimated_tokens = max_tokens + sum(message.tokens for message in history)
+        # The SDK encodes the request body itself, from dictionaries.
+        messages = [message.to_dict() for message in history]
+        in_flight = OPENAI_REQUESTS_IN_FLIGHT.labels(model)
+        for attempt in range(len(self.key_manager.keys)):
+            # A streamed response holds its slot until the stream is opened.
+            async with self._scheduled(estimated_tokens):
+                api_key = await self.key_manager.acquire(model, estimated_tokens)
+                in_flight.inc()
+                try:
+                    raw_response = await self._get_client(
+                        api_key
+                    ).chat.completions.with_raw_response.create(
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        stream=stream,
+                    )
+                except RateLimitError as e:
+                    self.key_manager.park(api_key, e.response.headers)
+                    if attempt == len(self.key_manager.keys) - 1:
+                        raise
+                    logging.warning(f"{api_key} was rate limited, trying another key")
+                    continue
+                finally:
+                    in_flight.dec()
+            self.key_manager.update_from_headers(api_key, raw_response.headers)
+            response = raw_response.parse()
+            if not stream and response.usage is not None:
+                record_tokens(
+                    model,
+                    response.usage.prompt_tokens,
+                    response.usage.completion_tokens,
+                )
+            return response
+
+    def _scheduled(self, estimated_tokens: int):
+        """
+        Return a context that holds a scheduler slot for a request of the turn's tenant
+        and request class.
+        """
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot(
+            CURRENT_TENANT.get(), CURRENT_REQUEST_CLASS.get(), estimated_tokens
+        )
 
     async def _send_message(
-        self, history, model="gpt-3.5-turbo", temperature=0.7, max_tokens=150
+        self, history, model=None, temperature=None, max_tokens=None
     ):
         """
         Sends the current conversation history to OpenAI asynchronously and returns the assistant's response.
@@ -28,22 +192,33 @@ class ConversationService:
         This method is intended for internal use only and should not be accessed directly.
 
         Args:
-            history (list): The full conversation history with both user and assistant messages.
-            model (str): The model to use for the chat completion.
-            temperature (float): The temperature setting for the OpenAI model.
-            max_tokens (int): The maximum number of tokens in the response.
+            history (list): The conversation messages to send, as role objects.
+            model (str, optional): The model to use for the chat completion.
+            temperature (float, optional): The temperature setting for the OpenAI model.
+            max_tokens (int, optional): The maximum number of tokens in the response.
 
         Returns:
             str: The assistant's response message.
         """
+        model = model or self.model
+        temperature = self.temperature if temperature is None else temperature
+        max_tokens = max_tokens or self.max_tokens
         try:
-            # Use OpenAI's async method to send the conversation history
-            response = await self.client.chat.completions.create(
-                model=model,
-                messages=history,
-                temperature=temperature,
-                max_tokens=max_tokens,
-            )
+            # Identical requests in flight at the same time share one OpenAI call
+            fingerprint = (cache_key(history, model, temperature), max_tokens)
+            started_at = time.perf_counter()
+            with span("openai_total"):
+                response = await self._in_flight.do(
+                    fingerprint,
+                    lambda: self.resilience.call(
+                        model,
+                        lambda target: self._create_completion(
+                            history, target, temperature, max_tokens
+                        ),
+                    ),
+                )
+            # Without streaming, the first token arrives with the whole response.
+            record_stage("openai_ttft", time.perf_counter() - started_at)
             response = response.to_dict()
             assistant_message = response["choices"][0]["message"]["content"]
             return assistant_message
@@ -51,6 +226,91 @@ class ConversationService:
             logging.error(f"An error occurred while sending the message: {e}")
             raise e
 
+    async def _stream_message(
+        self, history, model=None, temperature=None, max_tokens=None
+    ) -> AsyncIterator[str]:
+        """
+        Streams the assistant's response to the given messages from OpenAI as it is generated.
+
+        This method is intended for internal use only and should not be accessed directly.
+
+        Args:
+            history (list): The conversation messages to send, as role objects.
+            model (str, optional): The model to use for the chat completion.
+            temperature (float, optional): The temperature setting for the OpenAI model.
+            max_tokens (int, optional): The maximum number of tokens in the response.
+
+        Yields:
+            str: Pieces of the assistant's response, in order.
+        """
+        try:
+            model = model or self.model
+            temperature = self.temperature if temperature is None else temperature
+            max_tokens = max_tokens or self.max_tokens
+            started_at = time.perf_counter()
+            # Only opening the stream is retried; a hedged stream would be read twice.
+            stream = await self.resilience.call(
+                model,
+                lambda target: self._create_completion(
+                    history, target, temperature, max_tokens, stream=True
+                ),
+                hedge=False,
+            )
+            parts = []
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if not parts:
+                        record_stage("openai_ttft", time.perf_counter() - started_at)
+                    parts.append(chunk.choices[0].delta.content)
+                    yield parts[-1]
+            record_stage("openai_total", time.perf_counter() - started_at)
+            # Streamed responses carry no usage, so the tokens are estimated.
+            record_tokens(
+                model,
+                sum(message.tokens for message in history),
+                estimate_tokens("".join(parts)),
+            )
+        except Exception as e:
+            logging.error(f"An error occurred while streaming the message: {e}")
+            raise e
+
+    async def complete(self, messages, model=None, temperature=None, max_tokens=None):
+        """
+        Send a list of messages to OpenAI and return the assistant's response, without touching any history.
+
+        Args:
+            messages (list): The messages to send, as role objects or in the OpenAI format.
+            model (str, optional): The model to use for the chat completion.
+            temperature (float, optional): The temperature setting for the OpenAI model.
+            max_tokens (int, optional): The maximum number of tokens in the response.
+
+        Returns:
+            str: The assistant's response message.
+        """
+        messages = [
+            message if isinstance(message, BaseRole) else BaseRole.from_dict(message)
+            for message in messages
+        ]
+        return await self._send_message(messages, model, temperature, max_tokens)
+
+    async def embed(self, text: str) -> List[float]:
+        """
+        Return the embedding of a text.
+
+        Args:
+            text (str): The text to embed.
+
+        Returns:
+            list: The embedding vector.
+        """
+        api_key = await self.key_manager.acquire(
+            self.embedding_model, count_message_tokens({"content": text})
+        )
+        response = await self._get_client(api_key).embeddings.create(
+            model=self.embedding_model, input=text
+        )
+        return response.data[0].embedding
+
     async def process_message(
         self, conversation: ConversationHistory, user_message: str
     ):
@@ -65,14 +325,176 @@ class ConversationService:
         Returns:
             str: The assistant's response message.
         """
-        # Step 1: Add the user's message to the conversation history
-        conversation.add_message(UserRole(user_message))
+        # Step 1: Pick the model, add the user's message and select the part of the history that fits the token budget
+        route = self._route(conversation, user_message)
+        message = UserRole(user_message)
+        context = self._prepare_context(conversation, message, route)
 
-        # Step 2: Send the conversation history to OpenAI and get the assistant's response
-        assistant_message = await self._send_message(conversation.get_history())
+        # Step 2: Answer from the cache, or send the context to OpenAI and get the assistant's response
+        assistant_message, lookup = await self._get_cached_reply(
+            conversation, context, route
+        )
+        if assistant_message is None:
+            started_at = time.perf_counter()
+            try:
+                assistant_message = await self._send_message(
+                    context, route.model, route.temperature, route.max_tokens
+                )
+            except Exception as e:
+                self._record_route(conversation, route, started_at, e)
+                # Without an answer the message is taken back, so a retry adds it once.
+                conversation.remove_message(message)
+                raise
+            self._record_route(conversation, route, started_at)
+            self._cache_reply(conversation, lookup, assistant_message)
 
-        # Step 3: Add the assistant's response to the conversation history
-        conversation.add_message(AssistantRole(assistant_message))
+        # Step 3: Record the response and fold older messages into the summary
+        self._record_response(conversation, context, assistant_message)
 
         # Step 4: Return the assistant's response
         return assistant_message
+
+    async def stream_message(
+        self, conversation: ConversationHistory, user_message: str
+    ) -> AsyncIterator[str]:
+        """
+        Process a new user message like process_message, but yield the assistant's response as it is generated.
+
+        The full response is added to the conversation history once the stream is complete.
+
+        Args:
+            conversation (ConversationHistory): The conversation object that tracks the conversation history.
+            user_message (str): The user's message to be sent to OpenAI.
+
+        Yields:
+            str: Pieces of the assistant's response, in order.
+        """
+        route = self._route(conversation, user_message)
+        message = UserRole(user_message)
+        context = self._prepare_context(conversation, message, route)
+        cached, lookup = await self._get_cached_reply(conversation, context, route)
+        if cached is not None:
+            yield cached
+            self._record_response(conversation, context, cached)
+            return
+
+        parts = []
+        started_at = time.perf_counter()
+        try:
+            async for part in self._stream_message(
+                context, route.model, route.temperature, route.max_tokens
+            ):
+                parts.append(part)
+                yield part
+        except Exception as e:
+            self._record_route(conversation, route, started_at, e)
+            conversation.remove_message(message)
+            raise
+        self._record_route(conversation, route, started_at)
+        assistant_message = "".join(parts)
+        self._cache_reply(conversation, lookup, assistant_message)
+        self._record_response(conversation, context, assistant_message)
+
+    def _route(self, conversation: ConversationHistory, user_message: str) -> Route:
+        """
+        Pick the model and parameters of the reply to a message.
+        """
+        if self.router is None:
+            return Route(self.model, self.temperature, self.max_tokens, "", "default")
+        return self.router.route(
+            user_message, len(conversation.get_history()), conversation.tenant_id
+        )
+
+    def _record_route(
+        self,
+        conversation: ConversationHistory,
+        route: Route,
+        started_at: float,
+        error: Optional[BaseException] = None,
+    ):
+        if self.router is not None:
+            self.router.record(
+                route, time.perf_counter() - started_at, conversation.tenant_id, error
+            )
+
+    def _prepare_context(
+        self, conversation: ConversationHistory, message: UserRole, route: Route
+    ) -> list:
+        """
+        Add the user's message to the history and build the context to send.
+        """
+        conversation.add_message(message)
+        with span("context_build"):
+            return self.context_builder.build(
+                conversation, route.model, route.max_tokens
+            )
+
+    async def _get_cached_reply(
+        self, conversation: ConversationHistory, context: list, route: Route
+    ) -> Tuple[Optional[str], Optional[tuple]]:
+        """
+        Look the context up in the response cache, among the replies of the route's model
+        and temperature.
+
+        Returns:
+            tuple: The cached reply, or None and the lookup to pass to _cache_reply on a miss.
+        """
+        cache = self.response_cache
+        if cache is None:
+            return None, None
+
+        key = cache_key(context, route.model, route.temperature)
+        reply = cache.get(conversation.tenant_id, key)
+        if reply is not None:
+            return reply, None
+
+        scope = embedding = None
+        if cache.semantic:
+            scope = scope_key(context, route.model, route.temperature)
+            try:
+                embedding = await self.embed(context[-1].content)
+            except Exception as e:
+                logging.warning(f"Could not embed the message for the cache: {e}")
+            else:
+                reply = cache.get_similar(conversation.tenant_id, scope, embedding)
+                if reply is not None:
+                    return reply, None
+
+        cache.record_miss()
+        return None, (key, scope, embedding)
+
+    def _cache_reply(
+        self,
+        conversation: ConversationHistory,
+        lookup: Optional[tuple],
+        assistant_message: str,
+    ):
+        """
+        Add a reply that missed the cache to it.
+        """
+        if lookup is None or not assistant_message:
+            return
+        key, scope, embedding = lookup
+        self.response_cache.put(
+            conversation.tenant_id, key, assistant_message, scope, embedding
+        )
+
+    def _record_response(
+        self, conversation: ConversationHistory, context: list, assistant_message: str
+    ):
+        """
+        Add the assistant's response to the history and evict the messages that no longer fit,
+        scheduling their summarization off the reply path.
+        """
+        conversation.add_message(AssistantRole(assistant_message))
+
+        sent = sum(1 for message in context if message.role != "system")
+        total = sum(
+            1 for message in conversation.get_history() if message.role != "system"
+        )
+        # The assistant's reply was added after the context was built.
+        overflow = total - sent - 1
+        if overflow > 0:
+            conversation.evict_oldest(overflow)
+        if self.summarizer:
+            self.summarizer.schedule(conversation)
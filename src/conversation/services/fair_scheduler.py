@@ -0,0 +1,131 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Mapping, Optional, Tuple
+
+from src.telemetry import OPENAI_QUEUE_WAIT
+
+
+def parse_weights(value: str) -> Dict[str, float]:
+    """
+    Parse weights written as "name:weight" pairs separated by commas, e.g.
+    "interactive:4,group:1".
+    """
+    weights = {}
+    for spec in value.split(","):
+        name, _, weight = spec.strip().rpartition(":")
+        if name:
+            weights[name] = float(weight)
+    return weights
+
+
+class FairScheduler:
+    """
+    Lets at most max_concurrent OpenAI requests run at once and, when more are waiting,
+    decides which goes next with start-time fair queueing.
+
+    Requests are grouped into flows by tenant and request class. Each flow has a weight,
+    the product of its class weight and its tenant weight, and is charged the estimated
+    tokens of every request divided by that weight. The waiting request whose flow has
+    been charged least goes first, so every flow gets a share of the capacity in
+    proportion to its weight, measured in tokens rather than requests: a tenant sending
+    many large requests cannot crowd out the others, and interactive 1:1 chats are served
+    ahead of group and channel traffic without starving it.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        class_weights: Optional[Mapping[str, float]] = None,
+        tenant_weights: Optional[Mapping[str, float]] = None,
+    ):
+        """
+        Initialize the FairScheduler.
+
+        Args:
+            max_concurrent (int): Maximum number of requests running at once.
+            class_weights (dict, optional): Weight of each request class. Unlisted classes weigh 1.
+            tenant_weights (dict, optional): Weight of each tenant. Unlisted tenants weigh 1.
+        """
+        self.max_concurrent = max_concurrent
+        self.class_weights = dict(class_weights or {})
+        self.tenant_weights = dict(tenant_weights or {})
+        self.running = 0
+        self._virtual_time = 0.0
+        self._finish_tags: Dict[Tuple[str, str], float] = {}
+        self._waiting: List[Tuple[float, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, future in self._waiting if not future.done())
+
+    @asynccontextmanager
+    async def slot(
+        self, tenant_id: Optional[str], request_class: str, cost: float
+    ) -> AsyncIterator[None]:
+        """
+        Wait for the request's turn and hold a slot while it runs.
+
+        Args:
+            tenant_id (str, optional): The tenant the request is made for.
+            request_class (str): The class of the request, e.g. interactive or group.
+            cost (float): The estimated tokens of the request.
+        """
+        started_at = time.perf_counter()
+        start_tag = self._tag(tenant_id or "", request_class, cost)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (start_tag, next(self._sequence), future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the cancellation.
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+        OPENAI_QUEUE_WAIT.labels(request_class).observe(
+            time.perf_counter() - started_at
+        )
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _tag(self, tenant_id: str, request_class: str, cost: float) -> float:
+        """
+        Charge a request to its flow and return its start tag.
+        """
+        weight = self.class_weights.get(request_class, 1.0) * self.tenant_weights.get(
+            tenant_id, 1.0
+        )
+        flow = (tenant_id, request_class)
+        start_tag = max(self._virtual_time, self._finish_tags.get(flow, 0.0))
+        self._finish_tags[flow] = start_tag + max(cost, 1) / max(weight, 1e-6)
+        return start_tag
+
+    def _dispatch(self):
+        """
+        Hand free slots to the waiting requests with the lowest start tags.
+        """
+        while self._waiting and self.running < self.max_concurrent:
+            start_tag, _, future = heapq.heappop(self._waiting)
+            if future.done():
+                continue
+            self._virtual_time = start_tag
+            self.running += 1
+            future.set_result(None)
+
+    def _release(self):
+        self.running -= 1
+        self._dispatch()
+        if not self._waiting:
+            # Flows charged no further than the virtual time are tagged as if they
+            # were new, so they can be forgotten.
+            self._finish_tags = {
+                flow: tag
+                for flow, tag in self._finish_tags.items()
+                if tag > self._virtual_time
+            }
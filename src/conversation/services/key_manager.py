@@ -1,21 +1,207 @@
+import asyncio
+import re
+import time
+from typing import Iterable, List, Mapping, Optional
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a rate limit reset value such as "20ms", "1s" or "6m0s" into seconds.
+
+    Plain numbers, as sent in Retry-After headers, are read as seconds.
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class _TokenBucket:
+    """
+    A bucket that refills to capacity over one minute.
+    """
+
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.available = capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float):
+        elapsed = now - self.updated_at
+        self.available = min(
+            self.capacity, self.available + elapsed * self.capacity / 60
+        )
+        self.updated_at = now
+
+    def seconds_until(self, amount: float) -> float:
+        missing = min(amount, self.capacity) - self.available
+        return max(0.0, missing * 60 / self.capacity)
+
+
+class ApiKey:
+    """
+    An OpenAI API key in the pool, with its request and token rate limit state.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        models: Optional[Iterable[str]] = None,
+        requests_per_minute: int = 3500,
+        tokens_per_minute: int = 90000,
+    ):
+        self.key = key
+        self.models = frozenset(models) if models else None
+        self.requests = _TokenBucket(requests_per_minute)
+        self.tokens = _TokenBucket(tokens_per_minute)
+        self.parked_until = 0.0
+
+    def __repr__(self) -> str:
+        return f"ApiKey(...{self.key[-4:]})"
+
+    def supports(self, model: str) -> bool:
+        return self.models is None or model in self.models
+
+    def headroom(self, estimated_tokens: int, now: float) -> float:
+        """
+        Return the fraction of capacity left after this request, or a negative value if it does not fit now.
+        """
+        if now < self.parked_until:
+            return -1.0
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        return min(
+            (self.requests.available - 1) / self.requests.capacity,
+            (self.tokens.available - estimated_tokens) / self.tokens.capacity,
+        )
+
+    def seconds_until_available(self, estimated_tokens: int, now: float) -> float:
+        return max(
+            self.parked_until - now,
+            self.requests.seconds_until(1),
+            self.tokens.seconds_until(estimated_tokens),
+        )
+
+
 class KeyManager:
     """
-    A class to manage the OpenAI API key, loading it from the environment or a config file.
+    A class to manage the pool of OpenAI API keys, loading them from the environment or a config file.
+
+    Every key tracks its requests and tokens per minute in token buckets, which are kept in sync
+    with the rate limit headers OpenAI returns. Each request goes to the key with the most headroom
+    for the model, and keys that were rate limited are parked until their limit resets.
     """
 
     def __init__(self, config):
-        self.api_key = self._load_api_key(config)
+        self.keys = self._load_api_keys(config)
+        self.api_key = self.keys[0].key
+        self.max_wait = config.OPENAI_KEY_MAX_WAIT_SECONDS
 
-    def _load_api_key(self, config):
-        api_key = config.OPENAI_API_KEY
-        if not api_key:
+    def _load_api_keys(self, config) -> List[ApiKey]:
+        """
+        Read OPENAI_API_KEY and OPENAI_API_KEYS.
+
+        OPENAI_API_KEYS is a comma separated list of keys. A key can be limited to some models
+        or deployments by appending them after a colon, separated by "|",
+        e.g. "sk-one,sk-two:gpt-4o|gpt-4o-mini".
+        """
+        specs = [config.OPENAI_API_KEY] + config.OPENAI_API_KEYS.split(",")
+        keys, seen = [], set()
+        for spec in specs:
+            key, _, models = spec.strip().partition(":")
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            keys.append(
+                ApiKey(
+                    key,
+                    models=[model for model in models.split("|") if model],
+                    requests_per_minute=config.OPENAI_KEY_RPM,
+                    tokens_per_minute=config.OPENAI_KEY_TPM,
+                )
+            )
+        if not keys:
             raise ValueError(
                 "API key not found. Please set OPENAI_API_KEY the environment variable."
             )
-        return api_key
+        return keys
 
     def get_api_key(self):
         """
-        Return the OpenAI API key.
+        Return the first OpenAI API key.
         """
         return self.api_key
+
+    async def acquire(self, model: str, estimated_tokens: int) -> ApiKey:
+        """
+        Pick the key with the most headroom for a request and reserve capacity for it.
+
+        Waits for capacity to free up when every key is exhausted or parked, up to max_wait seconds.
+
+        Args:
+            model (str): The model the request is sent to.
+            estimated_tokens (int): The estimated prompt plus completion tokens of the request.
+
+        Returns:
+            ApiKey: The key to send the request with.
+        """
+        candidates = [key for key in self.keys if key.supports(model)]
+        if not candidates:
+            raise ValueError(f"No API key is configured for model {model}")
+
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            now = time.monotonic()
+            best = max(candidates, key=lambda k: k.headroom(estimated_tokens, now))
+            if best.headroom(estimated_tokens, now) >= 0 or now >= deadline:
+                break
+            wait = min(
+                key.seconds_until_available(estimated_tokens, now) for key in candidates
+            )
+            await asyncio.sleep(min(max(wait, 0.01), deadline - now))
+
+        best.requests.available -= 1
+        best.tokens.available -= estimated_tokens
+        return best
+
+    def update_from_headers(self, api_key: ApiKey, headers: Mapping[str, str]):
+        """
+        Sync a key's buckets with the x-ratelimit-* headers of a response.
+        """
+        now = time.monotonic()
+        for bucket, name in (
+            (api_key.requests, "requests"),
+            (api_key.tokens, "tokens"),
+        ):
+            limit = headers.get(f"x-ratelimit-limit-{name}")
+            remaining = headers.get(f"x-ratelimit-remaining-{name}")
+            if limit and limit.isdigit():
+                bucket.capacity = float(limit)
+            if remaining and remaining.isdigit():
+                bucket.refill(now)
+                bucket.available = min(bucket.capacity, float(remaining))
+
+    def park(self, api_key: ApiKey, headers: Mapping[str, str]):
+        """
+        Stop using a key that was rate limited until its limit resets.
+        """
+        retry_after_ms = headers.get("retry-after-ms")
+        reset = (
+            parse_duration(f"{retry_after_ms}ms" if retry_after_ms else None)
+            or parse_duration(headers.get("retry-after"))
+            or max(
+                parse_duration(headers.get("x-ratelimit-reset-requests")) or 0,
+                parse_duration(headers.get("x-ratelimit-reset-tokens")) or 0,
+            )
+            or 1.0
+        )
+        api_key.parked_until = time.monotonic() + reset
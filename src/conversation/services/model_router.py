@@ -0,0 +1,259 @@
+import logging
+import random
+import re
+from typing import Callable, Dict, FrozenSet, List, Optional
+
+from src.conversation.services.context_builder import estimate_tokens
+from src.conversation.services.resilience import ResilientCaller
+from src.telemetry import OPENAI_ROUTES
+
+# Routing decisions and their outcomes are logged here, one line per request, so the
+# latency and cost of each route can be measured from the logs.
+logger = logging.getLogger("src.conversation.routing")
+
+GREETING = "greeting"
+FAQ = "faq"
+CODE = "code"
+GENERAL = "general"
+
+_GREETING = re.compile(
+    r"^\W*(hi|hello|hey|hiya|yo|good (morning|afternoon|evening)|thanks|thank you|"
+    r"thx|cheers|bye|goodbye|ok(ay)?|cool|great)\b[\w\s]{0,20}\W*$",
+    re.IGNORECASE,
+)
+_CODE = re.compile(
+    r"```|\b(code|def|regex|stack ?trace|traceback|exception|compiler?|syntax|python|"
+    r"javascript|typescript|java|sql|bash|powershell|json|yaml)\b|[{};]\s*$|=>|\w\(\)",
+    re.IGNORECASE | re.MULTILINE,
+)
+_FAQ = re.compile(
+    r"^\W*(how (do|can|should) (i|we)|where (is|are|can|do)|what (is|are|does)|who is|"
+    r"when (is|are|does|do)|can i|is there|do we)\b",
+    re.IGNORECASE,
+)
+
+
+def detect_intent(text: str) -> str:
+    """
+    Classify a message as a greeting, an FAQ-style question, a code question or anything else.
+    """
+    text = text or ""
+    if len(text) <= 60 and _GREETING.match(text):
+        return GREETING
+    if _CODE.search(text):
+        return CODE
+    if _FAQ.match(text):
+        return FAQ
+    return GENERAL
+
+
+def parse_tenant_models(value: str) -> Dict[str, FrozenSet[str]]:
+    """
+    Parse the models each tenant may use, written like OPENAI_API_KEYS as
+    "tenant:model|model" pairs separated by commas, e.g. "contoso:gpt-4o-mini|gpt-4o".
+    """
+    policies = {}
+    for spec in value.split(","):
+        tenant, _, models = spec.strip().partition(":")
+        models = frozenset(model for model in models.split("|") if model)
+        if tenant and models:
+            policies[tenant] = models
+    return policies
+
+
+class Route:
+    """
+    The model and parameters chosen for a completion request, and why.
+    """
+
+    __slots__ = (
+        "model",
+        "temperature",
+        "max_tokens",
+        "intent",
+        "reason",
+        "message_tokens",
+        "depth",
+    )
+
+    def __init__(
+        self,
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        intent: str,
+        reason: str,
+        message_tokens: int = 0,
+        depth: int = 0,
+    ):
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.intent = intent
+        self.reason = reason
+        self.message_tokens = message_tokens
+        self.depth = depth
+
+
+class ModelRouter:
+    """
+    Picks the model, temperature and response length of each completion request.
+
+    The choice starts from cheap features of the request: the intent of the user's message
+    (a greeting, an FAQ-style question, a code question or anything else), its length and
+    the depth of the conversation. Greetings and FAQ questions go to the fast model with
+    short or focused answers, code questions and long or deep conversations to the
+    strong model, and everything else to the default model. A tenant can be restricted to
+    some models.
+
+    Each choice has alternatives, which are used when the live statistics of the
+    ResilientCaller show the preferred model degrading: its circuit is open, or half open
+    with its probe request already sent, or its p95 latency is more than slow_factor times
+    that of the fastest alternative. A probe_rate share of the requests that avoid a slow
+    model still go to it, so its latency keeps being measured and it is used again once
+    it recovers.
+    """
+
+    def __init__(
+        self,
+        resilience: ResilientCaller,
+        default_model: str,
+        temperature: float,
+        max_tokens: int,
+        fast_model: Optional[str] = None,
+        strong_model: Optional[str] = None,
+        long_message_tokens: int = 300,
+        deep_conversation_messages: int = 20,
+        slow_factor: float = 1.5,
+        probe_rate: float = 0.05,
+        tenant_models: Optional[Dict[str, FrozenSet[str]]] = None,
+        supports: Optional[Callable[[str], bool]] = None,
+    ):
+        """
+        Initialize the ModelRouter.
+
+        Args:
+            resilience (ResilientCaller): Provides the circuit state and latency of each model.
+            default_model (str): The model of general messages.
+            temperature (float): The temperature of general messages.
+            max_tokens (int): The maximum response length of general messages.
+            fast_model (str, optional): The model of greetings and FAQ questions.
+            strong_model (str, optional): The model of code questions and long or deep conversations.
+            long_message_tokens (int): Messages with more tokens go to the strong model.
+            deep_conversation_messages (int): Conversations with more messages go to the strong model.
+            slow_factor (float): How much slower than an alternative a model may be before it is avoided.
+            probe_rate (float): Share of the requests avoiding a slow model that are sent to it anyway.
+            tenant_models (dict, optional): The models each listed tenant may use.
+            supports (callable, optional): Returns whether a model can be called at all, e.g.
+                whether an API key is configured for it.
+        """
+        self.resilience = resilience
+        self.default_model = default_model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.fast_model = fast_model or default_model
+        self.strong_model = strong_model or default_model
+        self.long_message_tokens = long_message_tokens
+        self.deep_conversation_messages = deep_conversation_messages
+        self.slow_factor = slow_factor
+        self.probe_rate = probe_rate
+        self.tenant_models = tenant_models or {}
+        self.supports = supports or (lambda model: True)
+
+    def route(self, text: str, depth: int, tenant_id: Optional[str] = None) -> Route:
+        """
+        Choose the model and parameters for a reply to a message.
+
+        Args:
+            text (str): The user's message.
+            depth (int): The number of messages in the conversation.
+            tenant_id (str, optional): The tenant the conversation belongs to.
+
+        Returns:
+            Route: The chosen model and parameters.
+        """
+        intent = detect_intent(text)
+        message_tokens = estimate_tokens(text or "")
+        temperature, max_tokens = self.temperature, self.max_tokens
+        if intent == GREETING:
+            candidates = [self.fast_model, self.default_model]
+            max_tokens = min(max_tokens, 60)
+        elif intent == FAQ:
+            candidates = [self.fast_model, self.default_model]
+            temperature = min(temperature, 0.3)
+        elif intent == CODE:
+            candidates = [self.strong_model, self.default_model]
+            temperature = min(temperature, 0.2)
+            max_tokens *= 2
+        elif (
+            message_tokens > self.long_message_tokens
+            or depth > self.deep_conversation_messages
+        ):
+            candidates = [self.strong_model, self.default_model]
+        else:
+            candidates = [self.default_model, self.fast_model]
+
+        model, reason = self._choose(candidates, tenant_id)
+        OPENAI_ROUTES.labels(model, intent).inc()
+        return Route(
+            model, temperature, max_tokens, intent, reason, message_tokens, depth
+        )
+
+    def _choose(self, candidates: List[str], tenant_id: Optional[str]):
+        """
+        Return the first healthy candidate the tenant may use, and why it was chosen.
+        """
+        candidates = list(dict.fromkeys(candidates))
+        reason = "intent"
+        allowed = self.tenant_models.get(tenant_id or "")
+        if allowed is not None and not allowed.issuperset(candidates):
+            reason = "tenant_policy"
+            candidates = [model for model in candidates if model in allowed] or sorted(
+                allowed
+            )
+        candidates = [
+            model for model in candidates if self.supports(model)
+        ] or candidates
+
+        # A half open circuit is left to the ResilientCaller, which sends it one probe.
+        healthy = {
+            model: self._p95(model)
+            for model in candidates
+            if self.resilience.breaker(model).available
+        }
+        known = [latency for latency in healthy.values() if latency is not None]
+        too_slow = min(known) * self.slow_factor if known else None
+        slow = None
+        for model, latency in healthy.items():
+            if latency is not None and latency > too_slow:
+                slow = slow or model
+                continue
+            if slow is not None and random.random() < self.probe_rate:
+                return slow, "slow_probe"
+            if model != candidates[0]:
+                reason = f"{candidates[0]}_degraded"
+            return model, reason
+        # Every candidate is degraded; the resilience layer falls back if it has to.
+        return candidates[0], "all_degraded"
+
+    def _p95(self, model: str) -> Optional[float]:
+        tracker = self.resilience.latencies.get(model)
+        return tracker.percentile(0.95) if tracker is not None else None
+
+    def record(
+        self,
+        route: Route,
+        seconds: float,
+        tenant_id: Optional[str],
+        error: Optional[BaseException] = None,
+    ):
+        """
+        Log a routed request with its outcome and latency.
+        """
+        logger.info(
+            f"route model={route.model} intent={route.intent} reason={route.reason} "
+            f"temperature={route.temperature} max_tokens={route.max_tokens} "
+            f"message_tokens={route.message_tokens} depth={route.depth} "
+            f"tenant={tenant_id or '-'} latency_ms={seconds * 1000:.0f} "
+            f"outcome={'error' if error is not None else 'ok'}"
+        )
@@ -0,0 +1,331 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_retryable_errors: Optional[Tuple[type, ...]] = None
+
+
+def retryable_errors() -> Tuple[type, ...]:
+    """
+    Return the errors worth sending the request again for. Anything else, like a bad
+    request or an authentication error, fails the same way on every attempt.
+
+    The OpenAI SDK is slow to import, so it is imported here on first use rather than
+    when the application starts.
+    """
+    global _retryable_errors
+    if _retryable_errors is None:
+        from openai import (
+            APIConnectionError,
+            APITimeoutError,
+            InternalServerError,
+            RateLimitError,
+        )
+
+        _retryable_errors = (
+            asyncio.TimeoutError,
+            APIConnectionError,
+            APITimeoutError,
+            InternalServerError,
+            RateLimitError,
+        )
+    return _retryable_errors
+
+
+def is_retryable(error: BaseException) -> bool:
+    return isinstance(error, retryable_errors())
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised when every model a request could go to has its circuit open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a model after failure_threshold consecutive failures.
+
+    While open, requests fail fast. After recovery_timeout seconds one request is let
+    through; the circuit closes again if it succeeds and reopens if it fails.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self._state = self.CLOSED
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if (
+            self._state == self.OPEN
+            and time.monotonic() - self.opened_at >= self.recovery_timeout
+        ):
+            self._state = self.HALF_OPEN
+        return self._state
+
+    @property
+    def available(self) -> bool:
+        """
+        Whether allow would let a request through now, without taking the half open probe.
+        """
+        state = self.state
+        return state == self.CLOSED or (state == self.HALF_OPEN and not self._probing)
+
+    def allow(self) -> bool:
+        """
+        Return whether a request may be sent now.
+        """
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def release_probe(self):
+        """
+        Give back the half open probe taken by allow when the request ended without an
+        outcome, like a cancellation or an error that says nothing about the model's health.
+        The circuit stays half open and the next request probes it.
+        """
+        self._probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self._probing = False
+        self._state = self.CLOSED
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self._state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                logger.warning(f"Opening circuit after {self.failures} failures")
+            self._state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """
+    Keeps the latest latencies of successful requests to estimate a percentile.
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """
+        Return the given percentile, between 0 and 1, or None until there are enough samples.
+        """
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile))]
+
+
+class ResilientCaller:
+    """
+    Sends requests to OpenAI with timeouts, retries, hedging, circuit breakers and a fallback model.
+
+    Every attempt gets attempt_timeout seconds. Attempts that fail with a transient error
+    are retried up to max_retries times, sleeping with decorrelated jitter between them.
+    With hedging, a second identical request is sent when the first has not answered within
+    the model's p95 latency, and whichever answers first wins while the other is cancelled.
+    Each model has a circuit breaker; when the primary model's circuit is open or its
+    attempts are exhausted, the request goes to the fallback model.
+    """
+
+    def __init__(
+        self,
+        attempt_timeout: float = 30.0,
+        max_retries: int = 2,
+        base_delay: float = 0.25,
+        max_delay: float = 4.0,
+        hedging: bool = False,
+        hedge_percentile: float = 0.95,
+        min_hedge_delay: float = 1.0,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        fallback_model: Optional[str] = None,
+    ):
+        """
+        Initialize the ResilientCaller.
+
+        Args:
+            attempt_timeout (float): Seconds before an attempt is abandoned.
+            max_retries (int): Number of times a failed request is sent again per model.
+            base_delay (float): Minimum seconds to sleep before a retry.
+            max_delay (float): Maximum seconds to sleep before a retry.
+            hedging (bool): Whether to send a hedged request when the first one is slow.
+            hedge_percentile (float): Latency percentile after which the hedged request is sent.
+            min_hedge_delay (float): Minimum seconds before the hedged request is sent.
+            failure_threshold (int): Consecutive failures that open a model's circuit.
+            recovery_timeout (float): Seconds a circuit stays open before a request is let through.
+            fallback_model (str, optional): Model used when the requested one is failing.
+        """
+        self.attempt_timeout = attempt_timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_delay = min_hedge_delay
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.fallback_model = fallback_model
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.latencies: Dict[str, LatencyTracker] = {}
+        self.hedges = 0
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        breaker = self.breakers.get(model)
+        if breaker is None:
+            breaker = self.breakers[model] = CircuitBreaker(
+                self.failure_threshold, self.recovery_timeout
+            )
+        return breaker
+
+    async def call(
+        self,
+        model: str,
+        fn: Callable[[str], Awaitable[T]],
+        hedge: bool = True,
+    ) -> T:
+        """
+        Run fn for the model, or for the fallback model when the model is failing.
+
+        Args:
+            model (str): The requested model.
+            fn (callable): Sends the request to the model it is given and returns the response.
+            hedge (bool): Whether this request may be hedged. Streams should not be.
+
+        Returns:
+            The response of the first successful attempt.
+        """
+        models = [model]
+        if self.fallback_model and self.fallback_model != model:
+            models.append(self.fallback_model)
+
+        last_error: Optional[BaseException] = None
+        for candidate in models:
+            breaker = self.breaker(candidate)
+            probe = breaker.state == CircuitBreaker.HALF_OPEN
+            if not breaker.allow():
+                logger.warning(f"Circuit for {candidate} is open, skipping it")
+                continue
+            if candidate != model:
+                logger.warning(f"Falling back from {model} to {candidate}")
+            try:
+                return await self._call_with_retries(candidate, fn, hedge)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                last_error = e
+            finally:
+                # A probe that ends without recording an outcome, because it was
+                # cancelled or failed with a non-retryable error, would otherwise keep
+                # the circuit from ever closing again.
+                if probe:
+                    breaker.release_probe()
+
+        if last_error is not None:
+            raise last_error
+        raise CircuitOpenError(f"The circuits of {', '.join(models)} are open")
+
+    async def _call_with_retries(
+        self, model: str, fn: Callable[[str], Awaitable[T]], hedge: bool
+    ) -> T:
+        breaker = self.breaker(model)
+        delay = self.base_delay
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = await self._attempt(model, fn, hedge)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                breaker.record_failure()
+                if attempt == self.max_retries or not breaker.allow():
+                    raise
+                # Decorrelated jitter: each sleep is random between the base delay and
+                # three times the previous one.
+                delay = min(self.max_delay, random.uniform(self.base_delay, delay * 3))
+                logger.warning(
+                    f"Attempt {attempt + 1} for {model} failed ({type(e).__name__}), "
+                    f"retrying in {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+                continue
+            breaker.record_success()
+            return result
+
+    async def _attempt(
+        self, model: str, fn: Callable[[str], Awaitable[T]], hedge: bool
+    ) -> T:
+        started_at = time.monotonic()
+        hedge_delay = self._hedge_delay(model) if hedge else None
+        if hedge_delay is None:
+            result = await asyncio.wait_for(fn(model), self.attempt_timeout)
+        else:
+            result = await asyncio.wait_for(
+                self._hedged(model, fn, hedge_delay), self.attempt_timeout
+            )
+        self._latency(model).record(time.monotonic() - started_at)
+        return result
+
+    async def _hedged(
+        self, model: str, fn: Callable[[str], Awaitable[T]], hedge_delay: float
+    ) -> T:
+        tasks = {asyncio.ensure_future(fn(model))}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done:
+                self.hedges += 1
+                tasks.add(asyncio.ensure_future(fn(model)))
+            while True:
+                done, pending = await asyncio.wait(
+                    tasks, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                if not pending:
+                    raise next(iter(done)).exception()
+                # One of the two requests failed; wait for the other one.
+                tasks = pending
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _hedge_delay(self, model: str) -> Optional[float]:
+        if not self.hedging:
+            return None
+        percentile = self._latency(model).percentile(self.hedge_percentile)
+        if percentile is None:
+            return None
+        return max(self.min_hedge_delay, percentile)
+
+    def _latency(self, model: str) -> LatencyTracker:
+        tracker = self.latencies.get(model)
+        if tracker is None:
+            tracker = self.latencies[model] = LatencyTracker()
+        return tracker
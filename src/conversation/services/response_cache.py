@@ -0,0 +1,283 @@
+import hashlib
+import importlib.util
+import json
+import logging
+import sys
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from src.conversation.roles.role_classes import BaseRole
+from src.telemetry import record_cache
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(messages: List[BaseRole], model: str, temperature: float) -> str:
+    """
+    Return the exact-match key of a request: a hash of the model, the temperature and the
+    messages, with whitespace and case normalized.
+
+    Each message hashes its normalized content once, so this only joins those fingerprints.
+    """
+    digest = hashlib.sha256(json.dumps([model, round(temperature, 3)]).encode())
+    for message in messages:
+        digest.update(message.fingerprint)
+    return digest.hexdigest()
+
+
+def scope_key(messages: List[BaseRole], model: str, temperature: float) -> int:
+    """
+    Return the key of everything in a request except its last message, which the semantic
+    tier compares by meaning instead.
+    """
+    digest = bytes.fromhex(cache_key(messages[:-1], model, temperature))
+    return int.from_bytes(digest[:8], "little", signed=True)
+
+
+class _Entry:
+    __slots__ = ("reply", "expires_at", "size")
+
+    def __init__(self, reply: str, expires_at: float, size: int):
+        self.reply = reply
+        self.expires_at = expires_at
+        self.size = size
+
+
+class _SemanticIndex:
+    """
+    The embeddings of one tenant's cached questions, as rows of a matrix of unit vectors.
+
+    NumPy is only imported once the semantic tier is used, so it does not slow down the
+    startup of applications without it.
+    """
+
+    def __init__(self, dimensions: int, capacity: int = 64):
+        import numpy as np
+
+        self.vectors = np.zeros((capacity, dimensions), dtype=np.float32)
+        self.scopes = np.zeros(capacity, dtype=np.int64)
+        self.expires_at = np.zeros(capacity, dtype=np.float64)
+        self.ids: List[int] = []
+        self.rows: Dict[int, int] = {}
+
+    def add(self, entry_id: int, vector: "np.ndarray", scope: int, expires_at: float):
+        row = len(self.ids)
+        if row == len(self.vectors):
+            self._grow()
+        self.vectors[row] = vector
+        self.scopes[row] = scope
+        self.expires_at[row] = expires_at
+        self.ids.append(entry_id)
+        self.rows[entry_id] = row
+
+    def remove(self, entry_id: int):
+        # Move the last row into the removed one, so the rows stay contiguous.
+        row = self.rows.pop(entry_id)
+        last = len(self.ids) - 1
+        if row != last:
+            moved = self.ids[last]
+            self.vectors[row] = self.vectors[last]
+            self.scopes[row] = self.scopes[last]
+            self.expires_at[row] = self.expires_at[last]
+            self.ids[row] = moved
+            self.rows[moved] = row
+        self.ids.pop()
+
+    def search(
+        self, vector: "np.ndarray", scope: int, now: float
+    ) -> Optional[Tuple[int, float]]:
+        """
+        Return the ID and cosine similarity of the closest live entry with the same scope.
+        """
+        import numpy as np
+
+        count = len(self.ids)
+        if count == 0:
+            return None
+        scores = self.vectors[:count] @ vector
+        scores[(self.scopes[:count] != scope) | (self.expires_at[:count] <= now)] = -1.0
+        row = int(np.argmax(scores))
+        if scores[row] < 0:
+            return None
+        return self.ids[row], float(scores[row])
+
+    def _grow(self):
+        import numpy as np
+
+        capacity = len(self.vectors) * 2
+        self.vectors = np.resize(self.vectors, (capacity, self.vectors.shape[1]))
+        self.scopes = np.resize(self.scopes, capacity)
+        self.expires_at = np.resize(self.expires_at, capacity)
+
+
+class ResponseCache:
+    """
+    Caches assistant replies so repeated questions skip the completion request.
+
+    The exact tier matches requests whose model, temperature and normalized messages are the
+    same. The optional semantic tier matches requests whose messages are the same except for
+    the last one, when that message's embedding is at least semantic_threshold similar, by
+    cosine similarity, to a cached one. The embeddings of a tenant are kept in one matrix, so
+    a lookup is a single matrix-vector product.
+
+    Entries are isolated per tenant. Both tiers share one LRU order, entries expire ttl
+    seconds after they were added, and the least recently used entries are evicted when
+    there are more than max_entries or they take more than max_bytes.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 3600,
+        max_entries: int = 10000,
+        max_bytes: int = 32 * 1024 * 1024,
+        semantic_threshold: Optional[float] = None,
+    ):
+        """
+        Initialize the ResponseCache.
+
+        Args:
+            ttl (float): Seconds a reply stays in the cache.
+            max_entries (int): Maximum number of cached replies across tenants.
+            max_bytes (int): Approximate memory budget of the cached replies and embeddings.
+            semantic_threshold (float, optional): Minimum cosine similarity of a semantic hit.
+                The semantic tier is disabled when this is not set, or when numpy, from the
+                semantic-cache extra, is not installed.
+        """
+        if semantic_threshold is not None and not importlib.util.find_spec("numpy"):
+            logger.warning(
+                "SEMANTIC_CACHE_THRESHOLD is set but numpy is not installed; "
+                "install the semantic-cache extra to use the semantic cache"
+            )
+            semantic_threshold = None
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.semantic_threshold = semantic_threshold
+        self.size_bytes = 0
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        # (tenant, exact key) for exact entries and (tenant, entry ID) for semantic ones.
+        self._entries: "OrderedDict[Tuple[str, object], _Entry]" = OrderedDict()
+        self._indexes: Dict[str, _SemanticIndex] = {}
+        self._next_id = 0
+
+    @property
+    def semantic(self) -> bool:
+        return self.semantic_threshold is not None
+
+    def get(self, tenant_id: Optional[str], key: str) -> Optional[str]:
+        """
+        Return the cached reply for an exact key, or None.
+        """
+        entry = self._lookup((tenant_id or "", key), time.monotonic())
+        record_cache("response_exact", entry is not None)
+        if entry is None:
+            return None
+        self.hits += 1
+        return entry.reply
+
+    def get_similar(
+        self, tenant_id: Optional[str], scope: int, embedding
+    ) -> Optional[str]:
+        """
+        Return the cached reply of the most similar question in the same scope, or None.
+        """
+        tenant = tenant_id or ""
+        index = self._indexes.get(tenant)
+        now = time.monotonic()
+        match = index.search(self._unit(embedding), scope, now) if index else None
+        entry = None
+        if match is not None and match[1] >= self.semantic_threshold:
+            entry = self._lookup((tenant, match[0]), now)
+        record_cache("response_semantic", entry is not None)
+        if entry is None:
+            return None
+        self.semantic_hits += 1
+        return entry.reply
+
+    def put(
+        self,
+        tenant_id: Optional[str],
+        key: str,
+        reply: str,
+        scope: Optional[int] = None,
+        embedding=None,
+    ):
+        """
+        Cache a reply under its exact key and, when an embedding is given, in the semantic tier.
+        """
+        tenant = tenant_id or ""
+        expires_at = time.monotonic() + self.ttl
+        reply_size = sys.getsizeof(reply)
+        self._add((tenant, key), _Entry(reply, expires_at, len(key) + reply_size))
+
+        if self.semantic and embedding is not None and scope is not None:
+            vector = self._unit(embedding)
+            index = self._indexes.get(tenant)
+            if index is None:
+                index = self._indexes[tenant] = _SemanticIndex(len(vector))
+            entry_id = self._next_id
+            self._next_id += 1
+            index.add(entry_id, vector, scope, expires_at)
+            self._add(
+                (tenant, entry_id),
+                _Entry(reply, expires_at, reply_size + vector.nbytes + 16),
+            )
+        self._enforce_limits()
+
+    def record_miss(self):
+        self.misses += 1
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+        }
+
+    def _lookup(self, key: Tuple[str, object], now: float) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= now:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _add(self, key: Tuple[str, object], entry: _Entry):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self.size_bytes += entry.size
+
+    def _enforce_limits(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes
+        ):
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Tuple[str, object]):
+        entry = self._entries.pop(key)
+        self.size_bytes -= entry.size
+        tenant, entry_key = key
+        if isinstance(entry_key, int):
+            index = self._indexes[tenant]
+            index.remove(entry_key)
+            if not index.ids:
+                del self._indexes[tenant]
+
+    @staticmethod
+    def _unit(embedding) -> "np.ndarray":
+        import numpy as np
+
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from typing import Set
+
+from src.conversation.history.conversation_history import ConversationHistory
+from src.conversation.roles.role_classes import SystemRole, UserRole
+from src.telemetry import BACKGROUND, CURRENT_REQUEST_CLASS
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a chat between a user and an assistant. "
+    "Merge the new messages into the existing summary. Keep facts, names, decisions "
+    "and open questions the assistant may need later. Reply with the updated summary only."
+)
+
+
+class ConversationSummarizer:
+    """
+    Folds messages evicted from a conversation into a rolling summary in the background.
+
+    Only the newly evicted messages are sent together with the previous summary, so the
+    whole history is never re-summarized. At most one summarization runs per conversation.
+    """
+
+    def __init__(self, conversation_service, model: str, max_tokens: int = 300):
+        """
+        Initialize the ConversationSummarizer.
+
+        Args:
+            conversation_service (ConversationService): The service used to call OpenAI.
+            model (str): The model used for summaries, usually a cheaper one than for replies.
+            max_tokens (int): The maximum number of tokens in a summary.
+        """
+        self.conversation_service = conversation_service
+        self.model = model
+        self.max_tokens = max_tokens
+        self._running: Set[ConversationHistory] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def schedule(self, conversation: ConversationHistory):
+        """
+        Start summarizing the conversation's pending messages, unless a summary is already being computed.
+
+        Args:
+            conversation (ConversationHistory): The conversation with messages in pending_summary.
+        """
+        if not conversation.pending_summary or conversation in self._running:
+            return
+        self._running.add(conversation)
+        task = asyncio.create_task(self._run(conversation))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def close(self):
+        """
+        Cancel summaries that are still running.
+        """
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run(self, conversation: ConversationHistory):
+        # Summaries are not waited for, so they yield to the replies users wait for.
+        CURRENT_REQUEST_CLASS.set(BACKGROUND)
+        try:
+            # Messages evicted while a summary is computed are picked up by the next pass,
+            # and so is everything pending when the history was reloaded meanwhile.
+            while conversation.pending_summary:
+                batch = list(conversation.pending_summary)
+                summary = await self.summarize(conversation.summary, batch)
+                if not conversation.apply_summary(summary, batch):
+                    logger.info("Discarding a summary of a reloaded conversation")
+        except Exception as e:
+            logger.error(f"Failed to summarize conversation: {e}", exc_info=True)
+        finally:
+            self._running.discard(conversation)
+
+    async def summarize(self, previous_summary, messages: list) -> str:
+        """
+        Merge messages into an existing summary.
+
+        Args:
+            previous_summary (str, optional): The current summary, if any.
+            messages (list): The messages to fold into the summary, as role objects.
+
+        Returns:
+            str: The updated summary.
+        """
+        transcript = "\n".join(f"{m.role}: {m.content}" for m in messages)
+        prompt = (
+            f"Existing summary:\n{previous_summary or '(none)'}\n\n"
+            f"New messages:\n{transcript}"
+        )
+        return await self.conversation_service.complete(
+            [SystemRole(SUMMARY_INSTRUCTIONS), UserRole(prompt)],
+            model=self.model,
+            temperature=0.2,
+            max_tokens=self.max_tokens,
+        )
@@ -1,4 +1,5 @@
+from src.dialogs.command_router import CommandRouter
 from src.dialogs.logout_dialog import LogoutDialog
 from src.dialogs.main_dialog import MainDialog
 
-__all__ = ["LogoutDialog", "MainDialog"]
+__all__ = ["CommandRouter", "LogoutDialog", "MainDialog"]
@@ -0,0 +1,55 @@
+from typing import Awaitable, Callable, Dict, Optional
+
+from botbuilder.core import TurnContext
+from botbuilder.schema import ActivityTypes
+
+# Runs a command and returns whether it ended the turn, so the dialogs should be cancelled.
+CommandHandler = Callable[[TurnContext], Awaitable[bool]]
+
+
+class CommandRouter:
+    """
+    Matches messages that are commands, like "logout", before the dialogs run.
+
+    Commands are looked up by their lowercased text in a dict built once. A message longer
+    than the longest command cannot be one, so most messages are rejected by a length
+    check without being lowercased.
+
+    A command runs at most once per turn, so a dialog that checks for commands too does
+    not run one again after its bot did.
+    """
+
+    _ROUTED_KEY = "CommandRouter.routed"
+
+    def __init__(self):
+        self._handlers: Dict[str, CommandHandler] = {}
+        self._max_length = 0
+
+    def add(self, command: str, handler: CommandHandler):
+        command = command.lower()
+        self._handlers[command] = handler
+        self._max_length = max(self._max_length, len(command))
+
+    def match(self, text: Optional[str]) -> Optional[CommandHandler]:
+        """
+        Return the handler of the command the text is, or None.
+        """
+        if not text or len(text) > self._max_length:
+            return None
+        return self._handlers.get(text.lower())
+
+    async def route(self, turn_context: TurnContext) -> bool:
+        """
+        Run the command the activity is, if any.
+
+        Returns:
+            bool: Whether a command ran and ended the turn.
+        """
+        activity = turn_context.activity
+        if activity.type != ActivityTypes.message:
+            return False
+        handler = self.match(activity.text)
+        if handler is None or turn_context.turn_state.get(self._ROUTED_KEY):
+            return False
+        turn_context.turn_state[self._ROUTED_KEY] = True
+        return await handler(turn_context)
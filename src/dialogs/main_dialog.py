@@ -1,13 +1,25 @@
 import logging
-from botbuilder.core import MessageFactory
+import uuid
+from typing import Optional
+from botbuilder.core import MessageFactory, TurnContext, UserState
 from botbuilder.dialogs import WaterfallDialog, WaterfallStepContext, DialogTurnResult
 from botbuilder.dialogs.prompts import OAuthPrompt, OAuthPromptSettings, ConfirmPrompt
-from botbuilder.schema import CardAction, ActionTypes, SuggestedActions
+from botbuilder.schema import (
+    Activity,
+    ActivityTypes,
+    CardAction,
+    ActionTypes,
+    SuggestedActions,
+)
 from config import DefaultConfig
 from src.dialogs.logout_dialog import LogoutDialog
-from src.services import Auth, User
+from src.services import Auth, SessionTokenCache, User, UserInfoClient
 from src.conversation.services.conversation_service import ConversationService
+from src.conversation.history.history_manager import ConversationHistoryManager
 from src.conversation.history.conversation_history import ConversationHistory
+from src.helpers.conversation_helper import get_tenant_id
+from src.helpers.streaming_helper import StreamingReply
+from src.runtime.job_queue import JobQueue, QueueFull, ReplyJob
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,16 +29,28 @@ class MainDialog(LogoutDialog):
     def __init__(
         self,
         config: DefaultConfig,
-        conversation_history: ConversationHistory,
+        conversation_history: ConversationHistoryManager,
         conversation_service: ConversationService,
+        reply_queue: Optional[JobQueue] = None,
+        user_state: Optional[UserState] = None,
     ):
         """
         Initializes MainDialog with configuration and services.
+
+        When a reply queue is given, replies are produced by workers and sent proactively
+        instead of within the turn. Signed-in users are answered from a cached token only
+        when a user state is given, which records their sessions for every process.
         """
         super(MainDialog, self).__init__(MainDialog.__name__, config.CONNECTION_NAME)
         self.config = config
         self.conversation_history = conversation_history
         self.conversation_service = conversation_service
+        self.reply_queue = reply_queue
+        self.session_state = (
+            user_state.create_property("SessionState")
+            if user_state is not None
+            else None
+        )
 
         self._add_prompts_and_dialogs()
         self._setup_config_attributes()
@@ -56,17 +80,62 @@ class MainDialog(LogoutDialog):
         self.auth0_issuer = self.config.AUTH_ISSUER
         self.auth0_audience = self.config.AUTH_AUDIENCE
         self.auth0_algorithm = self.config.AUTH_ALGORITHM
+        self.auth = Auth(self.auth0_issuer, self.auth0_audience, self.auth0_algorithm)
+        self.user_info_client = UserInfoClient(ttl=self.config.USER_INFO_TTL_SECONDS)
+        self.sessions = (
+            SessionTokenCache(refresh_margin=self.config.SESSION_REFRESH_MARGIN_SECONDS)
+            if self.config.SESSION_CACHE_ENABLED and self.session_state is not None
+            else None
+        )
         self.initial_dialog_id = "WFDialog"
 
+    async def continue_session(self, turn_context: TurnContext) -> bool:
+        """
+        Answers a message with the user's cached token, without running the dialog.
+
+        Returns whether the message was answered. When it was not, because there is no
+        valid cached token, the dialog runs and the OAuth prompt gets a token.
+        """
+        if self.sessions is None:
+            return False
+        user_id = turn_context.activity.from_property.id
+        # The token is only used while the session it was cached for is the user's
+        # current one, so signing out in another process ends it here too.
+        sessions = await self.session_state.get(turn_context, dict)
+        session_id = sessions.get(self.connection_name)
+        token = self.sessions.get(user_id, self.connection_name, session_id)
+        if token is None:
+            return False
+        try:
+            user = await self._authenticate_user(token)
+        except ValueError:
+            # The token was rejected; get a new one through the prompt.
+            self.sessions.remove(user_id, self.connection_name)
+            return False
+
+        try:
+            await self._reply(turn_context, user)
+        except Exception as e:
+            await self._report_error(turn_context, e)
+        return True
+
+    async def sign_out(self, turn_context: TurnContext) -> bool:
+        """Ends the user's session and forgets their cached token before signing them out."""
+        if self.sessions is not None:
+            self.sessions.remove(
+                turn_context.activity.from_property.id, self.connection_name
+            )
+            sessions = await self.session_state.get(turn_context, dict)
+            if sessions.pop(self.connection_name, None) is not None:
+                await self.session_state.set(turn_context, sessions)
+        return await super().sign_out(turn_context)
+
     async def prompt_step(self, step_context: WaterfallStepContext) -> DialogTurnResult:
         """Starts the OAuth prompt."""
-        logger.info("Prompt step started.")
         return await step_context.begin_dialog(OAuthPrompt.__name__)
 
     async def login_step(self, step_context: WaterfallStepContext) -> DialogTurnResult:
         """Handles login result and initiates the conversation."""
-        logger.info("Login step started.")
-
         if step_context.result:
             return await self._handle_successful_login(step_context)
 
@@ -81,41 +150,100 @@ class MainDialog(LogoutDialog):
     ) -> DialogTurnResult:
         """Processes successful login and handles conversation."""
         try:
-            user = self._authenticate_user(step_context.result.token)
-            response_text = await self._execute_conversation(step_context, user)
-            await self._send_response(step_context, response_text)
+            token = step_context.result.token
+            user = await self._authenticate_user(token)
+            if self.sessions is not None:
+                session_id = uuid.uuid4().hex
+                sessions = await self.session_state.get(step_context.context, dict)
+                sessions[self.connection_name] = session_id
+                await self.session_state.set(step_context.context, sessions)
+                self.sessions.put(
+                    step_context.context.activity.from_property.id,
+                    self.connection_name,
+                    token,
+                    user.payload,
+                    session_id,
+                )
+            await self._reply(step_context.context, user)
             return await step_context.end_dialog()
 
         except Exception as e:
             return await self._handle_login_error(step_context, e)
 
-    def _authenticate_user(self, token: str) -> User:
+    async def _reply(self, turn_context: TurnContext, user: User):
+        """Answers the user's message, in the turn or through the reply queue."""
+        if self.reply_queue is not None:
+            await self._enqueue_reply(turn_context)
+        elif self.config.STREAMING_ENABLED:
+            await self._stream_conversation(turn_context, user)
+        else:
+            response_text = await self._execute_conversation(turn_context, user)
+            await self._send_response(turn_context, response_text)
+
+    async def _authenticate_user(self, token: str) -> User:
         """Authenticates the user using the provided token."""
-        auth = Auth(self.auth0_issuer, self.auth0_audience, self.auth0_algorithm)
-        decoded_token = auth.decode_jwt(token)
-        return User(token, decoded_token)
+        decoded_token = await self.auth.decode_jwt(token)
+        return await User.load(token, decoded_token, self.user_info_client)
 
     async def _execute_conversation(
-        self, step_context: WaterfallStepContext, user: User
+        self, turn_context: TurnContext, user: User
     ) -> tuple[str, list]:
         """Executes the conversation using the LLM flow service."""
         return await self.conversation_service.process_message(
-            self.conversation_history, step_context.context.activity.text
+            await self._get_history(turn_context), turn_context.activity.text
         )
 
-    async def _send_response(
-        self, step_context: WaterfallStepContext, response_text: str
-    ):
+    async def _stream_conversation(self, turn_context: TurnContext, user: User) -> str:
+        """Executes the conversation, showing the response while it is generated."""
+        parts = self.conversation_service.stream_message(
+            await self._get_history(turn_context), turn_context.activity.text
+        )
+        reply = StreamingReply(
+            turn_context, self.config.STREAMING_UPDATE_INTERVAL_SECONDS
+        )
+        return await reply.send(parts)
+
+    async def _get_history(self, turn_context: TurnContext) -> ConversationHistory:
+        """Returns the history of the conversation the activity belongs to."""
+        activity = turn_context.activity
+        return await self.conversation_history.load_history(
+            activity.conversation.id, get_tenant_id(activity)
+        )
+
+    async def _enqueue_reply(self, turn_context: TurnContext):
+        """Queues the message so the reply is produced and sent after the turn ends."""
+        activity = turn_context.activity
+        job = ReplyJob(
+            TurnContext.get_conversation_reference(activity).serialize(),
+            activity.text,
+            activity.conversation.id,
+            get_tenant_id(activity),
+        )
+        try:
+            await self.reply_queue.put(job)
+        except QueueFull as e:
+            logger.warning(str(e))
+            await turn_context.send_activity(
+                "I'm busy right now, please try again shortly."
+            )
+            return
+        await turn_context.send_activity(Activity(type=ActivityTypes.typing))
+
+    async def _send_response(self, turn_context: TurnContext, response_text: str):
         """Sends the response with suggested actions to the user."""
         reply = MessageFactory.text(response_text)
-        await step_context.context.send_activity(reply)
+        await turn_context.send_activity(reply)
 
     async def _handle_login_error(
         self, step_context: WaterfallStepContext, error: Exception
     ) -> DialogTurnResult:
         """Handles errors during login."""
+        await self._report_error(step_context.context, error)
+        return await step_context.end_dialog()
+
+    async def _report_error(self, turn_context: TurnContext, error: Exception):
+        """Logs an error and tells the user something went wrong."""
         logger.error(f"An error occurred during login: {str(error)}", exc_info=True)
-        await step_context.context.send_activity(
+        await turn_context.send_activity(
             "😔 Something went wrong... type logout and try again!"
         )
-        return await step_context.end_dialog()
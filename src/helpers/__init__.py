@@ -1,4 +1,5 @@
 from . import dialog_helper
 from . import conversation_helper
+from . import streaming_helper
 
-__all__ = ["dialog_helper", "conversation_helper"]
+__all__ = ["dialog_helper", "conversation_helper", "streaming_helper"]
@@ -1 +1,24 @@
 # todo implement conversation process
+from typing import Optional
+
+from botbuilder.schema import Activity
+
+
+def get_tenant_id(activity: Activity) -> Optional[str]:
+    """
+    Return the Microsoft 365 tenant of an activity.
+
+    Teams sends the tenant as conversation.tenantId and in channelData. The SDK only maps
+    "tenantID" onto ConversationAccount.tenant_id, so the other spellings are read too.
+    """
+    conversation = activity.conversation
+    if conversation is not None:
+        if conversation.tenant_id:
+            return conversation.tenant_id
+        extra = getattr(conversation, "additional_properties", None) or {}
+        if extra.get("tenantId"):
+            return extra["tenantId"]
+    channel_data = activity.channel_data
+    if isinstance(channel_data, dict):
+        return (channel_data.get("tenant") or {}).get("id")
+    return None
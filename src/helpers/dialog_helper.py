@@ -1,11 +1,34 @@
+from typing import Optional
+
 from botbuilder.core import StatePropertyAccessor, TurnContext
 from botbuilder.dialogs import Dialog, DialogSet, DialogTurnStatus
+from src.telemetry import span
 
 
 class DialogHelper:
+    @staticmethod
+    def create_dialog_set(dialog: Dialog, accessor: StatePropertyAccessor) -> DialogSet:
+        """
+        Creates the DialogSet a dialog runs in. A DialogSet keeps no state between turns,
+        which is loaded through the accessor, so one can be created per bot and reused.
+
+        Args:
+            dialog (Dialog): The dialog to be executed.
+            accessor (StatePropertyAccessor): The state property accessor used to manage dialog state.
+
+        Returns:
+            DialogSet: The dialog set containing the dialog.
+        """
+        dialog_set = DialogSet(accessor)
+        dialog_set.add(dialog)
+        return dialog_set
+
     @staticmethod
     async def run_dialog(
-        dialog: Dialog, turn_context: TurnContext, accessor: StatePropertyAccessor
+        dialog: Dialog,
+        turn_context: TurnContext,
+        accessor: StatePropertyAccessor,
+        dialog_set: Optional[DialogSet] = None,
     ):
         """
         Executes a dialog using the provided context and state accessor. This function
@@ -17,21 +40,24 @@ class DialogHelper:
             turn_context (TurnContext): The context for the current turn of the bot, containing information
                                         about the conversation and activities.
             accessor (StatePropertyAccessor): The state property accessor used to manage dialog state.
+            dialog_set (DialogSet, optional): A set from create_dialog_set to reuse. A new one
+                                              is created when it is not given.
 
         Returns:
             None: This function doesn't explicitly return a value. The dialog's state and results
                   are managed within the bot's context.
         """
-        # Create a DialogSet and add the dialog to it
-        dialog_set = DialogSet(accessor)
-        dialog_set.add(dialog)
+        if dialog_set is None:
+            dialog_set = DialogHelper.create_dialog_set(dialog, accessor)
 
-        # Create a DialogContext from the DialogSet and TurnContext
-        dialog_context = await dialog_set.create_context(turn_context)
+        # Create a DialogContext from the DialogSet and TurnContext, loading the dialog state
+        with span("state_load"):
+            dialog_context = await dialog_set.create_context(turn_context)
 
-        # Continue the current dialog if one is in progress
-        results = await dialog_context.continue_dialog()
+        with span("dialog"):
+            # Continue the current dialog if one is in progress
+            results = await dialog_context.continue_dialog()
 
-        # If no dialog is active, start the specified dialog
-        if results.status == DialogTurnStatus.Empty:
-            await dialog_context.begin_dialog(dialog.id)
+            # If no dialog is active, start the specified dialog
+            if results.status == DialogTurnStatus.Empty:
+                await dialog_context.begin_dialog(dialog.id)
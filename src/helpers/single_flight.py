@@ -0,0 +1,44 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one.
+
+    The first caller for a key starts the call; callers that arrive while it is in
+    flight wait for the same result instead of starting their own. Cancelling one of
+    the waiters does not cancel the shared call.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run fn for key, or join the call already in flight for it.
+
+        Args:
+            key (Hashable): Identifies calls that can share a result.
+            fn (callable): Starts the call when no call for key is in flight.
+
+        Returns:
+            The result of the shared call.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task)
+
+    def in_flight(self, key: Hashable) -> bool:
+        """
+        Return whether a call for key is currently in flight.
+        """
+        return key in self._calls
@@ -0,0 +1,98 @@
+import time
+from typing import AsyncIterator, Optional
+
+from botbuilder.core import MessageFactory, TurnContext
+from botbuilder.schema import Activity, ActivityTypes
+
+
+class StreamingReply:
+    """
+    Shows a response in Teams while it is being generated.
+
+    A typing indicator is sent first. The first piece of text is sent as a new message,
+    which is then updated in place with the text received so far, at most once per
+    update_interval seconds. When the channel does not return the ID of that message, it
+    cannot be updated, and the complete response is sent once more at the end instead.
+    """
+
+    def __init__(self, turn_context: TurnContext, update_interval: float = 1.0):
+        """
+        Initialize the StreamingReply.
+
+        Args:
+            turn_context (TurnContext): The context of the turn the response belongs to.
+            update_interval (float): Minimum number of seconds between two updates of the message.
+        """
+        self.turn_context = turn_context
+        self.update_interval = update_interval
+        self.text = ""
+        self._activity_id: Optional[str] = None
+        self._sent = False
+        self._sent_text = ""
+        self._last_update = 0.0
+
+    async def send(self, parts: AsyncIterator[str]) -> str:
+        """
+        Stream all parts of a response to the user.
+
+        Args:
+            parts (AsyncIterator[str]): The pieces of the response, in order.
+
+        Returns:
+            str: The full response text.
+        """
+        await self.start()
+        async for part in parts:
+            await self.append(part)
+        await self.finish()
+        return self.text
+
+    async def start(self):
+        """
+        Send a typing indicator.
+        """
+        await self.turn_context.send_activity(Activity(type=ActivityTypes.typing))
+
+    async def append(self, part: str):
+        """
+        Add a piece of the response, sending or updating the message if the throttle allows.
+
+        Args:
+            part (str): The next piece of the response.
+        """
+        self.text += part
+        if not self._sent:
+            if self.text.strip():
+                await self._send_initial()
+        elif (
+            self._activity_id is not None
+            and time.monotonic() - self._last_update >= self.update_interval
+        ):
+            await self._update()
+
+    async def finish(self):
+        """
+        Make sure the message shows the complete response.
+        """
+        if self.text == self._sent_text or not self.text.strip():
+            return
+        if not self._sent:
+            await self._send_initial()
+        elif self._activity_id is None:
+            await self.turn_context.send_activity(MessageFactory.text(self.text))
+        else:
+            await self._update()
+
+    async def _send_initial(self):
+        response = await self.turn_context.send_activity(MessageFactory.text(self.text))
+        self._activity_id = response.id if response else None
+        self._sent = True
+        self._sent_text = self.text
+        self._last_update = time.monotonic()
+
+    async def _update(self):
+        activity = MessageFactory.text(self.text)
+        activity.id = self._activity_id
+        await self.turn_context.update_activity(activity)
+        self._sent_text = self.text
+        self._last_update = time.monotonic()
@@ -0,0 +1,23 @@
+from .activity_dedup import ActivityDeduplicator, MongoActivityDeduplicator
+from .admission import AdmissionController, AdmissionRejected
+from .job_queue import InMemoryJobQueue, JobQueue, MongoJobQueue, QueueFull, ReplyJob
+from .mailbox import ConversationMailbox
+from .reply_workers import ProactiveReplier, ReplyWorkerPool
+from .supervisor import Supervisor, available_cpus
+
+__all__ = [
+    "ActivityDeduplicator",
+    "MongoActivityDeduplicator",
+    "AdmissionController",
+    "AdmissionRejected",
+    "ConversationMailbox",
+    "InMemoryJobQueue",
+    "JobQueue",
+    "MongoJobQueue",
+    "QueueFull",
+    "ReplyJob",
+    "ProactiveReplier",
+    "ReplyWorkerPool",
+    "Supervisor",
+    "available_cpus",
+]
@@ -0,0 +1,147 @@
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityDeduplicator:
+    """
+    Remembers the activities that were already received, so redeliveries can be dropped.
+
+    The Bot Framework redelivers an activity when the bot does not respond in time, which
+    would otherwise run the dialog and call OpenAI again for the same message. Activities
+    are remembered for ttl seconds, up to max_size of them, in this process only: a
+    redelivery that reaches another worker is not recognized. MongoActivityDeduplicator
+    shares them between processes.
+    """
+
+    def __init__(self, ttl: float = 600, max_size: int = 100000):
+        """
+        Initialize the ActivityDeduplicator.
+
+        Args:
+            ttl (float): Seconds an activity ID is remembered.
+            max_size (int): Maximum number of activity IDs remembered.
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.duplicates = 0
+        self._seen: "OrderedDict[Hashable, float]" = OrderedDict()
+
+    @staticmethod
+    def key(
+        conversation_id: Optional[str], activity_id: Optional[str]
+    ) -> Optional[Hashable]:
+        """
+        Return the key of an activity, or None if it has no ID. Activity IDs are only
+        unique within a conversation.
+        """
+        if not activity_id:
+            return None
+        return conversation_id, activity_id
+
+    async def check_and_add(self, key: Optional[Hashable]) -> bool:
+        """
+        Record an activity and return whether it was already received.
+        """
+        if key is None:
+            return False
+        if self._seen_recently(key):
+            self.duplicates += 1
+            return True
+        self._remember(key)
+        return False
+
+    async def forget(self, key: Optional[Hashable]):
+        """
+        Forget an activity whose processing failed, so a redelivery is processed again.
+        """
+        if key is not None:
+            self._seen.pop(key, None)
+
+    def _seen_recently(self, key: Hashable) -> bool:
+        self._expire(time.monotonic())
+        return key in self._seen
+
+    def _remember(self, key: Hashable):
+        self._seen[key] = time.monotonic() + self.ttl
+        if len(self._seen) > self.max_size:
+            self._seen.popitem(last=False)
+
+    def _expire(self, now: float):
+        while self._seen:
+            key, expires_at = next(iter(self._seen.items()))
+            if expires_at > now:
+                break
+            del self._seen[key]
+
+
+class MongoActivityDeduplicator(ActivityDeduplicator):
+    """
+    Remembers received activities in a MongoDB collection through Motor, so a redelivery
+    is dropped whichever worker or replica it reaches.
+
+    Each activity is inserted with its key as _id, so of two processes receiving it only
+    one succeeds. Documents expire ttl seconds after they were inserted. Activities seen
+    received by this process are still checked in memory first.
+    """
+
+    def __init__(self, collection, ttl: float = 600, max_size: int = 100000):
+        """
+        Initialize the MongoActivityDeduplicator.
+
+        Args:
+            collection (AsyncIOMotorCollection): The collection activities are recorded in.
+            ttl (float): Seconds an activity ID is remembered.
+            max_size (int): Maximum number of activity IDs remembered in memory.
+        """
+        super().__init__(ttl, max_size)
+        self.collection = collection
+
+    async def ensure_indexes(self):
+        """
+        Create the index that expires activities.
+        """
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def check_and_add(self, key: Optional[Hashable]) -> bool:
+        # pymongo is only imported once the Mongo backend is used.
+        from pymongo.errors import DuplicateKeyError
+
+        if key is None:
+            return False
+        if self._seen_recently(key):
+            self.duplicates += 1
+            return True
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+        try:
+            await self.collection.insert_one(
+                {"_id": self._document_id(key), "expires_at": expires_at}
+            )
+        except DuplicateKeyError:
+            self.duplicates += 1
+            return True
+        except Exception as e:
+            # Processing a redelivery twice is better than dropping a new message.
+            logger.warning(f"Could not record activity {key}: {e}")
+        # Only the process that received the activity first remembers it, so it is
+        # received again everywhere once that process forgets it.
+        self._remember(key)
+        return False
+
+    async def forget(self, key: Optional[Hashable]):
+        await super().forget(key)
+        if key is None:
+            return
+        try:
+            await self.collection.delete_one({"_id": self._document_id(key)})
+        except Exception as e:
+            logger.warning(f"Could not forget activity {key}: {e}")
+
+    @staticmethod
+    def _document_id(key: Hashable) -> str:
+        conversation_id, activity_id = key
+        return f"{conversation_id or ''}:{activity_id}"
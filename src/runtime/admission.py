@@ -0,0 +1,189 @@
+import asyncio
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional, Tuple
+
+# Upper bounds, in seconds, of the queue wait time histogram buckets.
+WAIT_TIME_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a request cannot be admitted because the queue is full or its deadline passed.
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(f"Request rejected: {reason}")
+        self.reason = reason
+
+
+class _Waiter:
+    __slots__ = ("tenant_id", "user_id", "future", "enqueued_at")
+
+    def __init__(self, tenant_id: str, user_id: str, future: asyncio.Future):
+        self.tenant_id = tenant_id
+        self.user_id = user_id
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class AdmissionController:
+    """
+    Limits how many turns are processed at once, globally and per tenant and user.
+
+    Requests over a limit wait in a bounded FIFO queue for up to queue_timeout seconds.
+    A waiter is let in as soon as all limits that apply to it allow, so a user at their
+    own limit does not hold up other users. Requests that find the queue full, or that
+    time out in it, are rejected with AdmissionRejected.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 64,
+        max_per_tenant: int = 32,
+        max_per_user: int = 2,
+        max_queue: int = 256,
+        queue_timeout: float = 10.0,
+    ):
+        """
+        Initialize the AdmissionController.
+
+        Args:
+            max_concurrent (int): Maximum number of requests processed at once.
+            max_per_tenant (int): Maximum number of requests processed at once for one tenant.
+            max_per_user (int): Maximum number of requests processed at once for one user.
+            max_queue (int): Maximum number of requests waiting to be admitted.
+            queue_timeout (float): Maximum number of seconds a request waits to be admitted.
+        """
+        self.max_concurrent = max_concurrent
+        self.max_per_tenant = max_per_tenant
+        self.max_per_user = max_per_user
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._per_tenant: Dict[str, int] = defaultdict(int)
+        self._per_user: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._waiters: Deque[_Waiter] = deque()
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "timeout": 0}
+        self.wait_time_buckets = [0] * (len(WAIT_TIME_BUCKETS) + 1)
+        self.wait_time_sum = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    @asynccontextmanager
+    async def admit(self, tenant_id: Optional[str], user_id: Optional[str]):
+        """
+        Hold an admission slot for the duration of the block.
+
+        Args:
+            tenant_id (str, optional): The tenant the request belongs to.
+            user_id (str, optional): The user who sent the request.
+
+        Raises:
+            AdmissionRejected: If the request could not be admitted in time.
+        """
+        tenant_id, user_id = tenant_id or "", user_id or ""
+        await self._acquire(tenant_id, user_id)
+        try:
+            yield
+        finally:
+            self._release(tenant_id, user_id)
+
+    def stats(self) -> dict:
+        """
+        Return the current queue depth, in-flight count and admission counters.
+        """
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "wait_time_seconds": {
+                "sum": self.wait_time_sum,
+                "buckets": dict(
+                    zip([*map(str, WAIT_TIME_BUCKETS), "+Inf"], self._cumulative())
+                ),
+            },
+        }
+
+    async def _acquire(self, tenant_id: str, user_id: str):
+        if self._can_run(tenant_id, user_id):
+            self._grant(tenant_id, user_id, 0.0)
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected["queue_full"] += 1
+            raise AdmissionRejected("queue_full")
+
+        waiter = _Waiter(tenant_id, user_id, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.future.done():
+                # Admitted right at the deadline.
+                return
+            self._waiters.remove(waiter)
+            self.rejected["timeout"] += 1
+            raise AdmissionRejected("timeout")
+        except asyncio.CancelledError:
+            if waiter.future.done():
+                # The slot was granted just before the cancellation; hand it back.
+                self._release(tenant_id, user_id)
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def _release(self, tenant_id: str, user_id: str):
+        self.in_flight -= 1
+        self._decrement(self._per_tenant, tenant_id)
+        self._decrement(self._per_user, (tenant_id, user_id))
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        for waiter in list(self._waiters):
+            if self.in_flight >= self.max_concurrent:
+                break
+            if self._can_run(waiter.tenant_id, waiter.user_id):
+                self._waiters.remove(waiter)
+                self._grant(
+                    waiter.tenant_id,
+                    waiter.user_id,
+                    time.monotonic() - waiter.enqueued_at,
+                )
+                waiter.future.set_result(None)
+
+    def _can_run(self, tenant_id: str, user_id: str) -> bool:
+        return (
+            self.in_flight < self.max_concurrent
+            and self._per_tenant.get(tenant_id, 0) < self.max_per_tenant
+            and self._per_user.get((tenant_id, user_id), 0) < self.max_per_user
+        )
+
+    def _grant(self, tenant_id: str, user_id: str, waited: float):
+        self.in_flight += 1
+        self._per_tenant[tenant_id] += 1
+        self._per_user[(tenant_id, user_id)] += 1
+        self.admitted += 1
+        self.wait_time_sum += waited
+        for index, bound in enumerate(WAIT_TIME_BUCKETS):
+            if waited <= bound:
+                self.wait_time_buckets[index] += 1
+                break
+        else:
+            self.wait_time_buckets[-1] += 1
+
+    def _cumulative(self):
+        total = 0
+        for count in self.wait_time_buckets:
+            total += count
+            yield total
+
+    @staticmethod
+    def _decrement(counts: dict, key):
+        counts[key] -= 1
+        if counts[key] <= 0:
+            del counts[key]
@@ -0,0 +1,262 @@
+import asyncio
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+
+class QueueFull(Exception):
+    """
+    Raised when a job cannot be enqueued because the queue is at capacity.
+    """
+
+
+class ReplyJob:
+    """
+    A user message whose reply is produced by a worker and sent proactively.
+    """
+
+    def __init__(
+        self,
+        conversation_reference: Dict[str, Any],
+        text: str,
+        conversation_id: str,
+        tenant_id: Optional[str] = None,
+        job_id: Optional[str] = None,
+        attempts: int = 0,
+        reply: Optional[str] = None,
+        error: Optional[str] = None,
+    ):
+        """
+        Initialize the ReplyJob.
+
+        Args:
+            conversation_reference (dict): The serialized ConversationReference to reply to.
+            text (str): The user's message.
+            conversation_id (str): The Bot Framework conversation ID.
+            tenant_id (str, optional): The tenant the conversation belongs to.
+            job_id (str, optional): Unique ID of the job, generated if not given.
+            attempts (int): Number of attempts that already failed.
+            reply (str, optional): The generated reply, once the completion has succeeded. Retries
+                only resend it instead of generating it again.
+            error (str, optional): The last error, for dead-lettered jobs.
+        """
+        self.conversation_reference = conversation_reference
+        self.text = text
+        self.conversation_id = conversation_id
+        self.tenant_id = tenant_id
+        self.job_id = job_id or uuid.uuid4().hex
+        self.attempts = attempts
+        self.reply = reply
+        self.error = error
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "conversation_reference": self.conversation_reference,
+            "text": self.text,
+            "conversation_id": self.conversation_id,
+            "tenant_id": self.tenant_id,
+            "attempts": self.attempts,
+            "reply": self.reply,
+            "error": self.error,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ReplyJob":
+        return cls(
+            data["conversation_reference"],
+            data["text"],
+            data["conversation_id"],
+            tenant_id=data.get("tenant_id"),
+            job_id=data.get("job_id"),
+            attempts=data.get("attempts", 0),
+            reply=data.get("reply"),
+            error=data.get("error"),
+        )
+
+
+class JobQueue(ABC):
+    """
+    A bounded queue of reply jobs with retries and a dead-letter list.
+    """
+
+    # Seconds a job taken with get stays reserved for its worker, for queues that lease
+    # jobs. The worker extends the lease while it holds the job.
+    lease: Optional[float] = None
+
+    @abstractmethod
+    async def put(self, job: ReplyJob):
+        """
+        Enqueue a job.
+
+        Raises:
+            QueueFull: If the queue is at capacity.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def get(self) -> ReplyJob:
+        """
+        Wait for the next job that is ready to run.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def ack(self, job: ReplyJob):
+        """
+        Mark a job as done.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def retry(self, job: ReplyJob, delay: float):
+        """
+        Make a failed job available again after delay seconds.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def dead_letter(self, job: ReplyJob):
+        """
+        Move a job that failed too often out of the queue.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def size(self) -> int:
+        """
+        Return the number of jobs waiting to run.
+        """
+        raise NotImplementedError()
+
+    async def extend(self, jobs: List[ReplyJob]):
+        """
+        Extend the leases of jobs a worker still holds. Queues without leases do nothing.
+        """
+
+
+class InMemoryJobQueue(JobQueue):
+    """
+    Keeps jobs in this process. Jobs that are still queued are lost on restart.
+    """
+
+    def __init__(self, max_size: int = 1000, max_dead_letters: int = 1000):
+        self.max_size = max_size
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._delayed = 0
+        self.dead_letters: Deque[ReplyJob] = deque(maxlen=max_dead_letters)
+
+    async def put(self, job: ReplyJob):
+        if self._queue.qsize() + self._delayed >= self.max_size:
+            raise QueueFull(f"Reply queue is full ({self.max_size} jobs)")
+        self._queue.put_nowait(job)
+
+    async def get(self) -> ReplyJob:
+        return await self._queue.get()
+
+    async def ack(self, job: ReplyJob):
+        pass
+
+    async def retry(self, job: ReplyJob, delay: float):
+        self._delayed += 1
+        asyncio.get_running_loop().call_later(delay, self._requeue, job)
+
+    async def dead_letter(self, job: ReplyJob):
+        self.dead_letters.append(job)
+
+    async def size(self) -> int:
+        return self._queue.qsize() + self._delayed
+
+    def _requeue(self, job: ReplyJob):
+        self._delayed -= 1
+        self._queue.put_nowait(job)
+
+
+class MongoJobQueue(JobQueue):
+    """
+    Keeps jobs in a MongoDB collection through Motor, so they survive restarts and can be
+    processed by any replica.
+
+    A worker leases a job for lease seconds when it takes it, and extends the lease for as
+    long as it holds the job. Jobs whose lease expired, because their worker died, become
+    available again.
+    """
+
+    def __init__(
+        self,
+        collection,
+        max_size: int = 1000,
+        lease: float = 120.0,
+        poll_interval: float = 0.25,
+    ):
+        self.collection = collection
+        self.max_size = max_size
+        self.lease = lease
+        self.poll_interval = poll_interval
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("status", 1), ("available_at", 1)])
+
+    async def put(self, job: ReplyJob):
+        if await self.size() >= self.max_size:
+            raise QueueFull(f"Reply queue is full ({self.max_size} jobs)")
+        await self.collection.insert_one(
+            {
+                "_id": job.job_id,
+                "status": "pending",
+                "available_at": time.time(),
+                "job": job.to_dict(),
+            }
+        )
+
+    async def get(self) -> ReplyJob:
+        while True:
+            now = time.time()
+            document = await self.collection.find_one_and_update(
+                {
+                    "status": {"$in": ["pending", "running"]},
+                    "available_at": {"$lte": now},
+                },
+                {"$set": {"status": "running", "available_at": now + self.lease}},
+                sort=[("available_at", 1)],
+            )
+            if document is not None:
+                return ReplyJob.from_dict(document["job"])
+            await asyncio.sleep(self.poll_interval)
+
+    async def ack(self, job: ReplyJob):
+        await self.collection.delete_one({"_id": job.job_id})
+
+    async def retry(self, job: ReplyJob, delay: float):
+        await self.collection.update_one(
+            {"_id": job.job_id},
+            {
+                "$set": {
+                    "status": "pending",
+                    "available_at": time.time() + delay,
+                    "job": job.to_dict(),
+                }
+            },
+        )
+
+    async def dead_letter(self, job: ReplyJob):
+        await self.collection.update_one(
+            {"_id": job.job_id}, {"$set": {"status": "dead", "job": job.to_dict()}}
+        )
+
+    async def size(self) -> int:
+        return await self.collection.count_documents(
+            {"status": {"$in": ["pending", "running"]}}
+        )
+
+    async def extend(self, jobs: List[ReplyJob]):
+        await self.collection.update_many(
+            {"_id": {"$in": [job.job_id for job in jobs]}, "status": "running"},
+            {"$set": {"available_at": time.time() + self.lease}},
+        )
+
+    async def dead_letters(self, limit: int = 100) -> List[ReplyJob]:
+        cursor = self.collection.find({"status": "dead"}).limit(limit)
+        return [ReplyJob.from_dict(document["job"]) async for document in cursor]
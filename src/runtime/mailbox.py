@@ -0,0 +1,236 @@
+import asyncio
+import contextlib
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from botbuilder.core import TurnContext
+from botbuilder.schema import Activity, ActivityTypes
+
+from src.helpers.conversation_helper import get_tenant_id
+
+from .admission import AdmissionController, AdmissionRejected
+
+logger = logging.getLogger(__name__)
+
+TurnHandler = Callable[[TurnContext], Awaitable[None]]
+RejectionHandler = Callable[[TurnContext, AdmissionRejected], Awaitable[None]]
+
+
+class _Letter:
+    """
+    A turn waiting in a conversation's mailbox.
+    """
+
+    __slots__ = ("turn_context", "mergeable", "sender", "done")
+
+    def __init__(self, turn_context: TurnContext, mergeable: bool):
+        self.turn_context = turn_context
+        self.mergeable = mergeable
+        sender = turn_context.activity.from_property
+        self.sender = sender.id if sender is not None else None
+        self.done: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def finish(self, error: Optional[BaseException] = None):
+        # The turn's request may have been cancelled while it waited.
+        if self.done.done():
+            return
+        if error is None:
+            self.done.set_result(None)
+        else:
+            self.done.set_exception(error)
+
+    def cancel(self):
+        self.done.cancel()
+
+
+class ConversationMailbox:
+    """
+    Runs the turns of each conversation one at a time, in the order they arrived, and
+    merges bursts of messages into one turn.
+
+    Every conversation gets a mailbox and a task that works through it while it has
+    turns; turns of different conversations run concurrently. Plain messages from the
+    same user that arrive within debounce seconds of each other, or while an earlier
+    turn of the conversation is still running, are merged: their texts are joined into
+    the last message, which runs as one turn with one completion, and the turns of the
+    other messages end without running. Commands, other activities and the messages of
+    different users in a group chat or channel are never merged.
+
+    While a conversation's mailbox is busy, a typing indicator is shown for every message
+    that has to wait or is held back by the debounce, and refreshed every typing_interval
+    seconds while a message's turn runs.
+
+    With an admission controller, every message turn the mailbox runs is admitted first
+    and holds its slot until it ends. Messages waiting in a mailbox, and the ones merged
+    into another turn, take no slot. Turns that are not admitted are handed to
+    on_rejected instead of the turn handler.
+    """
+
+    def __init__(
+        self,
+        debounce: float = 0.0,
+        max_merged: int = 5,
+        typing_interval: float = 3.0,
+        admission: Optional[AdmissionController] = None,
+        on_rejected: Optional[RejectionHandler] = None,
+    ):
+        """
+        Initialize the ConversationMailbox.
+
+        Args:
+            debounce (float): Seconds a conversation's first message waits for more to merge.
+            max_merged (int): Maximum number of messages merged into one turn.
+            typing_interval (float): Seconds between typing indicators while a turn runs, or 0
+                to only send one when a message has to wait.
+            admission (AdmissionController, optional): Admits the message turns before they run.
+            on_rejected (callable, optional): Answers a turn that was not admitted. Without it,
+                the turn fails with AdmissionRejected.
+        """
+        self.debounce = debounce
+        self.max_merged = max_merged
+        self.typing_interval = typing_interval
+        self.admission = admission
+        self.on_rejected = on_rejected
+        self.merged = 0
+        self._mailboxes: Dict[Tuple[str, str], Deque[_Letter]] = {}
+        self._workers: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._mailboxes)
+
+    @staticmethod
+    def key(turn_context: TurnContext) -> Tuple[str, str]:
+        activity = turn_context.activity
+        return get_tenant_id(activity) or "", activity.conversation.id
+
+    async def submit(
+        self, turn_context: TurnContext, handler: TurnHandler, mergeable: bool
+    ):
+        """
+        Run a turn once the earlier turns of its conversation are done.
+
+        Args:
+            turn_context (TurnContext): The context of the turn.
+            handler (callable): Runs the turn.
+            mergeable (bool): Whether the turn is a plain message that can be merged with
+                the messages around it.
+
+        Raises:
+            Exception: Whatever the handler raised for this turn.
+        """
+        key = self.key(turn_context)
+        letter = _Letter(turn_context, mergeable)
+        mailbox = self._mailboxes.get(key)
+        if mailbox is None:
+            mailbox = self._mailboxes[key] = deque([letter])
+            worker = asyncio.create_task(self._work(key, mailbox, handler))
+            self._workers.add(worker)
+            worker.add_done_callback(self._workers.discard)
+        else:
+            mailbox.append(letter)
+            if mergeable:
+                await self._send_typing(turn_context)
+        await letter.done
+
+    async def _work(
+        self, key: Tuple[str, str], mailbox: Deque[_Letter], handler: TurnHandler
+    ):
+        turn: Optional[_Letter] = None
+        try:
+            while mailbox:
+                if mailbox[0].mergeable and self.debounce > 0:
+                    if len(mailbox) == 1:
+                        await self._send_typing(mailbox[0].turn_context)
+                    await asyncio.sleep(self.debounce)
+                # Messages that arrive while the turn waits to be admitted are merged
+                # into it.
+                try:
+                    async with self._admit(mailbox[0]):
+                        turn = self._next_turn(mailbox)
+                        await self._complete(turn, handler)
+                except AdmissionRejected as e:
+                    turn = self._next_turn(mailbox)
+                    await self._reject(turn, e)
+        finally:
+            del self._mailboxes[key]
+            # When the worker is cancelled, the requests of the turn it was running and
+            # of the turns still waiting are cancelled too, rather than left hanging.
+            if turn is not None:
+                turn.cancel()
+            for letter in mailbox:
+                letter.cancel()
+
+    def _admit(self, letter: _Letter):
+        activity = letter.turn_context.activity
+        if self.admission is None or activity.type != ActivityTypes.message:
+            return contextlib.nullcontext()
+        return self.admission.admit(get_tenant_id(activity), letter.sender)
+
+    def _next_turn(self, mailbox: Deque[_Letter]) -> _Letter:
+        letters = self._take(mailbox)
+        for letter in letters[:-1]:
+            letter.finish()
+        return letters[-1]
+
+    async def _complete(self, turn: _Letter, handler: TurnHandler):
+        try:
+            await self._run(turn, handler)
+        except Exception as e:
+            turn.finish(e)
+        else:
+            turn.finish()
+
+    async def _reject(self, turn: _Letter, error: AdmissionRejected):
+        if self.on_rejected is None:
+            turn.finish(error)
+            return
+        try:
+            await self.on_rejected(turn.turn_context, error)
+        except Exception as e:
+            turn.finish(e)
+        else:
+            turn.finish()
+
+    def _take(self, mailbox: Deque[_Letter]) -> List[_Letter]:
+        """
+        Take the next turn to run, with the messages merged into it.
+        """
+        letters = [mailbox.popleft()]
+        if not letters[0].mergeable:
+            return letters
+        while (
+            mailbox
+            and mailbox[0].mergeable
+            and mailbox[0].sender == letters[0].sender
+            and len(letters) < self.max_merged
+        ):
+            letters.append(mailbox.popleft())
+        if len(letters) > 1:
+            self.merged += len(letters) - 1
+            letters[-1].turn_context.activity.text = "\n".join(
+                letter.turn_context.activity.text for letter in letters
+            )
+            logger.debug(f"Merged {len(letters)} messages into one turn")
+        return letters
+
+    async def _run(self, turn: _Letter, handler: TurnHandler):
+        if self.typing_interval <= 0 or not turn.mergeable:
+            await handler(turn.turn_context)
+            return
+        typing = asyncio.create_task(self._keep_typing(turn.turn_context))
+        try:
+            await handler(turn.turn_context)
+        finally:
+            typing.cancel()
+
+    async def _keep_typing(self, turn_context: TurnContext):
+        while True:
+            await asyncio.sleep(self.typing_interval)
+            await self._send_typing(turn_context)
+
+    async def _send_typing(self, turn_context: TurnContext):
+        try:
+            await turn_context.send_activity(Activity(type=ActivityTypes.typing))
+        except Exception as e:
+            logger.debug(f"Could not send a typing indicator: {e}")
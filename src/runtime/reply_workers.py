@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import random
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from botbuilder.core import BotAdapter, MessageFactory, TurnContext
+from botbuilder.schema import ConversationReference
+
+from src.runtime.job_queue import JobQueue, ReplyJob
+from src.telemetry import CURRENT_REQUEST_CLASS, CURRENT_TENANT, request_class
+
+logger = logging.getLogger(__name__)
+
+
+class ReplyWorkerPool:
+    """
+    Runs reply jobs from a JobQueue on a fixed number of worker tasks.
+
+    The jobs of one conversation run one at a time, in the order they were taken from
+    the queue, so their replies do not race on the conversation's history; jobs of
+    different conversations run concurrently. A job taken while another job of its
+    conversation runs is parked behind it and run by the same worker afterwards, so
+    waiting jobs do not occupy workers. A job that fails is retried with exponential
+    backoff and jitter, and moved to the dead-letter list after max_attempts attempts.
+
+    For queues that lease jobs, the leases of the running and parked jobs are extended
+    every third of the lease, so a slow job is not taken and answered again by another
+    worker.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handler: Callable[[ReplyJob], Awaitable[None]],
+        workers: int = 8,
+        max_attempts: int = 3,
+        retry_backoff: float = 1.0,
+    ):
+        """
+        Initialize the ReplyWorkerPool.
+
+        Args:
+            queue (JobQueue): The queue jobs are taken from.
+            handler (callable): Runs one job. Raising marks the attempt as failed.
+            workers (int): Number of jobs run at once.
+            max_attempts (int): Number of attempts before a job is dead-lettered.
+            retry_backoff (float): Delay before the first retry, doubled for every further attempt.
+        """
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.busy = 0
+        self._tasks: List[asyncio.Task] = []
+        # The jobs parked behind the running job of each conversation.
+        self._parked: Dict[str, Deque[ReplyJob]] = {}
+        # The jobs taken from the queue and not yet acked, retried or dead-lettered.
+        self._held: Dict[str, ReplyJob] = {}
+
+    def start(self):
+        """
+        Start the worker tasks.
+        """
+        self._tasks = [
+            asyncio.create_task(self._run_worker(index))
+            for index in range(self.workers)
+        ]
+        if self.queue.lease:
+            self._tasks.append(asyncio.create_task(self._extend_leases()))
+
+    async def stop(self, timeout: float = 30.0):
+        """
+        Stop taking new jobs and wait up to timeout seconds for running jobs to finish.
+        """
+        deadline = asyncio.get_running_loop().time() + timeout
+        while self.busy and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.1)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run_worker(self, index: int):
+        while True:
+            job = await self.queue.get()
+            self._held[job.job_id] = job
+            key = job.conversation_id or job.job_id
+            parked = self._parked.get(key)
+            if parked is not None:
+                parked.append(job)
+                continue
+            parked = self._parked[key] = deque()
+            self.busy += 1
+            try:
+                await self._run_conversation(job, parked)
+            finally:
+                self.busy -= 1
+                del self._parked[key]
+
+    async def _run_conversation(self, job: ReplyJob, parked: Deque[ReplyJob]):
+        """
+        Run a job and then the jobs parked behind it, until the conversation has none left.
+        """
+        try:
+            while True:
+                try:
+                    await self._run_job(job)
+                finally:
+                    self._held.pop(job.job_id, None)
+                if not parked:
+                    return
+                job = parked.popleft()
+        except asyncio.CancelledError:
+            for job in parked:
+                await self.queue.retry(job, 0)
+            raise
+        finally:
+            # When the worker stops, the parked jobs are not held anymore.
+            for job in parked:
+                self._held.pop(job.job_id, None)
+
+    async def _extend_leases(self):
+        while True:
+            await asyncio.sleep(self.queue.lease / 3)
+            if not self._held:
+                continue
+            try:
+                await self.queue.extend(list(self._held.values()))
+            except Exception as e:
+                logger.warning(f"Could not extend the leases of reply jobs: {e}")
+
+    async def _run_job(self, job: ReplyJob):
+        try:
+            await self.handler(job)
+        except asyncio.CancelledError:
+            await self.queue.retry(job, 0)
+            raise
+        except Exception as e:
+            job.attempts += 1
+            job.error = f"{type(e).__name__}: {e}"
+            if job.attempts >= self.max_attempts:
+                logger.error(
+                    f"Reply job {job.job_id} failed {job.attempts} times, dead-lettering it: {e}",
+                    exc_info=True,
+                )
+                await self.queue.dead_letter(job)
+            else:
+                delay = self.retry_backoff * 2 ** (job.attempts - 1)
+                logger.warning(
+                    f"Reply job {job.job_id} failed, retrying in {delay:.1f}s: {e}"
+                )
+                await self.queue.retry(job, delay * random.uniform(0.5, 1.5))
+            return
+        await self.queue.ack(job)
+
+
+class ProactiveReplier:
+    """
+    Produces the reply for a job and sends it to the conversation with continue_conversation.
+    """
+
+    def __init__(
+        self,
+        adapter: BotAdapter,
+        app_id: Optional[str],
+        conversation_history,
+        conversation_service,
+    ):
+        """
+        Initialize the ProactiveReplier.
+
+        Args:
+            adapter (BotAdapter): The adapter used to send proactive messages.
+            app_id (str, optional): The bot's Microsoft App ID.
+            conversation_history (ConversationHistoryManager): Provides the history of each conversation.
+            conversation_service (ConversationService): Produces the replies.
+        """
+        self.adapter = adapter
+        self.app_id = app_id
+        self.conversation_history = conversation_history
+        self.conversation_service = conversation_service
+
+    async def __call__(self, job: ReplyJob):
+        CURRENT_TENANT.set(job.tenant_id or "")
+        conversation = job.conversation_reference.get("conversation") or {}
+        CURRENT_REQUEST_CLASS.set(request_class(conversation.get("conversationType")))
+        if job.reply is None:
+            history = await self.conversation_history.load_history(
+                job.conversation_id, job.tenant_id
+            )
+            job.reply = await self.conversation_service.process_message(
+                history, job.text
+            )
+
+        async def send_reply(turn_context: TurnContext):
+            await turn_context.send_activity(MessageFactory.text(job.reply))
+
+        reference = ConversationReference().deserialize(job.conversation_reference)
+        await self.adapter.continue_conversation(reference, send_reply, self.app_id)
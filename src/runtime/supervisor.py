@@ -0,0 +1,196 @@
+import importlib
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from multiprocessing.connection import wait
+from typing import Dict, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# A worker that exits sooner than this after it started counts as crash looping, and
+# is restarted with a growing delay.
+_MIN_HEALTHY_UPTIME = 10.0
+
+
+def available_cpus() -> int:
+    """
+    Return the number of CPUs this process may run on, which respects container limits
+    on CPU affinity.
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def reuse_port_socket(host: str, port: int) -> socket.socket:
+    """
+    Bind a listening socket that other processes can bind to the same port, so the kernel
+    spreads incoming connections across them.
+    """
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise RuntimeError("SO_REUSEPORT is not supported on this platform")
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    return sock
+
+
+def serve_worker(target: str, host: str, port: int, shutdown_timeout: float):
+    """
+    Run one worker process: build the application with the factory named by target, as
+    "module:function", and serve it on a SO_REUSEPORT socket until SIGTERM or SIGINT.
+    """
+    module_name, _, factory_name = target.partition(":")
+    factory = getattr(importlib.import_module(module_name), factory_name)
+    web.run_app(
+        factory(),
+        sock=reuse_port_socket(host, port),
+        shutdown_timeout=shutdown_timeout,
+        print=None,
+    )
+
+
+class Supervisor:
+    """
+    Runs worker processes that serve the application on one shared port.
+
+    Every worker binds its own SO_REUSEPORT socket and runs its own event loop, adapter
+    and clients, so nothing but the storage is shared between them. Workers are started
+    with the spawn method, so no client or event loop state is inherited from this process.
+
+    A worker that exits unexpectedly is restarted, after a delay that doubles while it
+    keeps exiting within seconds of starting. On SIGTERM or SIGINT the workers are told to
+    stop, which lets them finish the requests they are handling, and are killed when they
+    have not exited within shutdown_timeout seconds.
+    """
+
+    def __init__(
+        self,
+        target: str,
+        host: str,
+        port: int,
+        workers: int,
+        shutdown_timeout: float = 30.0,
+        restart_delay: float = 1.0,
+        max_restart_delay: float = 30.0,
+    ):
+        """
+        Initialize the Supervisor.
+
+        Args:
+            target (str): The application factory, as "module:function".
+            host (str): The address to listen on.
+            port (int): The port to listen on.
+            workers (int): Number of worker processes.
+            shutdown_timeout (float): Seconds workers get to finish their requests on shutdown.
+            restart_delay (float): Delay before a crash looping worker is restarted.
+            max_restart_delay (float): Maximum delay before a worker is restarted.
+        """
+        self.target = target
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.shutdown_timeout = shutdown_timeout
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.restarts = 0
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: Dict[int, multiprocessing.Process] = {}
+        self._started_at: Dict[int, float] = {}
+        self._delays: Dict[int, float] = {}
+        self._pending: Dict[int, float] = {}
+        self._stopping = False
+
+    def run(self):
+        """
+        Start the workers and supervise them until a shutdown signal arrives.
+        """
+        # Fail here rather than in every worker.
+        reuse_port_socket(self.host, self.port).close()
+
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+        for slot in range(self.workers):
+            self._spawn(slot)
+        try:
+            while not self._stopping:
+                self._supervise()
+        finally:
+            self._shutdown()
+
+    def _spawn(self, slot: int):
+        process = self._context.Process(
+            target=serve_worker,
+            args=(self.target, self.host, self.port, self.shutdown_timeout),
+            name=f"worker-{slot}",
+        )
+        process.start()
+        self._processes[slot] = process
+        self._started_at[slot] = time.monotonic()
+        logger.info(f"Started worker {slot} (pid {process.pid})")
+
+    def _supervise(self):
+        now = time.monotonic()
+        for slot, restart_at in list(self._pending.items()):
+            if restart_at <= now:
+                del self._pending[slot]
+                self.restarts += 1
+                self._spawn(slot)
+
+        timeout = 1.0
+        if self._pending:
+            timeout = max(0.0, min(min(self._pending.values()) - now, timeout))
+        sentinels = {
+            process.sentinel: slot for slot, process in self._processes.items()
+        }
+        for sentinel in wait(list(sentinels), timeout=timeout):
+            if self._stopping:
+                return
+            slot = sentinels[sentinel]
+            process = self._processes.pop(slot)
+            process.join()
+            self._schedule_restart(slot, process.exitcode)
+
+    def _schedule_restart(self, slot: int, exitcode: Optional[int]):
+        uptime = time.monotonic() - self._started_at[slot]
+        if uptime < _MIN_HEALTHY_UPTIME:
+            delay = min(
+                self.max_restart_delay,
+                self._delays.get(slot, self.restart_delay / 2) * 2,
+            )
+        else:
+            delay = 0.0
+        self._delays[slot] = delay or self.restart_delay / 2
+        self._pending[slot] = time.monotonic() + delay
+        logger.warning(
+            f"Worker {slot} exited with code {exitcode} after {uptime:.1f}s, "
+            f"restarting it in {delay:.1f}s"
+        )
+
+    def _on_signal(self, signum, frame):
+        if not self._stopping:
+            logger.info(f"Received {signal.Signals(signum).name}, stopping workers")
+        self._stopping = True
+
+    def _shutdown(self):
+        self._stopping = True
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self.shutdown_timeout + 5
+        for slot, process in self._processes.items():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Worker {slot} did not stop in time, killing it")
+                process.kill()
+                process.join()
+        self._processes.clear()
+        logger.info("All workers stopped")
@@ -1,7 +1,15 @@
 from .auth import Auth
 from .user import User
+from .jwks_cache import JWKSCache
+from .verified_token_cache import VerifiedTokenCache
+from .session_token_cache import SessionTokenCache
+from .user_info_client import UserInfoClient
 
 __all__ = [
     "Auth",
     "User",
+    "JWKSCache",
+    "VerifiedTokenCache",
+    "SessionTokenCache",
+    "UserInfoClient",
 ]
@@ -1,40 +1,76 @@
+import asyncio
+
+# Not deferred like the OpenAI SDK: botbuilder.core imports PyJWT through
+# botframework.connector.auth before this module loads, so it is already in sys.modules.
 import jwt
-from jwt import PyJWKClient
-from typing import Dict, Any
+from functools import partial
+from typing import Dict, Any, Optional
 from logging import getLogger
 
+from src.services.jwks_cache import JWKSCache, get_jwks_cache
+from src.services.verified_token_cache import VerifiedTokenCache
+from src.telemetry import record_cache, span
+
 logger = getLogger(__name__)
 
 
 class Auth:
-    def __init__(self, issuer: str, audience: str, algorithm: str = "RS256"):
+    def __init__(
+        self,
+        issuer: str,
+        audience: str,
+        algorithm: str = "RS256",
+        jwks_cache: Optional[JWKSCache] = None,
+        token_cache: Optional[VerifiedTokenCache] = None,
+    ):
         self.issuer = issuer
         self.audience = audience
         self.algorithm = algorithm
-        self.jwks_client = PyJWKClient(f"{self.issuer}.well-known/jwks.json")
+        self.jwks_cache = jwks_cache or get_jwks_cache(
+            f"{self.issuer}.well-known/jwks.json"
+        )
+        self.token_cache = token_cache or VerifiedTokenCache()
 
-    def _get_signing_key(self, token: str) -> str:
+    async def warm_up(self):
+        """
+        Fetch the signing keys now, so the first token is verified without waiting for them.
+        """
+        await self.jwks_cache.refresh()
+
+    async def _get_signing_key(self, token: str) -> Any:
         try:
-            signing_key = self.jwks_client.get_signing_key_from_jwt(token).key
-        except jwt.exceptions.PyJWKClientError as e:
-            logger.error(f"JWK Client Error: {e}")
-            raise ValueError("Token verification failed")
+            header = jwt.get_unverified_header(token)
         except jwt.exceptions.DecodeError as e:
             logger.error(f"Decode Error: {e}")
             raise ValueError("Invalid token")
-        return signing_key
+        return await self.jwks_cache.get_signing_key(header.get("kid"))
 
-    def decode_jwt(self, token: str) -> Dict[str, Any]:
+    async def decode_jwt(self, token: str) -> Dict[str, Any]:
+        verified_payload = self.token_cache.get(token)
+        record_cache("verified_token", verified_payload is not None)
+        if verified_payload is not None:
+            return verified_payload
+
+        with span("jwt_verify"):
+            verified_payload = await self._verify(token)
+        self.token_cache.put(token, verified_payload)
+        return verified_payload
+
+    async def _verify(self, token: str) -> Dict[str, Any]:
+        signing_key = await self._get_signing_key(token)
         try:
-            signing_key = self._get_signing_key(token)
-            verified_payload = jwt.decode(
-                token,
-                signing_key,
-                algorithms=[self.algorithm],
-                audience=self.audience,
-                issuer=self.issuer,
+            # Signature verification is CPU-bound, keep it off the event loop.
+            verified_payload = await asyncio.get_running_loop().run_in_executor(
+                None,
+                partial(
+                    jwt.decode,
+                    token,
+                    signing_key,
+                    algorithms=[self.algorithm],
+                    audience=self.audience,
+                    issuer=self.issuer,
+                ),
             )
-            return verified_payload
         except jwt.ExpiredSignatureError:
             logger.error("Token has expired")
             raise ValueError("Token has expired")
@@ -44,3 +80,4 @@ class Auth:
         except Exception as e:
             logger.error(f"Token decoding error: {e}")
             raise ValueError(f"Token decoding error: {e}")
+        return verified_payload
@@ -0,0 +1,31 @@
+from typing import Optional
+
+import httpx
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the process-wide HTTP client, creating it on first use.
+
+    The client keeps a pool of connections so calls to the identity provider reuse them
+    instead of opening a new connection per request.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(5.0, connect=2.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+    return _client
+
+
+async def close_http_client():
+    """
+    Close the process-wide HTTP client and its connections.
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
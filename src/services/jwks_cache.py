@@ -0,0 +1,83 @@
+import time
+from logging import getLogger
+from typing import Any, Dict, Optional
+
+import httpx
+import jwt  # Loaded by the Bot Framework SDK anyway, see src/services/auth.py.
+
+from src.helpers.single_flight import SingleFlight
+from src.services.http_client import get_http_client
+
+logger = getLogger(__name__)
+
+_caches: Dict[str, "JWKSCache"] = {}
+
+
+def get_jwks_cache(jwks_url: str) -> "JWKSCache":
+    """
+    Return the process-wide JWKS cache for a URL, creating it on first use.
+    """
+    cache = _caches.get(jwks_url)
+    if cache is None:
+        cache = _caches[jwks_url] = JWKSCache(jwks_url)
+    return cache
+
+
+class JWKSCache:
+    """
+    Caches the signing keys published at a JWKS endpoint.
+
+    Keys are fetched asynchronously and kept for ttl seconds. A token signed with an
+    unknown key ID triggers a refresh, at most once per min_refresh_interval seconds,
+    and concurrent refreshes are coalesced into a single fetch.
+    """
+
+    def __init__(
+        self, jwks_url: str, ttl: float = 3600, min_refresh_interval: float = 30
+    ):
+        self.jwks_url = jwks_url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._keys: Dict[str, Any] = {}
+        self._fetched_at: Optional[float] = None
+        self._single_flight = SingleFlight()
+
+    async def get_signing_key(self, kid: Optional[str]) -> Any:
+        if self._fetched_at is None or time.monotonic() - self._fetched_at > self.ttl:
+            await self.refresh()
+
+        key = self._keys.get(kid)
+        if key is None and self._can_refresh():
+            logger.info(f"Unknown signing key {kid}, refreshing JWKS")
+            await self.refresh()
+            key = self._keys.get(kid)
+
+        if key is None:
+            logger.error(f"Signing key {kid} not found in JWKS")
+            raise ValueError("Token verification failed")
+        return key
+
+    async def refresh(self):
+        await self._single_flight.do(self.jwks_url, self._fetch)
+
+    def _can_refresh(self) -> bool:
+        return (
+            self._fetched_at is None
+            or time.monotonic() - self._fetched_at >= self.min_refresh_interval
+        )
+
+    async def _fetch(self):
+        try:
+            response = await get_http_client().get(self.jwks_url)
+            response.raise_for_status()
+            jwk_set = jwt.PyJWKSet.from_dict(response.json())
+        except (httpx.HTTPError, ValueError, jwt.exceptions.PyJWKSetError) as e:
+            logger.error(f"JWK Client Error: {e}")
+            # Keep serving the previous keys, and don't retry before min_refresh_interval.
+            if self._keys:
+                self._fetched_at = time.monotonic()
+                return
+            raise ValueError("Token verification failed")
+
+        self._keys = {key.key_id: key.key for key in jwk_set.keys}
+        self._fetched_at = time.monotonic()
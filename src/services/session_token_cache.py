@@ -0,0 +1,67 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class SessionTokenCache:
+    """
+    Remembers the token of each signed-in user, so their messages can be answered
+    without running the OAuth prompt and its call to the token service.
+
+    Entries are keyed by user ID and connection name. Unlike VerifiedTokenCache this has
+    to keep the tokens themselves, since they are used to call the identity provider. An
+    entry is dropped refresh_margin seconds before the token's exp claim, so a token close
+    to expiring is renewed through the prompt instead of being used. The least recently
+    used entries are evicted once max_size is reached.
+
+    Every entry belongs to a session, whose ID the caller keeps in storage shared by all
+    processes. A token is only returned for the session it was cached for, so a user who
+    signed out, or in again, through another process is not answered with it.
+    """
+
+    def __init__(self, max_size: int = 10000, refresh_margin: float = 300):
+        self.max_size = max_size
+        self.refresh_margin = refresh_margin
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, str, str]]" = (
+            OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self, user_id: str, connection_name: str, session_id: Optional[str]
+    ) -> Optional[str]:
+        key = (user_id, connection_name)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        valid_until, token, cached_session_id = entry
+        if valid_until <= time.time() or cached_session_id != session_id:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return token
+
+    def put(
+        self,
+        user_id: str,
+        connection_name: str,
+        token: str,
+        payload: Dict[str, Any],
+        session_id: str,
+    ):
+        expires_at = payload.get("exp")
+        if not isinstance(expires_at, (int, float)):
+            return
+        valid_until = expires_at - self.refresh_margin
+        if valid_until <= time.time():
+            return
+        key = (user_id, connection_name)
+        self._entries[key] = (valid_until, token, session_id)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def remove(self, user_id: str, connection_name: str):
+        self._entries.pop((user_id, connection_name), None)
@@ -1,22 +1,28 @@
-import requests
 from typing import Optional, Dict, Any
 
+from src.services.user_info_client import UserInfoClient
+
 
 class User:
-    def __init__(self, access_token: str, decoded_token: Dict[str, Any]):
+    def __init__(
+        self,
+        access_token: str,
+        decoded_token: Dict[str, Any],
+        user_info: Optional[Dict[str, Any]] = None,
+    ):
         self.access_token = access_token
         self.payload = decoded_token
-        self.user_info = self._get_user_info()
-
-    def _get_user_info(self) -> Optional[Dict[str, Any]]:
-        user_info_endpoint = self.payload["aud"][-1]
-        headers = {"Authorization": f"Bearer {self.access_token}"}
-        response = requests.get(user_info_endpoint, headers=headers)
-        if response.status_code == 200:
-            print("access token:", self.access_token)
-            print("user-info ", response.json())
-            return response.json()
-        return None
+        self.user_info = user_info
+
+    @classmethod
+    async def load(
+        cls,
+        access_token: str,
+        decoded_token: Dict[str, Any],
+        user_info_client: UserInfoClient,
+    ) -> "User":
+        user_info = await user_info_client.get_user_info(access_token, decoded_token)
+        return cls(access_token, decoded_token, user_info)
 
     def get_email(self) -> Optional[str]:
         return self.user_info.get("email") if self.user_info else None
@@ -0,0 +1,79 @@
+import hashlib
+import time
+from collections import OrderedDict
+from logging import getLogger
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from src.helpers.single_flight import SingleFlight
+from src.services.http_client import get_http_client
+from src.telemetry import record_cache, span
+
+logger = getLogger(__name__)
+
+
+class UserInfoClient:
+    """
+    Fetches user info from the identity provider on the shared HTTP client.
+
+    Results are cached per token subject for ttl seconds, and concurrent lookups of the
+    same user share a single request.
+    """
+
+    def __init__(self, ttl: float = 300, max_size: int = 10000, timeout: float = 5.0):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.timeout = timeout
+        self._cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._single_flight = SingleFlight()
+
+    async def get_user_info(
+        self, access_token: str, decoded_token: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        key = (
+            decoded_token.get("sub")
+            or hashlib.sha256(access_token.encode()).hexdigest()
+        )
+        user_info = self._get_cached(key)
+        record_cache("user_info", user_info is not None)
+        if user_info is not None:
+            return user_info
+
+        user_info_endpoint = decoded_token["aud"][-1]
+        with span("user_info"):
+            return await self._single_flight.do(
+                key, lambda: self._fetch(key, user_info_endpoint, access_token)
+            )
+
+    def _get_cached(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, user_info = entry
+        if expires_at <= time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return user_info
+
+    async def _fetch(
+        self, key: str, user_info_endpoint: str, access_token: str
+    ) -> Optional[Dict[str, Any]]:
+        headers = {"Authorization": f"Bearer {access_token}"}
+        try:
+            response = await get_http_client().get(
+                user_info_endpoint, headers=headers, timeout=self.timeout
+            )
+        except httpx.HTTPError as e:
+            logger.error(f"User info request failed: {e}")
+            return None
+        if response.status_code != 200:
+            logger.warning(f"User info request returned {response.status_code}")
+            return None
+
+        user_info = response.json()
+        self._cache[key] = (time.monotonic() + self.ttl, user_info)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+        return user_info
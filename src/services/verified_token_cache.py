@@ -0,0 +1,45 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class VerifiedTokenCache:
+    """
+    Remembers the payloads of tokens whose signature has already been verified.
+
+    Entries are keyed by a hash of the token, so the tokens themselves are not kept in
+    memory, and are held until the token's exp claim. The least recently used entries
+    are evicted once max_size is reached.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, payload = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return payload
+
+    def put(self, token: str, payload: Dict[str, Any]):
+        expires_at = payload.get("exp")
+        if not isinstance(expires_at, (int, float)) or expires_at <= time.time():
+            return
+        self._entries[self._key(token)] = (expires_at, payload)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
@@ -0,0 +1,14 @@
+from .errors import ETagConflictError
+from .factory import create_deduplicator, create_job_queue, create_storage
+from .history_store import HistoryStore, MemoryHistoryStore
+from .write_behind_storage import WriteBehindStorage
+
+__all__ = [
+    "ETagConflictError",
+    "create_deduplicator",
+    "create_job_queue",
+    "create_storage",
+    "HistoryStore",
+    "MemoryHistoryStore",
+    "WriteBehindStorage",
+]
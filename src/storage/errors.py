@@ -0,0 +1,14 @@
+from typing import Iterable
+
+
+class ETagConflictError(KeyError):
+    """
+    Raised by a storage write when some items did not match their stored eTag.
+
+    The other items of the write were written. keys holds the conflicting ones, so a
+    caller can keep the new eTags of the rest.
+    """
+
+    def __init__(self, message: str, keys: Iterable[str]):
+        super().__init__(message)
+        self.keys = set(keys)
@@ -0,0 +1,105 @@
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from botbuilder.core import MemoryStorage, Storage
+
+from config import DefaultConfig
+from src.storage.history_store import HistoryStore
+from src.storage.write_behind_storage import WriteBehindStorage
+from src.runtime.activity_dedup import (
+    ActivityDeduplicator,
+    MongoActivityDeduplicator,
+)
+from src.runtime.job_queue import InMemoryJobQueue, JobQueue, MongoJobQueue
+
+
+@lru_cache(maxsize=None)
+def _get_database(uri: str, name: str):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    return AsyncIOMotorClient(uri)[name]
+
+
+def create_storage(config: DefaultConfig) -> Tuple[Storage, Optional[HistoryStore]]:
+    """
+    Create the bot state storage and conversation history store selected by STORAGE_BACKEND.
+
+    Args:
+        config (DefaultConfig): The bot configuration.
+
+    Returns:
+        tuple: The Storage for UserState and ConversationState, and the HistoryStore, which is
+            None when histories are only kept in memory.
+    """
+    if config.STORAGE_BACKEND == "mongo":
+        from src.storage.mongo_history_store import MongoHistoryStore
+        from src.storage.mongo_storage import MongoStorage
+
+        database = _get_database(config.MONGODB_URI, config.MONGO_DATABASE)
+        storage = MongoStorage(
+            database[config.MONGO_STATE_COLLECTION],
+            ttl=config.STORAGE_TTL_SECONDS,
+            cache_ttl=config.STORAGE_CACHE_TTL_SECONDS,
+        )
+        history_store = MongoHistoryStore(
+            database[config.MONGO_CONVERSATION_COLLECTION],
+            ttl=config.STORAGE_TTL_SECONDS,
+            flush_interval=config.STORAGE_FLUSH_INTERVAL_SECONDS,
+        )
+        if config.STORAGE_WRITE_BEHIND:
+            storage = WriteBehindStorage(
+                storage,
+                flush_interval=config.STORAGE_FLUSH_INTERVAL_SECONDS,
+                max_pending=config.STORAGE_MAX_PENDING_WRITES,
+            )
+        return storage, history_store
+
+    if config.STORAGE_BACKEND != "memory":
+        raise ValueError(f"Unknown STORAGE_BACKEND: {config.STORAGE_BACKEND}")
+    return MemoryStorage(), None
+
+
+def create_job_queue(config: DefaultConfig) -> JobQueue:
+    """
+    Create the reply job queue selected by REPLY_QUEUE_BACKEND.
+
+    Args:
+        config (DefaultConfig): The bot configuration.
+
+    Returns:
+        JobQueue: The queue of reply jobs.
+    """
+    if config.REPLY_QUEUE_BACKEND == "mongo":
+        database = _get_database(config.MONGODB_URI, config.MONGO_DATABASE)
+        return MongoJobQueue(
+            database[config.MONGO_JOB_COLLECTION],
+            max_size=config.REPLY_QUEUE_SIZE,
+            lease=config.REPLY_JOB_LEASE_SECONDS,
+        )
+
+    if config.REPLY_QUEUE_BACKEND != "memory":
+        raise ValueError(f"Unknown REPLY_QUEUE_BACKEND: {config.REPLY_QUEUE_BACKEND}")
+    return InMemoryJobQueue(max_size=config.REPLY_QUEUE_SIZE)
+
+
+def create_deduplicator(config: DefaultConfig) -> ActivityDeduplicator:
+    """
+    Create the activity deduplicator, shared between processes with STORAGE_BACKEND=mongo.
+
+    Args:
+        config (DefaultConfig): The bot configuration.
+
+    Returns:
+        ActivityDeduplicator: Drops redelivered activities.
+    """
+    if config.STORAGE_BACKEND == "mongo":
+        database = _get_database(config.MONGODB_URI, config.MONGO_DATABASE)
+        return MongoActivityDeduplicator(
+            database[config.MONGO_ACTIVITY_COLLECTION],
+            ttl=config.ACTIVITY_DEDUP_TTL_SECONDS,
+            max_size=config.ACTIVITY_DEDUP_MAX_SIZE,
+        )
+    return ActivityDeduplicator(
+        ttl=config.ACTIVITY_DEDUP_TTL_SECONDS,
+        max_size=config.ACTIVITY_DEDUP_MAX_SIZE,
+    )
@@ -0,0 +1,244 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from copy import deepcopy
+from typing import Any, Dict, Optional, Set
+
+from src.conversation.history.conversation_history import ConversationHistory
+
+logger = logging.getLogger(__name__)
+
+
+def history_key(conversation_id: str, tenant_id: Optional[str] = None) -> str:
+    """
+    Return the storage key of a conversation's history.
+    """
+    return f"{tenant_id or ''}:{conversation_id}"
+
+
+class HistoryStore(ABC):
+    """
+    Persists conversation histories.
+
+    save only records that a history changed. Changed histories are written in batches,
+    with at most one pending write per conversation, every flush_interval seconds or as
+    soon as batch_size conversations are waiting.
+
+    Every document has a version, which each write increments. A history is only
+    written over the version it is based on, so when several processes share the store
+    none of them overwrites what another wrote: on a conflict, the history is reloaded
+    from the store, the messages it added are added again and it is written with the
+    next batch.
+    """
+
+    def __init__(self, flush_interval: float = 0.5, batch_size: int = 100):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._dirty: Dict[str, ConversationHistory] = {}
+        self._flushing: Dict[str, ConversationHistory] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def load(
+        self, conversation_id: str, tenant_id: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Load the persisted document of a conversation, including changes not written yet.
+
+        Args:
+            conversation_id (str): The Bot Framework conversation ID.
+            tenant_id (str, optional): The tenant the conversation belongs to.
+
+        Returns:
+            dict: The document created by ConversationHistory.to_document, or None if there is none.
+        """
+        key = history_key(conversation_id, tenant_id)
+        pending = self._dirty.get(key) or self._flushing.get(key)
+        if pending is not None:
+            return pending.to_document()
+        return await self.read(key)
+
+    async def refresh(self, history: ConversationHistory):
+        """
+        Reload a history if another process wrote a newer version of it.
+
+        Histories with changes not written yet are left as they are; writing them
+        reconciles them with the stored version.
+
+        Args:
+            history (ConversationHistory): The history held in memory.
+        """
+        key = history_key(history.conversation_id, history.tenant_id)
+        if key in self._dirty or key in self._flushing:
+            return
+        document = await self.read_newer(key, history.version)
+        if document is None or key in self._dirty or key in self._flushing:
+            return
+        history.load_document(document)
+        # Loading marks the history as changed, but the store already has it.
+        self._dirty.pop(key, None)
+
+    async def delete(self, conversation_id: str, tenant_id: Optional[str] = None):
+        """
+        Delete the persisted history of a conversation.
+        """
+        key = history_key(conversation_id, tenant_id)
+        self._dirty.pop(key, None)
+        await self.remove(key)
+
+    @abstractmethod
+    async def read(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Read one document by its history_key.
+        """
+        raise NotImplementedError()
+
+    async def read_newer(self, key: str, version: int) -> Optional[Dict[str, Any]]:
+        """
+        Read one document by its history_key if its version is greater than the given one.
+        """
+        document = await self.read(key)
+        if document is None or document.get("version", 0) <= version:
+            return None
+        return document
+
+    @abstractmethod
+    async def write_many(self, documents: Dict[str, Dict[str, Any]]) -> Set[str]:
+        """
+        Write a batch of documents, keyed by history_key, each with the version after the
+        one it holds.
+
+        A document is not written when the stored document has another version than the
+        one it holds.
+
+        Returns:
+            set: The keys of the documents that were not written, because of that or
+                another error.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def remove(self, key: str):
+        """
+        Remove one document by its history_key.
+        """
+        raise NotImplementedError()
+
+    def save(self, history: ConversationHistory):
+        """
+        Schedule a history to be written with the next batch.
+
+        Args:
+            history (ConversationHistory): The history that changed.
+        """
+        self._dirty[history_key(history.conversation_id, history.tenant_id)] = history
+        self._ensure_flusher()
+        if len(self._dirty) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self):
+        """
+        Write all pending histories now.
+        """
+        if not self._dirty:
+            return
+        batch, self._dirty = self._dirty, {}
+        self._flushing.update(batch)
+        documents = {key: history.to_document() for key, history in batch.items()}
+        written = {key: len(history.unsaved) for key, history in batch.items()}
+        try:
+            conflicts = await self.write_many(documents)
+        except Exception as e:
+            logger.error(f"Failed to write conversation histories: {e}", exc_info=True)
+            # Keep them for the next flush, unless they changed again in the meantime.
+            for key, history in batch.items():
+                self._dirty.setdefault(key, history)
+            conflicts = set()
+        else:
+            for key, history in batch.items():
+                if (
+                    key not in conflicts
+                    and history.version == documents[key]["version"]
+                ):
+                    history.version += 1
+                    del history.unsaved[: written[key]]
+        finally:
+            for key in batch:
+                self._flushing.pop(key, None)
+        for key in conflicts:
+            await self._rebase(key, batch[key])
+
+    async def _rebase(self, key: str, history: ConversationHistory):
+        logger.info(f"Conversation history {key} was written elsewhere, reloading it")
+        try:
+            document = await self.read(key)
+        except Exception as e:
+            logger.error(f"Failed to reload conversation history {key}: {e}")
+            self._dirty.setdefault(key, history)
+            return
+        history.rebase(document)
+        if history.unsaved:
+            self.save(history)
+        else:
+            # Nothing to add to the stored version.
+            self._dirty.pop(key, None)
+
+    async def close(self):
+        """
+        Stop the background flusher and write all pending histories.
+        """
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
+
+    def _ensure_flusher(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._wakeup = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._run_flusher())
+
+    async def _run_flusher(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+
+class MemoryHistoryStore(HistoryStore):
+    """
+    Keeps persisted histories in a dictionary in this process.
+
+    Useful for development and tests, where it stands in for MongoHistoryStore.
+    """
+
+    def __init__(self, flush_interval: float = 0.5, batch_size: int = 100):
+        super().__init__(flush_interval, batch_size)
+        self.documents: Dict[str, Dict[str, Any]] = {}
+
+    async def read(self, key: str) -> Optional[Dict[str, Any]]:
+        document = self.documents.get(key)
+        return deepcopy(document) if document is not None else None
+
+    async def read_newer(self, key: str, version: int) -> Optional[Dict[str, Any]]:
+        document = self.documents.get(key)
+        if document is None or document.get("version", 0) <= version:
+            return None
+        return deepcopy(document)
+
+    async def write_many(self, documents: Dict[str, Dict[str, Any]]) -> Set[str]:
+        conflicts = set()
+        for key, document in documents.items():
+            stored = self.documents.get(key)
+            version = document.get("version", 0)
+            if stored is not None and stored.get("version", 0) != version:
+                conflicts.add(key)
+                continue
+            self.documents[key] = {**deepcopy(document), "version": version + 1}
+        return conflicts
+
+    async def remove(self, key: str):
+        self.documents.pop(key, None)
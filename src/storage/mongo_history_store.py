@@ -0,0 +1,100 @@
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Set
+
+from pymongo import ASCENDING, ReplaceOne
+from pymongo.errors import BulkWriteError
+
+from src.storage.history_store import HistoryStore
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+class MongoHistoryStore(HistoryStore):
+    """
+    Persists conversation histories in a MongoDB collection through Motor.
+
+    Each conversation is one document. Documents expire ttl seconds after the
+    conversation's last activity. A write only replaces the version it is based on; when
+    the stored document has another version, the upsert collides with it on _id.
+    """
+
+    def __init__(
+        self,
+        collection,
+        ttl: Optional[float] = None,
+        flush_interval: float = 0.5,
+        batch_size: int = 100,
+    ):
+        """
+        Initialize the MongoHistoryStore.
+
+        Args:
+            collection (AsyncIOMotorCollection): The collection histories are stored in.
+            ttl (float, optional): Seconds after the last activity before a history expires. Never if None.
+            flush_interval (float): Maximum number of seconds a change waits before it is written.
+            batch_size (int): Number of changed conversations that triggers a write right away.
+        """
+        super().__init__(flush_interval, batch_size)
+        self.collection = collection
+        self.ttl = ttl
+
+    async def ensure_indexes(self):
+        """
+        Create the indexes on conversation ID and last activity time.
+        """
+        await self.collection.create_index(
+            [("tenant_id", ASCENDING), ("conversation_id", ASCENDING)]
+        )
+        if self.ttl:
+            await self.collection.create_index(
+                "last_activity", expireAfterSeconds=int(self.ttl)
+            )
+        else:
+            await self.collection.create_index("last_activity")
+
+    async def read(self, key: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one(
+            {"_id": key}, {"_id": False, "last_activity": False}
+        )
+
+    async def read_newer(self, key: str, version: int) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one(
+            {"_id": key, "version": {"$gt": version}},
+            {"_id": False, "last_activity": False},
+        )
+
+    async def write_many(self, documents: Dict[str, Dict[str, Any]]) -> Set[str]:
+        now = datetime.now(timezone.utc)
+        keys = list(documents)
+        operations = []
+        for key, document in documents.items():
+            version = document.get("version", 0)
+            # Documents written before they were versioned have no version field.
+            expected = {"$in": [0, None]} if version == 0 else version
+            operations.append(
+                ReplaceOne(
+                    {"_id": key, "version": expected},
+                    {**document, "version": version + 1, "last_activity": now},
+                    upsert=True,
+                )
+            )
+        try:
+            await self.collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # Documents that were not written are reloaded and written again like those
+            # that conflicted.
+            errors = e.details.get("writeErrors", [])
+            for error in errors:
+                if error["code"] != DUPLICATE_KEY:
+                    logger.error(
+                        f"Failed to write conversation history {keys[error['index']]}: "
+                        f"{error.get('errmsg')}"
+                    )
+            return {keys[error["index"]] for error in errors}
+        return set()
+
+    async def remove(self, key: str):
+        await self.collection.delete_one({"_id": key})
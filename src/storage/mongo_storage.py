@@ -0,0 +1,189 @@
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import jsonpickle
+from botbuilder.core import Storage, StoreItem
+from pymongo import ReplaceOne
+
+from src.storage.errors import ETagConflictError
+
+
+class MongoStorage(Storage):
+    """
+    Bot Framework Storage backed by a MongoDB collection through Motor.
+
+    Items are stored as jsonpickle documents, like the Azure Blob storage does, so dialog
+    state objects round-trip. Every write gets a new eTag; writes of items that carry an
+    eTag other than "*" only succeed if the stored item still has that eTag; the others
+    are written anyway and the conflicting keys reported with ETagConflictError. Recently
+    read or written items are kept in a small in-process cache for cache_ttl seconds.
+    """
+
+    def __init__(
+        self,
+        collection,
+        ttl: Optional[float] = None,
+        cache_size: int = 1000,
+        cache_ttl: float = 5.0,
+    ):
+        """
+        Initialize the MongoStorage.
+
+        Args:
+            collection (AsyncIOMotorCollection): The collection items are stored in.
+            ttl (float, optional): Seconds after the last write before an item expires. Never if None.
+            cache_size (int): Maximum number of items kept in the in-process cache.
+            cache_ttl (float): Seconds an item is served from the in-process cache.
+        """
+        super(MongoStorage, self).__init__()
+        self.collection = collection
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache: "OrderedDict[str, Tuple[float, str, str]]" = OrderedDict()
+
+    async def ensure_indexes(self):
+        """
+        Create the index on last activity time, which expires items when a ttl is set.
+        """
+        if self.ttl:
+            await self.collection.create_index(
+                "last_activity", expireAfterSeconds=int(self.ttl)
+            )
+        else:
+            await self.collection.create_index("last_activity")
+
+    async def read(self, keys: List[str]):
+        data = {}
+        if not keys:
+            return data
+
+        missing = []
+        for key in keys:
+            cached = self._get_cached(key)
+            if cached is None:
+                missing.append(key)
+            else:
+                data[key] = self._decode(*cached)
+
+        if missing:
+            async for document in self.collection.find({"_id": {"$in": missing}}):
+                key = document["_id"]
+                self._put_cached(key, document["document"], document["e_tag"])
+                data[key] = self._decode(document["document"], document["e_tag"])
+
+        return data
+
+    async def write(self, changes: Dict[str, StoreItem]):
+        if changes is None:
+            raise Exception("Changes are required when writing")
+        if not changes:
+            return
+
+        now = datetime.now(timezone.utc)
+        operations, new_e_tags, conditional = [], {}, 0
+        for key, change in changes.items():
+            old_e_tag = self._get_e_tag(change)
+            if old_e_tag == "":
+                raise Exception("mongo_storage.write(): etag missing")
+
+            new_e_tag = uuid.uuid4().hex
+            document = {
+                "document": self._encode(change),
+                "e_tag": new_e_tag,
+                "last_activity": now,
+            }
+            if old_e_tag is None or old_e_tag == "*":
+                operations.append(ReplaceOne({"_id": key}, document, upsert=True))
+            else:
+                conditional += 1
+                operations.append(
+                    ReplaceOne({"_id": key, "e_tag": old_e_tag}, document)
+                )
+            new_e_tags[key] = (document["document"], new_e_tag)
+
+        result = await self.collection.bulk_write(operations, ordered=False)
+
+        conflicts = set()
+        if len(operations) > result.matched_count + result.upserted_count:
+            conflicts = await self._find_conflicts(new_e_tags)
+            for key in conflicts:
+                self._cache.pop(key, None)
+
+        for key, change in changes.items():
+            if key in conflicts:
+                continue
+            document, new_e_tag = new_e_tags[key]
+            self._put_cached(key, document, new_e_tag)
+            self._set_e_tag(change, new_e_tag)
+
+        if conflicts:
+            raise ETagConflictError(
+                f"Etag conflict.\n{len(conflicts)} of {conditional} conditional writes"
+                f" did not match the stored eTag: {', '.join(sorted(conflicts))}",
+                conflicts,
+            )
+
+    async def delete(self, keys: List[str]):
+        for key in keys:
+            self._cache.pop(key, None)
+        await self.collection.delete_many({"_id": {"$in": list(keys)}})
+
+    async def _find_conflicts(self, new_e_tags: Dict[str, Tuple[str, str]]) -> set:
+        """
+        Return the keys whose stored eTag is not the one this write gave them. The bulk
+        write result only counts the matches, not which writes they were.
+        """
+        written = set()
+        cursor = self.collection.find(
+            {"_id": {"$in": list(new_e_tags)}}, {"e_tag": True}
+        )
+        async for document in cursor:
+            if document.get("e_tag") == new_e_tags[document["_id"]][1]:
+                written.add(document["_id"])
+        return set(new_e_tags) - written
+
+    def _get_cached(self, key: str) -> Optional[Tuple[str, str]]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        cached_at, document, e_tag = entry
+        if time.monotonic() - cached_at > self.cache_ttl:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return document, e_tag
+
+    def _put_cached(self, key: str, document: str, e_tag: str):
+        self._cache[key] = (time.monotonic(), document, e_tag)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def _encode(item) -> str:
+        if isinstance(item, dict):
+            item = {key: value for key, value in item.items() if key != "e_tag"}
+        return jsonpickle.encode(item, unpicklable=True, make_refs=False)
+
+    @staticmethod
+    def _decode(document: str, e_tag: str):
+        item = jsonpickle.decode(document)
+        MongoStorage._set_e_tag(item, e_tag)
+        return item
+
+    @staticmethod
+    def _get_e_tag(item) -> Optional[str]:
+        if isinstance(item, dict):
+            return item.get("e_tag")
+        return getattr(item, "e_tag", None)
+
+    @staticmethod
+    def _set_e_tag(item, e_tag: str):
+        if isinstance(item, dict):
+            item["e_tag"] = e_tag
+        else:
+            item.e_tag = e_tag
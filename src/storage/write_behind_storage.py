@@ -0,0 +1,221 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from copy import deepcopy
+from typing import Dict, List, Optional, Tuple
+
+from botbuilder.core import Storage, StoreItem
+
+from src.storage.errors import ETagConflictError
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingWrite:
+    __slots__ = ("item", "base_e_tag")
+
+    def __init__(self, item, base_e_tag: Optional[str]):
+        self.item = item
+        self.base_e_tag = base_e_tag
+
+
+class WriteBehindStorage(Storage):
+    """
+    Storage wrapper that acknowledges writes right away and writes them to the wrapped
+    storage in batches.
+
+    Writes are kept per key, so several turns that change the same state result in one
+    write of the latest version. Pending writes are flushed every flush_interval seconds,
+    or as soon as batch_size keys are waiting, in a single call to the wrapped storage.
+    Only one flush runs at a time, so writes for the same conversation reach the storage
+    in order. Reads see pending writes. When max_pending keys are waiting, new writes
+    wait for a flush instead of growing the queue.
+
+    The eTag of the first pending version of a key is the one checked by the wrapped
+    storage, so conflicts with other processes are still detected. Writes that conflict
+    are dropped and logged; the other writes of their batch keep their new eTags when the
+    storage reports the conflicting keys with ETagConflictError.
+    """
+
+    def __init__(
+        self,
+        storage: Storage,
+        flush_interval: float = 0.2,
+        batch_size: int = 200,
+        max_pending: int = 2000,
+    ):
+        """
+        Initialize the WriteBehindStorage.
+
+        Args:
+            storage (Storage): The storage writes are forwarded to.
+            flush_interval (float): Maximum number of seconds a write waits before it is flushed.
+            batch_size (int): Number of pending keys that triggers a flush right away.
+            max_pending (int): Number of pending keys at which writes wait for a flush.
+        """
+        super(WriteBehindStorage, self).__init__()
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._pending: Dict[str, _PendingWrite] = {}
+        self._flushing: Dict[str, _PendingWrite] = {}
+        # eTags replaced by a flush, so writes based on a pending version read before the
+        # flush are checked against the version the flush produced.
+        self._replaced_e_tags: "OrderedDict[str, Tuple[Optional[str], str]]" = (
+            OrderedDict()
+        )
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def ensure_indexes(self):
+        """
+        Create the indexes of the wrapped storage, if it has any.
+        """
+        if hasattr(self.storage, "ensure_indexes"):
+            await self.storage.ensure_indexes()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending) + len(self._flushing)
+
+    async def read(self, keys: List[str]):
+        data = {}
+        missing = []
+        for key in keys or []:
+            pending = self._pending.get(key) or self._flushing.get(key)
+            if pending is None:
+                missing.append(key)
+            else:
+                data[key] = deepcopy(pending.item)
+        if missing:
+            data.update(await self.storage.read(missing))
+        return data
+
+    async def write(self, changes: Dict[str, StoreItem]):
+        if changes is None:
+            raise Exception("Changes are required when writing")
+
+        for key, change in changes.items():
+            while key not in self._pending and len(self._pending) >= self.max_pending:
+                await self.flush()
+
+            item = deepcopy(change)
+            pending = self._pending.get(key)
+            if pending is not None:
+                pending.item = item
+                continue
+
+            base_e_tag = self._get_e_tag(change)
+            in_flight = self._flushing.get(key)
+            if in_flight is not None:
+                base_e_tag = in_flight.base_e_tag
+            elif key in self._replaced_e_tags:
+                old_e_tag, new_e_tag = self._replaced_e_tags[key]
+                if base_e_tag == old_e_tag:
+                    base_e_tag = new_e_tag
+            self._pending[key] = _PendingWrite(item, base_e_tag)
+
+        self._ensure_flusher()
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def delete(self, keys: List[str]):
+        for key in keys:
+            self._pending.pop(key, None)
+        async with self._flush_lock:
+            await self.storage.delete(keys)
+
+    async def flush(self):
+        """
+        Write all pending changes to the wrapped storage now.
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            self._flushing = batch
+
+            changes = {}
+            for key, pending in batch.items():
+                self._set_e_tag(pending.item, pending.base_e_tag)
+                changes[key] = pending.item
+            try:
+                await self.storage.write(changes)
+                for key, pending in batch.items():
+                    self._remember_e_tag(key, pending)
+            except ETagConflictError as e:
+                # Another process changed these keys; our versions of them are stale.
+                logger.error(
+                    f"Dropping conflicting state writes of {', '.join(sorted(e.keys))}"
+                )
+                for key, pending in batch.items():
+                    if key not in e.keys:
+                        self._remember_e_tag(key, pending)
+            except KeyError as e:
+                # Storages that do not report which keys conflicted: the whole batch is
+                # treated as stale.
+                logger.error(
+                    f"Dropping conflicting state writes of {', '.join(sorted(batch))}: {e}"
+                )
+            except Exception as e:
+                logger.error(f"Failed to write state: {e}", exc_info=True)
+                for key, pending in batch.items():
+                    self._pending.setdefault(key, pending)
+            finally:
+                self._flushing = {}
+
+    async def close(self):
+        """
+        Stop the background flusher and write all pending changes.
+        """
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
+
+    def _ensure_flusher(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._wakeup = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._run_flusher())
+
+    async def _run_flusher(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def _remember_e_tag(self, key: str, pending: _PendingWrite):
+        # Storages that set the new eTag on the written item let later writes build on it.
+        new_e_tag = self._get_e_tag(pending.item)
+        if new_e_tag is None or new_e_tag == pending.base_e_tag:
+            new_e_tag = "*"
+        self._replaced_e_tags[key] = (pending.base_e_tag, new_e_tag)
+        self._replaced_e_tags.move_to_end(key)
+        # A newer version written while this one was in flight builds on it.
+        newer = self._pending.get(key)
+        if newer is not None and newer.base_e_tag == pending.base_e_tag:
+            newer.base_e_tag = new_e_tag
+        while len(self._replaced_e_tags) > self.max_pending:
+            self._replaced_e_tags.popitem(last=False)
+
+    @staticmethod
+    def _get_e_tag(item) -> Optional[str]:
+        if isinstance(item, dict):
+            return item.get("e_tag")
+        return getattr(item, "e_tag", None)
+
+    @staticmethod
+    def _set_e_tag(item, e_tag: Optional[str]):
+        if isinstance(item, dict):
+            if e_tag is None:
+                item.pop("e_tag", None)
+            else:
+                item["e_tag"] = e_tag
+        elif e_tag is not None or hasattr(item, "e_tag"):
+            item.e_tag = e_tag
@@ -0,0 +1,50 @@
+from .instruments import (
+    BACKGROUND,
+    CURRENT_REQUEST_CLASS,
+    CURRENT_TENANT,
+    GROUP,
+    INTERACTIVE,
+    OPENAI_QUEUE_WAIT,
+    OPENAI_REQUESTS_IN_FLIGHT,
+    OPENAI_ROUTES,
+    REGISTRY,
+    TURNS_IN_FLIGHT,
+    record_cache,
+    record_tokens,
+    request_class,
+)
+from .tracing import configure, record_stage, span, track_stages
+from .profiling import LoopStallMonitor, profile, task_report
+
+# Imported last: these depend on modules that use the names above.
+from .bot_framework import (
+    InstrumentedBotFrameworkAuthentication,
+    InstrumentedCloudAdapter,
+)
+from .middleware import TelemetryMiddleware
+
+__all__ = [
+    "BACKGROUND",
+    "CURRENT_REQUEST_CLASS",
+    "CURRENT_TENANT",
+    "GROUP",
+    "INTERACTIVE",
+    "OPENAI_QUEUE_WAIT",
+    "OPENAI_REQUESTS_IN_FLIGHT",
+    "OPENAI_ROUTES",
+    "REGISTRY",
+    "TURNS_IN_FLIGHT",
+    "InstrumentedBotFrameworkAuthentication",
+    "InstrumentedCloudAdapter",
+    "LoopStallMonitor",
+    "TelemetryMiddleware",
+    "configure",
+    "profile",
+    "record_cache",
+    "record_stage",
+    "record_tokens",
+    "request_class",
+    "span",
+    "task_report",
+    "track_stages",
+]
@@ -0,0 +1,39 @@
+from typing import List
+
+from botbuilder.core import TurnContext
+from botbuilder.integration.aiohttp import (
+    CloudAdapter,
+    ConfigurationBotFrameworkAuthentication,
+)
+from botbuilder.schema import Activity, ResourceResponse
+
+from src.telemetry.tracing import span
+
+
+class InstrumentedBotFrameworkAuthentication(ConfigurationBotFrameworkAuthentication):
+    """
+    Times the validation of the Bot Framework token of incoming requests.
+    """
+
+    async def authenticate_request(self, activity: Activity, auth_header: str):
+        with span("adapter_auth"):
+            return await super().authenticate_request(activity, auth_header)
+
+
+class InstrumentedCloudAdapter(CloudAdapter):
+    """
+    Times the requests that send and update activities through the Bot Connector.
+
+    on_send_activities handlers run before the activities are sent, so the sends are
+    timed here instead.
+    """
+
+    async def send_activities(
+        self, context: TurnContext, activities: List[Activity]
+    ) -> List[ResourceResponse]:
+        with span("send_activity"):
+            return await super().send_activities(context, activities)
+
+    async def update_activity(self, context: TurnContext, activity: Activity):
+        with span("update_activity"):
+            return await super().update_activity(context, activity)
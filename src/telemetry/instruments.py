@@ -0,0 +1,70 @@
+from contextvars import ContextVar
+from typing import Optional
+
+from src.telemetry.metrics import Registry
+
+REGISTRY = Registry()
+
+# The tenant of the turn being processed, for metrics recorded deep in the services.
+CURRENT_TENANT: ContextVar[str] = ContextVar("current_tenant", default="")
+# Whether the turn is an interactive 1:1 chat, group or channel traffic, or background
+# work, which the OpenAI scheduler serves with different weights.
+INTERACTIVE = "interactive"
+GROUP = "group"
+BACKGROUND = "background"
+CURRENT_REQUEST_CLASS: ContextVar[str] = ContextVar(
+    "current_request_class", default=INTERACTIVE
+)
+
+STAGE_DURATION = REGISTRY.histogram(
+    "bot_stage_duration_seconds",
+    "Time spent in each stage of a turn.",
+    ("stage", "outcome"),
+)
+TURNS_IN_FLIGHT = REGISTRY.gauge(
+    "bot_turns_in_flight", "Turns currently being processed."
+)
+OPENAI_REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "openai_requests_in_flight", "Requests to OpenAI awaiting a response.", ("model",)
+)
+OPENAI_TOKENS = REGISTRY.counter(
+    "openai_tokens",
+    "Tokens sent to and received from OpenAI.",
+    ("model", "tenant", "kind"),
+)
+OPENAI_QUEUE_WAIT = REGISTRY.histogram(
+    "openai_queue_wait_seconds",
+    "Time OpenAI requests waited for the scheduler, by request class.",
+    ("class",),
+)
+OPENAI_ROUTES = REGISTRY.counter(
+    "openai_routes",
+    "Completion requests by routed model and intent.",
+    ("model", "intent"),
+)
+EVENT_LOOP_STALLS = REGISTRY.counter(
+    "event_loop_stalls", "Callbacks that blocked the event loop past the threshold."
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "cache_requests", "Cache lookups by cache and result.", ("cache", "result")
+)
+
+
+def request_class(conversation_type: Optional[str]) -> str:
+    """
+    Return the request class of a conversation: 1:1 chats are interactive, group chats
+    and channels are not.
+    """
+    if conversation_type in (None, "", "personal"):
+        return INTERACTIVE
+    return GROUP
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def record_tokens(model: str, prompt_tokens: int, completion_tokens: int):
+    tenant = CURRENT_TENANT.get()
+    OPENAI_TOKENS.labels(model, tenant, "prompt").inc(prompt_tokens)
+    OPENAI_TOKENS.labels(model, tenant, "completion").inc(completion_tokens)
@@ -0,0 +1,292 @@
+import math
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _NoopChild:
+    """
+    Stands in for every labelled metric while metrics are disabled.
+    """
+
+    __slots__ = ()
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def dec(self, amount: float = 1):
+        pass
+
+    def set(self, value: float):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+
+NOOP_CHILD = _NoopChild()
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    """
+    A metric family with a fixed set of label names, in the Prometheus data model.
+    """
+
+    type = "untyped"
+
+    def __init__(
+        self,
+        registry: "Registry",
+        name: str,
+        documentation: str,
+        label_names: Iterable[str] = (),
+    ):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def labels(self, *values):
+        """
+        Return the child for the given label values, in the order of the label names.
+        """
+        if not self.registry.enabled:
+            return NOOP_CHILD
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError()
+
+    def samples(self) -> List[Tuple[str, Tuple[str, ...], Tuple[str, ...], float]]:
+        raise NotImplementedError()
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for name, label_names, label_values, value in self.samples():
+            lines.append(
+                f"{name}{_format_labels(label_names, label_values)} {_format_value(value)}"
+            )
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def samples(self):
+        return [
+            (f"{self.name}_total", self.label_names, values, child.value)
+            for values, child in list(self._children.items())
+        ]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(
+        self,
+        registry: "Registry",
+        name: str,
+        documentation: str,
+        label_names: Iterable[str] = (),
+        function: Optional[Callable[[], float]] = None,
+    ):
+        """
+        A gauge is either set by the code or, when function is given, read from it at
+        every scrape.
+        """
+        super().__init__(registry, name, documentation, label_names)
+        self.function = function
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def samples(self):
+        if self.function is not None:
+            return [(self.name, (), (), self.function())]
+        return [
+            (self.name, self.label_names, values, child.value)
+            for values, child in list(self._children.items())
+        ]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        registry: "Registry",
+        name: str,
+        documentation: str,
+        label_names: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(registry, name, documentation, label_names)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def samples(self):
+        samples = []
+        bucket_label_names = self.label_names + ("le",)
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                samples.append(
+                    (
+                        f"{self.name}_bucket",
+                        bucket_label_names,
+                        values + (_format_value(bound),),
+                        cumulative,
+                    )
+                )
+            samples.append((f"{self.name}_sum", self.label_names, values, child.sum))
+            samples.append(
+                (f"{self.name}_count", self.label_names, values, child.count)
+            )
+        return samples
+
+
+class Registry:
+    """
+    Holds the metrics of the process and renders them in the Prometheus text format.
+
+    While disabled, metrics hand out a shared no-op child, so recording costs one
+    attribute check.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def counter(self, name: str, documentation: str, label_names=()) -> Counter:
+        return Counter(self, name, documentation, label_names)
+
+    def gauge(
+        self, name: str, documentation: str, label_names=(), function=None
+    ) -> Gauge:
+        return Gauge(self, name, documentation, label_names, function)
+
+    def histogram(
+        self, name: str, documentation: str, label_names=(), buckets=DEFAULT_BUCKETS
+    ) -> Histogram:
+        return Histogram(self, name, documentation, label_names, buckets)
+
+    def unregister(self, name: str):
+        self._metrics.pop(name, None)
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
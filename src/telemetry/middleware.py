@@ -0,0 +1,41 @@
+from typing import Awaitable, Callable
+
+from botbuilder.core import Middleware, TurnContext
+
+from src.helpers.conversation_helper import get_tenant_id
+from src.telemetry.instruments import (
+    CURRENT_REQUEST_CLASS,
+    CURRENT_TENANT,
+    TURNS_IN_FLIGHT,
+    request_class,
+)
+from src.telemetry.tracing import enabled, span
+
+
+class TelemetryMiddleware(Middleware):
+    """
+    Times each turn and counts the turns in flight.
+
+    Also records the turn's tenant and request class, which the OpenAI scheduler uses
+    whether or not telemetry is enabled.
+    """
+
+    async def on_turn(self, context: TurnContext, logic: Callable[[], Awaitable]):
+        activity = context.activity
+        CURRENT_TENANT.set(get_tenant_id(activity) or "")
+        CURRENT_REQUEST_CLASS.set(
+            request_class(
+                activity.conversation.conversation_type
+                if activity.conversation
+                else None
+            )
+        )
+        if not enabled():
+            return await logic()
+
+        TURNS_IN_FLIGHT.inc()
+        try:
+            with span("turn"):
+                return await logic()
+        finally:
+            TURNS_IN_FLIGHT.dec()
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from src.telemetry.instruments import EVENT_LOOP_STALLS
+from src.telemetry.tracing import task_stage
+
+logger = logging.getLogger(__name__)
+
+
+class LoopStallMonitor:
+    """
+    Detects callbacks that block the event loop and records what they were doing.
+
+    A heartbeat task wakes up every threshold / 4 seconds, and a watchdog thread checks
+    that it does. When the heartbeat is more than threshold seconds late, the watchdog
+    takes the stack of the event loop's thread while it is still blocked, which shows
+    the callback at fault. Once the loop runs again the stall is logged with that stack
+    and kept, up to max_stalls of them.
+    """
+
+    def __init__(self, threshold: float = 0.1, max_stalls: int = 100):
+        """
+        Initialize the LoopStallMonitor.
+
+        Args:
+            threshold (float): Seconds a callback may block the loop before it is reported.
+            max_stalls (int): Number of recent stalls kept.
+        """
+        self.threshold = threshold
+        self.interval = threshold / 4
+        self.stalls: Deque[Dict[str, Any]] = deque(maxlen=max_stalls)
+        self._due = 0.0
+        self._stack: Optional[Tuple[float, str]] = None
+        self._loop_thread: Optional[int] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        """
+        Start monitoring the running event loop.
+        """
+        self._loop_thread = threading.get_ident()
+        self._due = time.monotonic() + self.interval
+        self._stopped.clear()
+        self._heartbeat = asyncio.create_task(self._beat())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop-stall-monitor", daemon=True
+        )
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+            self._heartbeat = None
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
+
+    async def _beat(self):
+        while True:
+            due = self._due = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = time.monotonic() - due
+            if lag > self.threshold:
+                self._record(due, lag)
+
+    def _record(self, due: float, lag: float):
+        stack = self._stack[1] if self._stack and self._stack[0] == due else None
+        self._stack = None
+        EVENT_LOOP_STALLS.inc()
+        self.stalls.append(
+            {"at": time.time(), "duration": round(lag, 4), "stack": stack}
+        )
+        logger.warning(
+            f"The event loop was blocked for {lag * 1000:.0f}ms"
+            + (f", in:\n{stack}" if stack else "")
+        )
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval):
+            due = self._due
+            if time.monotonic() - due <= self.threshold:
+                continue
+            if self._stack is not None and self._stack[0] == due:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                self._stack = (due, "".join(traceback.format_stack(frame)))
+
+
+def collect_stacks(seconds: float, interval: float = 0.005) -> Counter:
+    """
+    Sample the stacks of all threads but the calling one for the given number of seconds.
+
+    A sample is taken whenever this thread gets the GIL, so code that releases it often,
+    like an event loop polling for I/O, is sampled more than its share of the time.
+
+    Returns:
+        Counter: How often each stack was seen, as frames from the thread's root to the
+            innermost frame, separated by semicolons.
+    """
+    me = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    samples: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            frames: List[str] = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(
+                    f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            frames.append(names.get(ident, str(ident)))
+            samples[";".join(reversed(frames))] += 1
+        time.sleep(interval)
+    return samples
+
+
+def render_collapsed(samples: Counter) -> str:
+    """
+    Render stack samples in the collapsed format read by flamegraph.pl and speedscope.
+    """
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+
+async def profile(seconds: float, interval: float = 0.005) -> str:
+    """
+    Sample all threads, including the event loop's, from another thread for the given
+    number of seconds, and return the samples in the collapsed format.
+    """
+    return render_collapsed(await asyncio.to_thread(collect_stacks, seconds, interval))
+
+
+def task_report(limit: int = 200) -> Dict[str, Any]:
+    """
+    Describe the asyncio tasks of the running loop and the turn stage each one is in.
+
+    Returns:
+        dict: The number of tasks, how many are in each stage, and up to limit tasks.
+    """
+    tasks = asyncio.all_tasks()
+    stages = {task: task_stage(task) or "none" for task in tasks}
+    return {
+        "tasks": len(tasks),
+        "stages": dict(Counter(stages.values())),
+        "details": [
+            {
+                "name": task.get_name(),
+                "coroutine": getattr(
+                    task.get_coro(), "__qualname__", repr(task.get_coro())
+                ),
+                "stage": stage,
+            }
+            for task, stage in list(stages.items())[:limit]
+        ],
+    }
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+import weakref
+from typing import List, Optional
+
+from src.telemetry.instruments import REGISTRY, STAGE_DURATION
+
+logger = logging.getLogger(__name__)
+
+_tracer = None
+# The stages each task is in, innermost last, while stage tracking is on.
+_task_stages: "weakref.WeakKeyDictionary[asyncio.Task, List[str]]" = (
+    weakref.WeakKeyDictionary()
+)
+_track_stages = False
+
+
+def configure(metrics_enabled: bool = True, tracing_enabled: bool = False):
+    """
+    Turn metrics and Datadog tracing on or off for the process.
+
+    Args:
+        metrics_enabled (bool): Whether stage timings and other metrics are recorded.
+        tracing_enabled (bool): Whether stages are also sent to Datadog as ddtrace spans.
+    """
+    global _tracer
+    REGISTRY.enabled = metrics_enabled
+    _tracer = None
+    if tracing_enabled:
+        try:
+            from ddtrace import tracer
+        except ImportError:
+            logger.warning("TRACING_ENABLED is set but ddtrace is not installed")
+        else:
+            _tracer = tracer
+
+
+def track_stages(enabled: bool):
+    """
+    Turn on or off recording which stage every task is in, for task_stage.
+    """
+    global _track_stages
+    _track_stages = enabled
+    if not enabled:
+        _task_stages.clear()
+
+
+def task_stage(task: asyncio.Task) -> Optional[str]:
+    """
+    Return the innermost stage a task is in, or None, while stage tracking is on.
+    """
+    stages = _task_stages.get(task)
+    return stages[-1] if stages else None
+
+
+def enabled() -> bool:
+    return REGISTRY.enabled or _tracer is not None or _track_stages
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("stage", "started_at", "dd_span", "task")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.dd_span = None
+        self.task = None
+
+    def __enter__(self):
+        if _track_stages:
+            self.task = asyncio.current_task()
+            if self.task is not None:
+                _task_stages.setdefault(self.task, []).append(self.stage)
+        if _tracer is not None:
+            self.dd_span = _tracer.trace(f"bot.{self.stage}")
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        STAGE_DURATION.labels(self.stage, "error" if exc_type else "ok").observe(
+            time.perf_counter() - self.started_at
+        )
+        if self.dd_span is not None:
+            if exc is not None:
+                self.dd_span.set_exc_info(exc_type, exc, traceback)
+            self.dd_span.finish()
+        if self.task is not None:
+            stages = _task_stages.get(self.task)
+            if stages:
+                stages.pop()
+        return False
+
+
+def span(stage: str):
+    """
+    Time a stage of the turn:
+
+        with span("jwt_verify"):
+            ...
+
+    Returns a shared no-op context manager when metrics and tracing are disabled.
+    """
+    if REGISTRY.enabled or _tracer is not None or _track_stages:
+        return _Span(stage)
+    return _NOOP_SPAN
+
+
+def record_stage(stage: str, seconds: float, outcome: str = "ok"):
+    """
+    Record the duration of a stage measured without a span, e.g. time to first token.
+    """
+    STAGE_DURATION.labels(stage, outcome).observe(seconds)
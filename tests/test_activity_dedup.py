@@ -0,0 +1,60 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from src.runtime.activity_dedup import ActivityDeduplicator, MongoActivityDeduplicator
+
+
+def test_redelivery_is_a_duplicate_until_forgotten():
+    async def scenario():
+        deduplicator = ActivityDeduplicator()
+        key = deduplicator.key("conversation", "activity")
+        assert not await deduplicator.check_and_add(key)
+        assert await deduplicator.check_and_add(key)
+        await deduplicator.forget(key)
+        assert not await deduplicator.check_and_add(key)
+
+    asyncio.run(scenario())
+
+
+def test_activities_without_id_are_never_duplicates():
+    async def scenario():
+        deduplicator = ActivityDeduplicator()
+        key = deduplicator.key("conversation", None)
+        assert not await deduplicator.check_and_add(key)
+        assert not await deduplicator.check_and_add(key)
+
+    asyncio.run(scenario())
+
+
+def test_mongo_redelivery_to_another_process_is_a_duplicate():
+    async def scenario():
+        collection = AsyncMongoMockClient()["bot"]["activities"]
+        first = MongoActivityDeduplicator(collection)
+        second = MongoActivityDeduplicator(collection)
+        key = first.key("conversation", "activity")
+
+        assert not await first.check_and_add(key)
+        assert await second.check_and_add(key)
+        assert second.duplicates == 1
+
+        await first.forget(key)
+        assert not await second.check_and_add(key)
+
+    asyncio.run(scenario())
+
+
+def test_mongo_activities_expire_after_ttl():
+    async def scenario():
+        deduplicator = MongoActivityDeduplicator(
+            AsyncMongoMockClient()["bot"]["activities"], ttl=60
+        )
+        await deduplicator.ensure_indexes()
+        indexes = await deduplicator.collection.index_information()
+        assert indexes["expires_at_1"]["expireAfterSeconds"] == 0
+
+        await deduplicator.check_and_add(deduplicator.key("conversation", "activity"))
+        document = await deduplicator.collection.find_one({})
+        assert document["_id"] == "conversation:activity"
+
+    asyncio.run(scenario())
@@ -0,0 +1,33 @@
+from src.conversation.history.conversation_history import ConversationHistory
+from src.conversation.roles.role_classes import AssistantRole, UserRole
+
+
+def make_history() -> ConversationHistory:
+    history = ConversationHistory(max_messages=2, collect_evicted=True)
+    for index in range(2):
+        history.add_message(UserRole(f"question {index}"))
+        history.add_message(AssistantRole(f"answer {index}"))
+    return history
+
+
+def test_summary_releases_the_messages_it_covers():
+    history = make_history()
+    batch = list(history.pending_summary)
+    history.add_message(UserRole("question 2"))
+
+    assert history.apply_summary("summary", batch)
+    assert history.summary == "summary"
+    assert [m.content for m in history.pending_summary] == ["question 1"]
+
+
+def test_summary_of_a_reloaded_history_is_discarded():
+    history = make_history()
+    batch = list(history.pending_summary)
+    history.rebase(history.to_document())
+    pending = [m.content for m in history.pending_summary]
+    size = history.size_bytes
+
+    assert not history.apply_summary("summary", batch)
+    assert history.summary is None
+    assert [m.content for m in history.pending_summary] == pending
+    assert history.size_bytes == size
@@ -0,0 +1,182 @@
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from src.conversation.history.history_manager import ConversationHistoryManager
+from src.conversation.roles.role_classes import AssistantRole, BaseRole, UserRole
+from src.storage.history_store import MemoryHistoryStore, history_key
+from src.storage.mongo_history_store import MongoHistoryStore
+
+
+def memory_store():
+    return MemoryHistoryStore(flush_interval=60)
+
+
+def mongo_store():
+    return MongoHistoryStore(
+        AsyncMongoMockClient()["bot"]["conversations"], flush_interval=60
+    )
+
+
+@pytest.fixture(params=[memory_store, mongo_store], ids=["memory", "mongo"])
+def make_store(request):
+    return request.param
+
+
+def contents(history):
+    return [message.content for message in history.get_history()]
+
+
+async def stored_contents(store, conversation_id="conversation"):
+    document = await store.read(history_key(conversation_id, "tenant"))
+    return [BaseRole.from_json(message).content for message in document["messages"]]
+
+
+def test_load_returns_changes_before_they_are_written(make_store):
+    async def scenario():
+        store = make_store()
+        manager = ConversationHistoryManager(store=store)
+        history = await manager.load_history("conversation", "tenant")
+        history.add_message(UserRole("hi"))
+
+        assert await store.read(history_key("conversation", "tenant")) is None
+        document = await store.load("conversation", "tenant")
+        assert len(document["messages"]) == 1
+
+        await store.close()
+        assert await stored_contents(store) == ["hi"]
+
+    asyncio.run(scenario())
+
+
+def test_every_write_increments_the_version(make_store):
+    async def scenario():
+        store = make_store()
+        manager = ConversationHistoryManager(store=store)
+        history = await manager.load_history("conversation", "tenant")
+        for text in ("one", "two"):
+            history.add_message(UserRole(text))
+            await store.flush()
+
+        assert history.version == 2
+        assert history.unsaved == []
+        document = await store.read(history_key("conversation", "tenant"))
+        assert document["version"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_conflicting_writes_keep_the_messages_of_both(make_store):
+    async def scenario():
+        store = make_store()
+        first = ConversationHistoryManager(store=store)
+        second = ConversationHistoryManager(store=store)
+        a = await first.load_history("conversation", "tenant")
+        b = await second.load_history("conversation", "tenant")
+
+        a.add_message(UserRole("from a"))
+        await store.flush()
+        b.add_message(UserRole("from b"))
+        await store.flush()
+        assert contents(b) == ["from a", "from b"]
+
+        await store.flush()
+        assert await stored_contents(store) == ["from a", "from b"]
+
+    asyncio.run(scenario())
+
+
+def test_revalidate_reloads_newer_versions(make_store):
+    async def scenario():
+        store = make_store()
+        first = ConversationHistoryManager(store=store)
+        second = ConversationHistoryManager(store=store)
+        await second.load_history("conversation", "tenant")
+
+        history = await first.load_history("conversation", "tenant")
+        history.add_message(UserRole("hi"))
+        history.add_message(AssistantRole("hello"))
+        await store.flush()
+
+        reloaded = await second.load_history("conversation", "tenant")
+        assert contents(reloaded) == ["hi", "hello"]
+        assert reloaded.version == 1
+        # Reloading does not write the conversation again.
+        await store.flush()
+        assert (await store.read(history_key("conversation", "tenant")))["version"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_without_revalidate_memory_is_not_refreshed(make_store):
+    async def scenario():
+        store = make_store()
+        first = ConversationHistoryManager(store=store)
+        second = ConversationHistoryManager(store=store, revalidate=False)
+        await second.load_history("conversation", "tenant")
+
+        (await first.load_history("conversation", "tenant")).add_message(UserRole("hi"))
+        await store.flush()
+
+        assert contents(await second.load_history("conversation", "tenant")) == []
+
+    asyncio.run(scenario())
+
+
+def test_changes_to_an_evicted_history_are_still_written(make_store):
+    async def scenario():
+        store = make_store()
+        manager = ConversationHistoryManager(store=store, max_conversations=1)
+        history = await manager.load_history("conversation", "tenant")
+        await manager.load_history("other", "tenant")
+        assert len(manager) == 1
+
+        history.add_message(UserRole("after eviction"))
+        await store.flush()
+        assert await stored_contents(store) == ["after eviction"]
+
+    asyncio.run(scenario())
+
+
+def test_delete_removes_the_document(make_store):
+    async def scenario():
+        store = make_store()
+        manager = ConversationHistoryManager(store=store)
+        (await manager.load_history("conversation", "tenant")).add_message(
+            UserRole("hi")
+        )
+        await store.flush()
+        await store.delete("conversation", "tenant")
+        assert await store.load("conversation", "tenant") is None
+
+    asyncio.run(scenario())
+
+
+def test_mongo_documents_without_version_are_replaced():
+    async def scenario():
+        store = mongo_store()
+        await store.collection.insert_one(
+            {"_id": history_key("conversation", "tenant"), "messages": []}
+        )
+        manager = ConversationHistoryManager(store=store)
+        history = await manager.load_history("conversation", "tenant")
+        history.add_message(UserRole("hi"))
+        await store.flush()
+
+        assert history.version == 1
+        assert await stored_contents(store) == ["hi"]
+
+    asyncio.run(scenario())
+
+
+def test_mongo_ensure_indexes_expires_histories_with_ttl():
+    async def scenario():
+        store = MongoHistoryStore(
+            AsyncMongoMockClient()["bot"]["conversations"], ttl=3600
+        )
+        await store.ensure_indexes()
+        indexes = await store.collection.index_information()
+        assert indexes["last_activity_1"]["expireAfterSeconds"] == 3600
+
+    asyncio.run(scenario())
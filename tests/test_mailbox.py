@@ -0,0 +1,115 @@
+import asyncio
+
+from botbuilder.schema import (
+    Activity,
+    ActivityTypes,
+    ChannelAccount,
+    ConversationAccount,
+)
+
+from src.runtime.admission import AdmissionController
+from src.runtime.mailbox import ConversationMailbox
+
+
+class FakeTurnContext:
+    def __init__(self, conversation_id: str, user_id: str, text: str):
+        self.activity = Activity(
+            type=ActivityTypes.message,
+            text=text,
+            conversation=ConversationAccount(id=conversation_id),
+            from_property=ChannelAccount(id=user_id),
+        )
+        self.sent = []
+
+    async def send_activity(self, activity):
+        self.sent.append(activity)
+
+
+def test_merged_turns_hold_one_admission_slot_while_they_run():
+    async def scenario():
+        admission = AdmissionController(max_concurrent=1, max_per_user=1)
+        mailbox = ConversationMailbox(typing_interval=0, admission=admission)
+        release = asyncio.Event()
+        ran = []
+        in_flight = []
+
+        async def handler(turn_context):
+            ran.append(turn_context.activity.text)
+            in_flight.append(admission.in_flight)
+            await release.wait()
+
+        first = asyncio.create_task(
+            mailbox.submit(FakeTurnContext("a", "user", "one"), handler, True)
+        )
+        await asyncio.sleep(0)
+        waiting = [
+            asyncio.create_task(
+                mailbox.submit(FakeTurnContext("a", "user", text), handler, True)
+            )
+            for text in ("two", "three")
+        ]
+        await asyncio.sleep(0)
+        assert admission.in_flight == 1
+        release.set()
+        await asyncio.gather(first, *waiting)
+
+        assert ran == ["one", "two\nthree"]
+        assert in_flight == [1, 1]
+        assert admission.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_turns_of_different_conversations_respect_the_global_limit():
+    async def scenario():
+        admission = AdmissionController(max_concurrent=1)
+        mailbox = ConversationMailbox(typing_interval=0, admission=admission)
+        running = 0
+        peak = 0
+
+        async def handler(turn_context):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        await asyncio.gather(
+            *(
+                mailbox.submit(
+                    FakeTurnContext(f"conversation-{i}", f"user-{i}", "hi"),
+                    handler,
+                    True,
+                )
+                for i in range(4)
+            )
+        )
+        assert peak == 1
+
+    asyncio.run(scenario())
+
+
+def test_turns_that_are_not_admitted_are_rejected():
+    async def scenario():
+        admission = AdmissionController(max_concurrent=1, max_queue=0)
+        rejected = []
+
+        async def on_rejected(turn_context, error):
+            rejected.append((turn_context.activity.text, error.reason))
+
+        mailbox = ConversationMailbox(
+            typing_interval=0, admission=admission, on_rejected=on_rejected
+        )
+        ran = []
+
+        async def handler(turn_context):
+            ran.append(turn_context.activity.text)
+
+        async with admission.admit("tenant", "someone else"):
+            await mailbox.submit(FakeTurnContext("a", "user", "hi"), handler, True)
+
+        assert ran == []
+        assert rejected == [("hi", "queue_full")]
+        assert admission.in_flight == 0
+
+    asyncio.run(scenario())
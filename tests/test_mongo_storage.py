@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from src.storage.errors import ETagConflictError
+from src.storage.mongo_storage import MongoStorage
+
+
+def make_storage(**kwargs) -> MongoStorage:
+    return MongoStorage(AsyncMongoMockClient()["bot"]["state"], **kwargs)
+
+
+def test_write_then_read_round_trips_with_e_tag():
+    async def scenario():
+        storage = make_storage()
+        await storage.write({"user": {"name": "Ada"}})
+        items = await storage.read(["user"])
+        assert items["user"]["name"] == "Ada"
+        assert items["user"]["e_tag"]
+
+    asyncio.run(scenario())
+
+
+def test_write_with_stale_e_tag_conflicts():
+    async def scenario():
+        storage = make_storage(cache_ttl=0)
+        await storage.write({"user": {"count": 1}})
+        first = (await storage.read(["user"]))["user"]
+        second = (await storage.read(["user"]))["user"]
+
+        first["count"] = 2
+        await storage.write({"user": first})
+        second["count"] = 3
+        with pytest.raises(KeyError, match="Etag conflict"):
+            await storage.write({"user": second})
+
+        assert (await storage.read(["user"]))["user"]["count"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_conflict_reports_its_keys_and_keeps_the_other_writes():
+    async def scenario():
+        storage = make_storage(cache_ttl=0)
+        await storage.write({"user": {"count": 1}, "conversation": {"count": 1}})
+        items = await storage.read(["user", "conversation"])
+        user, conversation = items["user"], items["conversation"]
+        old_e_tag = conversation["e_tag"]
+
+        conversation["count"] = 2
+        with pytest.raises(ETagConflictError) as error:
+            await storage.write(
+                {"user": {"count": 2, "e_tag": "stale"}, "conversation": conversation}
+            )
+
+        assert error.value.keys == {"user"}
+        assert conversation["e_tag"] != old_e_tag
+        stored = await storage.read(["user", "conversation"])
+        assert stored["conversation"]["count"] == 2
+        assert stored["conversation"]["e_tag"] == conversation["e_tag"]
+        assert stored["user"]["e_tag"] == user["e_tag"]
+
+    asyncio.run(scenario())
+
+
+def test_write_with_wildcard_e_tag_overwrites():
+    async def scenario():
+        storage = make_storage()
+        await storage.write({"user": {"count": 1}})
+        await storage.write({"user": {"count": 2, "e_tag": "*"}})
+        assert (await storage.read(["user"]))["user"]["count"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_read_is_served_from_cache_within_cache_ttl():
+    async def scenario():
+        storage = make_storage(cache_ttl=60)
+        await storage.write({"user": {"count": 1}})
+        await storage.collection.delete_many({})
+        assert (await storage.read(["user"]))["user"]["count"] == 1
+
+        storage.cache_ttl = 0
+        assert await storage.read(["user"]) == {}
+
+    asyncio.run(scenario())
+
+
+def test_cache_keeps_at_most_cache_size_items():
+    async def scenario():
+        storage = make_storage(cache_size=2)
+        await storage.write({f"user{index}": {"index": index} for index in range(3)})
+        assert list(storage._cache) == ["user1", "user2"]
+
+    asyncio.run(scenario())
+
+
+def test_conflict_drops_cached_items():
+    async def scenario():
+        storage = make_storage(cache_ttl=60)
+        await storage.write({"user": {"count": 1}})
+        with pytest.raises(KeyError):
+            await storage.write({"user": {"count": 2, "e_tag": "stale"}})
+        assert "user" not in storage._cache
+
+    asyncio.run(scenario())
+
+
+def test_delete_removes_items_and_cache_entries():
+    async def scenario():
+        storage = make_storage(cache_ttl=60)
+        await storage.write({"user": {"count": 1}})
+        await storage.delete(["user"])
+        assert await storage.read(["user"]) == {}
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("ttl", [None, 3600])
+def test_ensure_indexes_expires_items_only_with_ttl(ttl):
+    async def scenario():
+        storage = make_storage(ttl=ttl)
+        await storage.ensure_indexes()
+        index = (await storage.collection.index_information())["last_activity_1"]
+        assert index.get("expireAfterSeconds") == ttl
+
+    asyncio.run(scenario())
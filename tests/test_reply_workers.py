@@ -0,0 +1,70 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from src.runtime.job_queue import InMemoryJobQueue, MongoJobQueue, ReplyJob
+from src.runtime.reply_workers import ReplyWorkerPool
+
+
+def make_job(conversation_id: str, text: str) -> ReplyJob:
+    return ReplyJob({}, text, conversation_id)
+
+
+def test_waiting_jobs_of_a_busy_conversation_do_not_hold_workers():
+    async def scenario():
+        queue = InMemoryJobQueue()
+        release = asyncio.Event()
+        ran = []
+
+        async def handler(job):
+            ran.append(job.text)
+            if job.text == "a1":
+                await release.wait()
+
+        pool = ReplyWorkerPool(queue, handler, workers=2)
+        for job in (
+            make_job("a", "a1"),
+            make_job("a", "a2"),
+            make_job("a", "a3"),
+            make_job("b", "b1"),
+        ):
+            await queue.put(job)
+        pool.start()
+        await asyncio.sleep(0.05)
+        assert ran == ["a1", "b1"]
+
+        release.set()
+        await asyncio.sleep(0.05)
+        assert ran == ["a1", "b1", "a2", "a3"]
+        assert pool.busy == 0
+        await pool.stop()
+
+    asyncio.run(scenario())
+
+
+def test_slow_jobs_keep_their_lease():
+    async def scenario():
+        collection = AsyncMongoMockClient()["bot"]["reply_jobs"]
+        queue = MongoJobQueue(collection, lease=0.3, poll_interval=0.01)
+        other_worker = MongoJobQueue(collection, lease=0.3, poll_interval=0.01)
+        runs = []
+
+        async def handler(job):
+            runs.append(job.job_id)
+            await asyncio.sleep(0.8)
+
+        pool = ReplyWorkerPool(queue, handler, workers=1)
+        await queue.put(make_job("a", "hello"))
+        pool.start()
+        await asyncio.sleep(0.05)
+
+        stolen = asyncio.ensure_future(other_worker.get())
+        await asyncio.sleep(0.6)
+        assert not stolen.done()
+        stolen.cancel()
+
+        await pool.stop()
+        assert len(runs) == 1
+        assert await queue.size() == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,184 @@
+import asyncio
+import random
+
+import pytest
+
+from src.conversation.services.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ResilientCaller,
+)
+
+
+class FlakyModel:
+    """
+    Fails with the given errors, in order, before answering with the model's name.
+    """
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = []
+
+    async def __call__(self, model):
+        self.calls.append(model)
+        if self.errors:
+            raise self.errors.pop(0)
+        return model
+
+
+def test_breaker_opens_after_threshold_and_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.available
+    assert breaker.allow()
+    assert not breaker.available
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+
+
+def test_breaker_stays_open_until_recovery_timeout():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=60)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.available
+    assert not breaker.allow()
+
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    breaker.recovery_timeout = 60
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_retries_transient_errors_with_bounded_jitter(monkeypatch):
+    delays = []
+    uniform = random.uniform
+
+    def recording_uniform(low, high):
+        delay = uniform(low, high)
+        delays.append((low, high, delay))
+        return delay
+
+    monkeypatch.setattr(random, "uniform", recording_uniform)
+    caller = ResilientCaller(max_retries=3, base_delay=0.001, max_delay=0.005)
+    model = FlakyModel(asyncio.TimeoutError(), asyncio.TimeoutError())
+
+    assert asyncio.run(caller.call("gpt", model)) == "gpt"
+    assert model.calls == ["gpt", "gpt", "gpt"]
+    assert len(delays) == 2
+    previous = caller.base_delay
+    for low, high, delay in delays:
+        assert low == caller.base_delay
+        assert high == pytest.approx(previous * 3)
+        assert low <= delay <= high
+        previous = min(caller.max_delay, delay)
+    assert caller.breaker("gpt").state == CircuitBreaker.CLOSED
+
+
+def test_non_retryable_errors_are_not_retried():
+    caller = ResilientCaller(max_retries=3, base_delay=0)
+    model = FlakyModel(ValueError("bad request"))
+
+    with pytest.raises(ValueError):
+        asyncio.run(caller.call("gpt", model))
+    assert model.calls == ["gpt"]
+    assert caller.breaker("gpt").failures == 0
+
+
+def test_falls_back_when_retries_are_exhausted():
+    caller = ResilientCaller(max_retries=1, base_delay=0, fallback_model="backup")
+    model = FlakyModel(asyncio.TimeoutError(), asyncio.TimeoutError())
+
+    assert asyncio.run(caller.call("gpt", model)) == "backup"
+    assert model.calls == ["gpt", "gpt", "backup"]
+
+
+def test_open_circuits_fail_fast():
+    caller = ResilientCaller(failure_threshold=1, recovery_timeout=60)
+    caller.breaker("gpt").record_failure()
+    model = FlakyModel()
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(caller.call("gpt", model))
+    assert model.calls == []
+
+
+def test_probe_failing_with_non_retryable_error_is_released():
+    caller = ResilientCaller(failure_threshold=1, recovery_timeout=0)
+    breaker = caller.breaker("gpt")
+    breaker.record_failure()
+
+    with pytest.raises(ValueError):
+        asyncio.run(caller.call("gpt", FlakyModel(ValueError("bad request"))))
+    assert breaker.available
+
+    assert asyncio.run(caller.call("gpt", FlakyModel())) == "gpt"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_cancelled_probe_is_released():
+    async def scenario():
+        caller = ResilientCaller(failure_threshold=1, recovery_timeout=0)
+        breaker = caller.breaker("gpt")
+        breaker.record_failure()
+
+        async def hang(model):
+            await asyncio.sleep(60)
+
+        task = asyncio.ensure_future(caller.call("gpt", hang))
+        await asyncio.sleep(0.01)
+        assert not breaker.available
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert breaker.available
+
+    asyncio.run(scenario())
+
+
+def test_slow_request_is_hedged_and_the_faster_answer_wins():
+    async def scenario():
+        caller = ResilientCaller(hedging=True, min_hedge_delay=0.01)
+        for _ in range(20):
+            caller._latency("gpt").record(0.01)
+        started = []
+        cancelled = []
+
+        async def model(name):
+            started.append(name)
+            if len(started) == 1:
+                try:
+                    await asyncio.sleep(60)
+                except asyncio.CancelledError:
+                    cancelled.append(name)
+                    raise
+                return "slow"
+            return "fast"
+
+        assert await caller.call("gpt", model) == "fast"
+        await asyncio.sleep(0)
+        assert caller.hedges == 1
+        assert cancelled == ["gpt"]
+
+    asyncio.run(scenario())
+
+
+def test_requests_are_not_hedged_without_latency_samples():
+    async def scenario():
+        caller = ResilientCaller(hedging=True, min_hedge_delay=0.001)
+        model = FlakyModel()
+        assert await caller.call("gpt", model) == "gpt"
+        assert caller.hedges == 0
+        assert model.calls == ["gpt"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,34 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from src.storage.mongo_storage import MongoStorage
+from src.storage.write_behind_storage import WriteBehindStorage
+
+
+def test_conflict_keeps_the_new_e_tags_of_the_other_writes():
+    async def scenario():
+        collection = AsyncMongoMockClient()["bot"]["state"]
+        other_process = MongoStorage(collection, cache_ttl=0)
+        storage = WriteBehindStorage(MongoStorage(collection, cache_ttl=0))
+        await other_process.write({"user": {"count": 1}, "conversation": {"count": 1}})
+
+        items = await storage.read(["user", "conversation"])
+        await other_process.write({"user": {"count": 5, "e_tag": "*"}})
+        items["user"]["count"] = 2
+        items["conversation"]["count"] = 2
+        await storage.write(items)
+        # A turn reads the pending version, which still has the old eTag.
+        next_turn = await storage.read(["conversation"])
+        await storage.flush()
+
+        # The conversation was written, so the next turn's write builds on its new eTag.
+        next_turn["conversation"]["count"] = 3
+        await storage.write(next_turn)
+        await storage.close()
+
+        stored = await other_process.read(["user", "conversation"])
+        assert stored["user"]["count"] == 5
+        assert stored["conversation"]["count"] == 3
+
+    asyncio.run(scenario())